@@ -1,25 +1,61 @@
 import streamlit as st
 # Trigger Redeploy - Cache Buster 2025-12-12
 import pandas as pd
+import os
+import uuid
 from src.data import (
     load_lookups, 
-    get_area_options, 
-    get_area_data, 
-    process_area_data_from_df,
+    get_area_index,
+    get_area_data_melted,
+    get_areas_data_melted,
+    get_prefetcher,
+    get_area_cache,
+    data_fingerprint,
+    get_rollup_areas,
+    get_rollup_data_melted,
+    get_region_breakdown,
+    CHILD_LEVELS,
+    get_normalisation_factor,
+    normalise_values,
     get_unique_benefits,
-    get_top_areas_data
+    get_top_areas_data,
+    get_map_data,
+    get_map_matrix,
+    rollup_matrix,
+    normalise_matrix
 )
 from src.visualizations import (
     plot_projected_benefits_timeline, 
-    plot_benefit_breakdown_2050,
-    plot_top_areas_comparison,
     plot_time_lapse,
     plot_heatmap_year_benefit,
     plot_motion_bubble_chart,
     plot_benefit_rose_chart,
-    plot_benefit_sankey
+    plot_benefit_sankey,
+    plot_area_comparison,
+    figure_template
 )
-from src.map_viz import load_shapefile, plot_choropleth_map
+from src.schema import YEAR_COLUMNS
+from src.prefetch import PREFETCH_RADIUS, PREFETCH_LIMIT
+from src.render import figure_slot, render_figures, cached_figure
+from src.instrument import start_rerun, finish_rerun, stage, render_debug_panel
+from src.map_viz import (
+    load_geometry_cache,
+    geometry_shapes,
+    region_geometry,
+    region_bounds,
+    fit_view,
+    plot_choropleth_map,
+    plot_choropleth_animation,
+    estimate_animation_bytes,
+    pick_lod,
+    GEOMETRY_LEVELS,
+    MAP_ANIMATION_MAX_BYTES,
+    UK_ZOOM
+)
+
+MAX_COMPARE_AREAS = 10
+DEFAULT_AREA_QUERY = "Glasgow"
+SANKEY_MAX_REGIONS = 12
 
 # --- CONFIGURATION ---
 st.set_page_config(
@@ -29,8 +65,17 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# --- CUSTOM CSS ---
-st.markdown("""
+# Per-stage timings of this rerun (debug panel at the bottom of the sidebar)
+rerun_trace = start_rerun(
+    session=st.session_state.setdefault("session_id", uuid.uuid4().hex),
+    explain=st.session_state.get("debug_explain", False)
+)
+
+# Everything between start_rerun and the debug panel runs in try/finally, so the
+# trace is finished on every exit, including the early st.stop() calls
+try:
+    # --- CUSTOM CSS ---
+    st.markdown("""
 <style>
     .main-header {
         font-family: 'Inter', sans-serif;
@@ -68,56 +113,101 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- DATA LOADING (LAZY) ---
-with st.spinner("Initializing..."):
-    df_lookup = load_lookups()
+    # --- DATA LOADING (LAZY) ---
+    with st.spinner("Initializing..."):
+        df_lookup = load_lookups()
 
-# --- IMPORTS FOR MOTION VIZ ---
-from streamlit_lottie import st_lottie
-import json
+    # --- IMPORTS FOR MOTION VIZ ---
+    from streamlit_lottie import st_lottie
+    import json
 
-def load_lottiefile(filepath: str):
-    with open(filepath, "r") as f:
-        return json.load(f)
+    def load_lottiefile(filepath: str):
+        with open(filepath, "r") as f:
+            return json.load(f)
 
-# Load Lottie Animation (Local)
-lottie_json = None
-try:
-    lottie_json = load_lottiefile("assets/lottie_nature.json")
-except Exception as e:
-    print(f"Lottie not found: {e}")
+    # Load Lottie Animation (Local)
+    lottie_json = None
+    try:
+        lottie_json = load_lottiefile("assets/lottie_nature.json")
+    except Exception as e:
+        print(f"Lottie not found: {e}")
 
-# --- SIDEBAR ---
-with st.sidebar:
-    if lottie_json:
-        st_lottie(lottie_json, height=150, key="sidebar_anim")
+    # --- SIDEBAR ---
+    with st.sidebar:
+        if lottie_json:
+            st_lottie(lottie_json, height=150, key="sidebar_anim")
     
-    st.title("🌍 Settings")
-
-    # Get Options
-    area_options_map = get_area_options(df_lookup)
-
-    if not area_options_map:
-        st.error("No area options found. Check 'lookups.xlsx'.")
-        st.stop()
-
-    area_display_names = list(area_options_map.keys())
-
-    # Default Selection
-    default_index = 0
-    for idx, name in enumerate(area_display_names):
-        if "Glasgow" in name:
-            default_index = idx
-            break
-
-    selected_display_name = st.selectbox("Select Municipality/Area", area_display_names, index=default_index)
-    selected_area_code = area_options_map[selected_display_name]
-
-    if "E0" in selected_display_name:
-        st.caption(f"Area Code: {selected_area_code}")
-
-    # --- ICON GRID ANIMATIONS ---
-    st.markdown("""
+        st.title("🌍 Settings")
+
+        # Search index over all small areas (built once per process)
+        area_index = get_area_index()
+
+        if not len(area_index):
+            st.error("No area options found. Check 'lookups.xlsx'.")
+            st.stop()
+
+        # Aggregation level: one small area, or a whole region of the lookup hierarchy
+        level_options = {
+            "Small area": None,
+            "Local authority": "local_authority",
+            "Nation": "nation",
+            "United Kingdom": "uk"
+        }
+        view_level = level_options[st.radio("Aggregation Level", list(level_options), key="aggregation_level")]
+
+        if view_level is None:
+            # Search-as-you-type: only the top matches go to the selectbox
+            area_query = st.text_input(
+                "Search Municipality/Area",
+                value=DEFAULT_AREA_QUERY,
+                placeholder="Council name or area code",
+                key="area_query"
+            )
+            area_display_names = area_index.search(area_query)
+
+            if not area_display_names and area_query == DEFAULT_AREA_QUERY:
+                # Dataset without the default council: start from the first areas of the index
+                area_display_names = area_index.search("")
+            if not area_display_names:
+                st.warning(f"No areas match '{area_query}'.")
+                st.stop()
+
+            selected_display_name = st.selectbox("Select Municipality/Area", area_display_names, key="area_select")
+            selected_area_code = area_index.display_to_code[selected_display_name]
+
+            if "E0" in selected_display_name:
+                st.caption(f"Area Code: {selected_area_code}")
+        else:
+            region_names = get_rollup_areas(view_level)
+            if not region_names:
+                st.error("Regional totals not available. Run build_cube.py.")
+                st.stop()
+
+            default_index = next((i for i, name in enumerate(region_names) if "Glasgow" in name), 0)
+            selected_display_name = st.selectbox("Select Region", region_names, index=default_index)
+            selected_area_code = selected_display_name
+
+        # Value basis for metrics, top-10 comparison and map
+        basis_options = {
+            "Absolute (£)": "absolute",
+            "Per capita (£/person)": "per_capita",
+            "Per household (£/household)": "per_household"
+        }
+        basis_label = st.radio("Value Basis", list(basis_options))
+        value_basis = basis_options[basis_label]
+
+        # Background prefetch of likely-next areas (small-area view only)
+        prefetch_enabled = st.toggle("Prefetch nearby areas", value=True, key="prefetch_enabled")
+        if prefetch_enabled and view_level is None:
+            prefetch_stats = get_prefetcher().stats()
+            cache_stats = get_area_cache().stats()
+            st.caption(
+                f"Prefetch: {prefetch_stats['hits']}/{prefetch_stats['requests']} selections served warm · "
+                f"{prefetch_stats['completed']} areas warmed · cache hit rate {cache_stats['hit_rate']:.0%}"
+            )
+
+        # --- ICON GRID ANIMATIONS ---
+        st.markdown("""
     <style>
     @keyframes floating { 0% { transform: translateY(0px); } 50% { transform: translateY(-5px); } 100% { transform: translateY(0px); } }
     @keyframes pulsing { 0% { transform: scale(1); } 50% { transform: scale(1.1); } 100% { transform: scale(1); } }
@@ -142,290 +232,452 @@ with st.sidebar:
     </style>
     """, unsafe_allow_html=True)
 
-    # Benefit Mappings
-    benefit_icons = {
-        "air_quality": {"icon": "💨", "anim": "anim-float", "label": "Air Quality"},
-        "congestion": {"icon": "🚦", "anim": "anim-slow-shake", "label": "Congestion"},
-        "dampness": {"icon": "💧", "anim": "anim-float", "label": "Dampness"},
-        "diet_change": {"icon": "🥗", "anim": "anim-pulse", "label": "Diet"},
-        "excess_cold": {"icon": "❄️", "anim": "anim-float", "label": "Cold"},
-        "excess_heat": {"icon": "☀️", "anim": "anim-pulse", "label": "Heat"},
-        "hassle_costs": {"icon": "⏳", "anim": "anim-slow-shake", "label": "Hassle"},
-        "noise": {"icon": "📢", "anim": "anim-shake", "label": "Noise"},
-        "physical_activity": {"icon": "🏃", "anim": "anim-pulse", "label": "Activity"},
-        "road_repairs": {"icon": "🚧", "anim": "anim-float", "label": "Repairs"},
-        "road_safety": {"icon": "🚸", "anim": "anim-pulse", "label": "Safety"}
-    }
+        # Benefit Mappings
+        benefit_icons = {
+            "air_quality": {"icon": "💨", "anim": "anim-float", "label": "Air Quality"},
+            "congestion": {"icon": "🚦", "anim": "anim-slow-shake", "label": "Congestion"},
+            "dampness": {"icon": "💧", "anim": "anim-float", "label": "Dampness"},
+            "diet_change": {"icon": "🥗", "anim": "anim-pulse", "label": "Diet"},
+            "excess_cold": {"icon": "❄️", "anim": "anim-float", "label": "Cold"},
+            "excess_heat": {"icon": "☀️", "anim": "anim-pulse", "label": "Heat"},
+            "hassle_costs": {"icon": "⏳", "anim": "anim-slow-shake", "label": "Hassle"},
+            "noise": {"icon": "📢", "anim": "anim-shake", "label": "Noise"},
+            "physical_activity": {"icon": "🏃", "anim": "anim-pulse", "label": "Activity"},
+            "road_repairs": {"icon": "🚧", "anim": "anim-float", "label": "Repairs"},
+            "road_safety": {"icon": "🚸", "anim": "anim-pulse", "label": "Safety"}
+        }
     
-    st.sidebar.markdown("### 🎯 Benefit Focus")
+        st.sidebar.markdown("### 🎯 Benefit Focus")
     
-    # Create 3-column Grid in HTML string (One-liner to avoid Indentation/Code Block issues)
-    grid_html = "<div style='display:flex; flex-wrap:wrap; justify-content:center; gap:10px;'>"
-    for key, info in benefit_icons.items():
-        # Using simple concatenation to ensure no newlines/tabs break the markdown rendering
-        grid_html += f"<div class='icon-box' title='{info['label']}'><div class='icon-emoji {info['anim']}'>{info['icon']}</div><div class='icon-label'>{info['label']}</div></div>"
-    grid_html += "</div>"
+        # Create 3-column Grid in HTML string (One-liner to avoid Indentation/Code Block issues)
+        grid_html = "<div style='display:flex; flex-wrap:wrap; justify-content:center; gap:10px;'>"
+        for key, info in benefit_icons.items():
+            # Using simple concatenation to ensure no newlines/tabs break the markdown rendering
+            grid_html += f"<div class='icon-box' title='{info['label']}'><div class='icon-emoji {info['anim']}'>{info['icon']}</div><div class='icon-label'>{info['label']}</div></div>"
+        grid_html += "</div>"
     
-    st.sidebar.markdown(grid_html, unsafe_allow_html=True)
-    st.sidebar.caption("Hover for details!")
+        st.sidebar.markdown(grid_html, unsafe_allow_html=True)
+        st.sidebar.caption("Hover for details!")
 
-    st.divider()
+        st.divider()
 
-# --- MAIN PAGE ---
+    # --- MAIN PAGE ---
 
-display_pure_name = selected_display_name.split('(')[0].strip()
+    display_pure_name = selected_display_name.split('(')[0].strip()
 
-st.markdown(f'<div class="main-header">Analysis for: {display_pure_name}</div>', unsafe_allow_html=True)
-st.markdown(f'<div class="sub-header">The Hidden Value of Climate Action (2025-2050)</div>', unsafe_allow_html=True)
-st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown(f'<div class="main-header">Analysis for: {display_pure_name}</div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="sub-header">The Hidden Value of Climate Action (2025-2050)</div>', unsafe_allow_html=True)
+    st.markdown("<br>", unsafe_allow_html=True)
 
-# FILTER FOR METRICS
-col_filter, _ = st.columns([1, 3])
-with col_filter:
-    metric_year = st.slider("Select Year for Overview:", min_value=2025, max_value=2050, value=2050)
+    # FILTER FOR METRICS
+    col_filter, _ = st.columns([1, 3])
+    with col_filter:
+        metric_year = st.slider("Select Year for Overview:", min_value=2025, max_value=2050, value=2050, key="metric_year")
 
-# LOAD SPECIFIC AREA DATA (DuckDB)
-area_df_raw = get_area_data(selected_area_code)
-area_df_melted = process_area_data_from_df(area_df_raw)
+    # LOAD SPECIFIC AREA DATA (DuckDB, cached per area across sessions)
+    if view_level is None:
+        prefetcher = get_prefetcher()
+        prefetcher.record_request(selected_area_code)
+        area_df_melted = get_area_data_melted(selected_area_code)
 
-if area_df_melted.empty:
-    st.warning(f"No data found for area code: {selected_area_code}")
-    st.stop()
+        # Warm the areas users usually open next: neighbours in the selector, then the same council
+        prefetch_owner = st.session_state["session_id"]
+        if prefetch_enabled:
+            prefetcher.schedule(area_index.neighbours(selected_area_code, PREFETCH_RADIUS, PREFETCH_LIMIT), owner=prefetch_owner)
+        else:
+            prefetcher.cancel(owner=prefetch_owner)
+    else:
+        # Precomputed regional roll-up: a single dictionary read
+        area_df_melted = get_rollup_data_melted(view_level, selected_area_code)
 
-# Total Benefit (Dynamic Year)
-data_year = area_df_melted[area_df_melted['Year'] == metric_year]
+    if value_basis != "absolute" and not area_df_melted.empty:
+        # One scalar for the whole area/region (the cached frame itself is left untouched)
+        factor = get_normalisation_factor(value_basis, selected_area_code, view_level)
+        area_df_melted = area_df_melted.assign(Benefit_Value=area_df_melted['Benefit_Value'] * factor)
 
-# --- METRIC CALCULATION FIX ---
-# Sum up values by Type to handle potential duplicates/segments, matching Chart logic
-grouped_metrics = data_year.groupby('co-benefit_type')['Benefit_Value'].sum().reset_index()
+    if area_df_melted.empty:
+        st.warning(f"No data found for area code: {selected_area_code}")
+        st.stop()
 
-total_benefit_year = grouped_metrics['Benefit_Value'].sum()
+    # Total Benefit (Dynamic Year)
+    data_year = area_df_melted[area_df_melted['Year'] == metric_year]
 
-sorted_benefits = grouped_metrics.sort_values('Benefit_Value', ascending=False)
-if not sorted_benefits.empty:
-    top_benefit_row = sorted_benefits.iloc[0]
-    raw_type = top_benefit_row['co-benefit_type']
-    top_benefit_val = top_benefit_row['Benefit_Value']
-    
-    # Format Label with Emoji using the same dictionary logic
-    icons = {
-        "air_quality": "💨", "congestion": "🚦", "dampness": "💧", "diet_change": "🥗",
-        "excess_cold": "❄️", "excess_heat": "☀️", "hassle_costs": "⏳", "noise": "📢",
-        "physical_activity": "🏃", "road_repairs": "🚧", "road_safety": "🚸"
-    }
-    icon = icons.get(raw_type, "✨")
-    clean_name = raw_type.replace('_', ' ').title()
-    top_benefit_type = f"{icon} {clean_name}"
-else:
-    top_benefit_type = "N/A"
-    top_benefit_val = 0
-
-# Key Metrics
-col1, col2, col3 = st.columns(3)
-
-def format_currency(val):
-    if val >= 1_000_000_000:
-        return f"£{val/1_000_000_000:.2f}B"
-    elif val >= 1_000_000:
-        return f"£{val/1_000_000:.2f}M"
-    elif val >= 1_000:
-        return f"£{val:,.0f}"
-    elif val == 0:
-        return "£0"
-    else:
-        return f"£{val:,.4f}"
+    # --- METRIC CALCULATION FIX ---
+    # Sum up values by Type to handle potential duplicates/segments, matching Chart logic
+    grouped_metrics = data_year.groupby('co-benefit_type', observed=True)['Benefit_Value'].sum().reset_index()
 
-# --- COUNT-UP VISUALIZATION ---
-# (CSS Animation Strategy)
+    total_benefit_year = grouped_metrics['Benefit_Value'].sum()
 
-metric_html_1 = f"""
+    sorted_benefits = grouped_metrics.sort_values('Benefit_Value', ascending=False)
+    if not sorted_benefits.empty:
+        top_benefit_row = sorted_benefits.iloc[0]
+        raw_type = top_benefit_row['co-benefit_type']
+        top_benefit_val = top_benefit_row['Benefit_Value']
+    
+        # Format Label with Emoji using the same dictionary logic
+        icons = {
+            "air_quality": "💨", "congestion": "🚦", "dampness": "💧", "diet_change": "🥗",
+            "excess_cold": "❄️", "excess_heat": "☀️", "hassle_costs": "⏳", "noise": "📢",
+            "physical_activity": "🏃", "road_repairs": "🚧", "road_safety": "🚸"
+        }
+        icon = icons.get(raw_type, "✨")
+        clean_name = raw_type.replace('_', ' ').title()
+        top_benefit_type = f"{icon} {clean_name}"
+    else:
+        top_benefit_type = "N/A"
+        top_benefit_val = 0
+
+    # Key Metrics
+    col1, col2, col3 = st.columns(3)
+    basis_suffix = {"absolute": "", "per_capita": ", per person", "per_household": ", per household"}[value_basis]
+
+    def format_currency(val):
+        if val >= 1_000_000_000:
+            return f"£{val/1_000_000_000:.2f}B"
+        elif val >= 1_000_000:
+            return f"£{val/1_000_000:.2f}M"
+        elif val >= 1_000:
+            return f"£{val:,.0f}"
+        elif val == 0:
+            return "£0"
+        else:
+            return f"£{val:,.4f}"
+
+    # --- COUNT-UP VISUALIZATION ---
+    # (CSS Animation Strategy)
+
+    metric_html_1 = f"""
 <div class="metric-card" style="animation: fadeIn 1.5s;">
-    <div class="metric-label">Total Projected Benefits ({metric_year})</div>
+    <div class="metric-label">Total Projected Benefits ({metric_year}{basis_suffix})</div>
     <div class="metric-value" style="color: #00ADB5;">{format_currency(total_benefit_year)}</div>
 </div>
 """
 
-with col1:
-    st.markdown(metric_html_1, unsafe_allow_html=True)
+    with col1:
+        st.markdown(metric_html_1, unsafe_allow_html=True)
 
-with col2:
-    st.markdown(f"""
+    with col2:
+        st.markdown(f"""
     <div class="metric-card" style="animation: fadeIn 2s;">
         <div class="metric-label">Top Co-Benefit Driver ({metric_year})</div>
         <div class="metric-value" style="color: #00ADB5;">{top_benefit_type}</div>
     </div>
     """, unsafe_allow_html=True)
-with col3:
-    st.markdown(f"""
+    with col3:
+        st.markdown(f"""
     <div class="metric-card" style="animation: fadeIn 2.5s;">
-        <div class="metric-label">Contribution of Top Driver</div>
+        <div class="metric-label">Contribution of Top Driver{basis_suffix}</div>
         <div class="metric-value" style="color: #00ADB5;">{format_currency(top_benefit_val)}</div>
     </div>
     """, unsafe_allow_html=True)
     
-# INSERT CSS ANIMATION DEFINITION
-# (Already defined in style block at top)
+    # INSERT CSS ANIMATION DEFINITION
+    # (Already defined in style block at top)
 
-st.markdown("---")
+    st.markdown("---")
 
-# --- VISUALIZATIONS ---
+    # --- VISUALIZATIONS ---
 
-tab1, tab2, tab3 = st.tabs(["📊 Overview", "🎬 Time-Lapse", "🗺️ Map"])
+    # Lazy tabs: only the open tab is built on each rerun (switching tabs reruns the script)
+    tab1, tab2, tab3, tab4 = st.tabs(
+        ["📊 Overview", "🎬 Time-Lapse", "🗺️ Map", "🆚 Compare"],
+        key="main_tab",
+        on_change="rerun"
+    )
 
-with tab1:
-    # --- INTERACTIVE BENEFIT EXPLORER ---
-    st.subheader("💡 Interactive Benefit Explorer")
-    st.write("Hover over the icons to see the 'Pulse' of each benefit category.")
-    
-    # Reuse the same grid HTML logic but larger (Flattened to avoid Raw HTML bug)
-    main_grid_html = "<div style='display:flex; flex-wrap:wrap; justify-content:center; gap:20px; padding: 10px;'>"
-    for key, info in benefit_icons.items():
-         # Modified css for main page (larger icons) and formatted as single line
-         main_grid_html += f"<div class='icon-box' style='width: 80px;' title='{info['label']}'><div class='icon-emoji {info['anim']}' style='font-size: 40px;'>{info['icon']}</div><div class='icon-label' style='font-size: 10px; margin-top:5px;'>{info['label']}</div></div>"
-    main_grid_html += "</div>"
-    st.markdown(main_grid_html, unsafe_allow_html=True)
-    st.markdown("---")
+    benefits_list = get_unique_benefits() # Uses DuckDB DISTINCT
 
-    # Row 1: Timeline & Breakdown
-    row1_col1, row1_col2 = st.columns([2, 1])
+    # Figure cache keys: (area, chart, year, options). The area part covers everything
+    # area_df_melted and the titles depend on; specs are dropped when the data files change.
+    figure_area_key = (view_level, selected_area_code, value_basis)
+    figure_fingerprint = data_fingerprint()
 
-    with row1_col1:
-        st.subheader("📈 Trajectory of Growth")
-        fig1 = plot_projected_benefits_timeline(area_df_melted, display_pure_name)
-        st.plotly_chart(fig1, use_container_width=True)
+    def figure_job(slot, label, chart, build, year=None, **options):
+        key = (figure_area_key, chart, year, tuple(sorted(options.items())))
+        return (slot, label, lambda: cached_figure(key, build, figure_fingerprint))
 
-    with row1_col2:
-        # st.subheader("🧩 Benefit Composition (2050)")
-        # fig2 = plot_benefit_breakdown_2050(area_df_melted, display_pure_name)
-        # st.plotly_chart(fig2, use_container_width=True)
-        
-        # UPGRADE: Using Rose Chart instead of Pie for "Juara" effect
-        st.subheader(f"🌹 Benefit Flower")
-        
-        # User control: Static (Specific Year) or Animation (Bloom)?
-        rose_mode = st.toggle("🌺 Animate Bloom (2025-2050)", value=False)
+    with tab1:
+        if tab1.open:
+            # --- INTERACTIVE BENEFIT EXPLORER ---
+            st.subheader("💡 Interactive Benefit Explorer")
+            st.write("Hover over the icons to see the 'Pulse' of each benefit category.")
+    
+            # Reuse the same grid HTML logic but larger (Flattened to avoid Raw HTML bug)
+            main_grid_html = "<div style='display:flex; flex-wrap:wrap; justify-content:center; gap:20px; padding: 10px;'>"
+            for key, info in benefit_icons.items():
+                 # Modified css for main page (larger icons) and formatted as single line
+                 main_grid_html += f"<div class='icon-box' style='width: 80px;' title='{info['label']}'><div class='icon-emoji {info['anim']}' style='font-size: 40px;'>{info['icon']}</div><div class='icon-label' style='font-size: 10px; margin-top:5px;'>{info['label']}</div></div>"
+            main_grid_html += "</div>"
+            st.markdown(main_grid_html, unsafe_allow_html=True)
+            st.markdown("---")
+
+            # Layout and widgets first; figures are built concurrently below and fill their slots
+            # Row 1: Timeline & Breakdown
+            row1_col1, row1_col2 = st.columns([2, 1])
+
+            with row1_col1:
+                st.subheader("📈 Trajectory of Growth")
+                slot_timeline = figure_slot("trajectory")
+
+            with row1_col2:
+                # UPGRADE: Using Rose Chart instead of Pie for "Juara" effect
+                st.subheader(f"🌹 Benefit Flower")
         
-        try:
-             year_arg = None if rose_mode else metric_year
-             fig_rose = plot_benefit_rose_chart(area_df_melted, display_pure_name, year=year_arg)
-             st.plotly_chart(fig_rose, use_container_width=True)
-        except Exception as e:
-             st.error(f"Could not render rose chart: {e}")
+                # User control: Static (Specific Year) or Animation (Bloom)?
+                rose_mode = st.toggle("🌺 Animate Bloom (2025-2050)", value=False, key="rose_bloom")
+                year_arg = None if rose_mode else metric_year
+                slot_rose = figure_slot("rose chart")
 
-    st.markdown("---")
+            st.markdown("---")
     
-    # SANKEY DIAGRAM (Value Flow)
-    st.subheader(f"🌊 Value Flow Analysis ({metric_year})")
-    st.write("Trace where the economic value originates (Health vs Infrastructure vs Environment).")
-    try:
-        fig_sankey = plot_benefit_sankey(area_df_melted, display_pure_name, year=metric_year)
-        st.plotly_chart(fig_sankey, use_container_width=True)
-    except Exception as e:
-        st.error(f"Could not render Sankey: {e}")
+            # SANKEY DIAGRAM (Value Flow)
+            st.subheader(f"🌊 Value Flow Analysis ({metric_year})")
+            st.write("Trace where the economic value originates (Health vs Infrastructure vs Environment).")
+            if view_level is None:
+                sankey_levels = ('Category', 'Label')
+                df_sankey = area_df_melted
+            else:
+                # Regions: flow from each sub-region (largest ones, the rest as 'Other') into the categories
+                sankey_child = CHILD_LEVELS[view_level]
+                st.caption(f"Split by {sankey_child.replace('_', ' ')}; the {SANKEY_MAX_REGIONS} largest are shown, the rest as 'Other'.")
+                sankey_levels = (sankey_child, 'Category', 'Label')
+                df_sankey = get_region_breakdown(view_level, selected_area_code)
+                if value_basis != "absolute" and not df_sankey.empty:
+                    df_sankey = df_sankey.assign(Benefit_Value=df_sankey['Benefit_Value'] * factor)
+            slot_sankey = figure_slot("Sankey")
         
-    st.markdown("---")
+            st.markdown("---")
 
-    # Row 2: Comparison
-    st.subheader("🏆 Contextual Comparison")
-    st.write(f"How does {display_pure_name} compare to other top regions?")
+            # Row 2: Comparison
+            st.subheader("🏆 Contextual Comparison")
+            st.write(f"How does {display_pure_name} compare to other top regions?")
     
-    # Get Unique Benefits for dropdown
-    benefits_list = get_unique_benefits() # Uses DuckDB DISTINCT
-    comparison_type = st.selectbox("Compare by Benefit Type", ["Total"] + benefits_list)
+            comparison_type = st.selectbox("Compare by Benefit Type", ["Total"] + benefits_list)
 
-    if comparison_type == "Total":
-        df_top10 = get_top_areas_data(None, 2050)
-    else:
-        df_top10 = get_top_areas_data(comparison_type, 2050)
+            if comparison_type == "Total":
+                df_top10 = get_top_areas_data(None, 2050, basis=value_basis)
+            else:
+                df_top10 = get_top_areas_data(comparison_type, 2050, basis=value_basis)
         
-    # Map Codes to Names for clearer display
-    if not df_lookup.empty:
-         # Create a map code -> name
-        code_to_name = pd.Series(df_lookup.local_authority.values, index=df_lookup.small_area).to_dict()
-        df_top10['Display_Name'] = df_top10['small_area'].map(code_to_name).fillna(df_top10['small_area'])
-    else:
-        df_top10['Display_Name'] = df_top10['small_area']
-
-    # NOTE: plot_top_areas_comparison expects df_wide format. 
-    # But now we are passing a pre-aggregated DF with columns [small_area, Benefit_Value].
-    # We need to adapt the function calls or the function itself.
-    # Actually, simpler to just plot directly here or make a new simple plotter.
-    # Let's use internal simple plotting for robustness
-    import plotly.express as px
-    fig3 = px.bar(
-        df_top10.sort_values('Benefit_Value', ascending=True),
-        y='Display_Name',
-        x='Benefit_Value',
-        orientation='h',
-        title=f"Top 10 Areas ({'Total' if comparison_type=='Total' else comparison_type}) in 2050",
-        template='plotly_dark',
-        color='Benefit_Value',
-        color_continuous_scale='Viridis',
-        hover_data=['small_area']
-    )
-    fig3.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)", font=dict(family="Inter"))
-    
-    st.plotly_chart(fig3, use_container_width=True)
-
-with tab2:
-    st.header("⏳ Evolution of Benefits (Animation)")
-    st.write("Press 'Play' to see how the benefits landscape changes from 2025 to 2050.")
+            # Map Codes to Names for clearer display
+            area_codes = df_top10['small_area'].astype(str)
+            df_top10['Display_Name'] = area_codes.map(area_index.code_to_name).fillna(area_codes)
+            slot_top10 = figure_slot("top 10 comparison")
+
+            def build_top10():
+                # NOTE: plot_top_areas_comparison expects df_wide format, df_top10 is pre-aggregated
+                # [small_area, Benefit_Value], so plot it directly here
+                import plotly.express as px
+                fig3 = px.bar(
+                    df_top10.sort_values('Benefit_Value', ascending=True),
+                    y='Display_Name',
+                    x='Benefit_Value',
+                    orientation='h',
+                    title=f"Top 10 Areas ({'Total' if comparison_type=='Total' else comparison_type}{basis_suffix}) in 2050",
+                    template=figure_template(),
+                    color='Benefit_Value',
+                    color_continuous_scale='Viridis',
+                    hover_data=['small_area']
+                )
+                fig3.update_layout(plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)", font=dict(family="Inter"))
+                return fig3
+
+            render_figures([
+                figure_job(slot_timeline, "trajectory", "timeline",
+                           lambda: plot_projected_benefits_timeline(area_df_melted, display_pure_name)),
+                figure_job(slot_rose, "rose chart", "rose",
+                           lambda: plot_benefit_rose_chart(area_df_melted, display_pure_name, year=year_arg),
+                           year=year_arg, bloom=rose_mode),
+                figure_job(slot_sankey, "Sankey", "sankey",
+                           lambda: plot_benefit_sankey(df_sankey, display_pure_name, year=metric_year,
+                                                       levels=sankey_levels, max_nodes=SANKEY_MAX_REGIONS),
+                           year=metric_year, levels=sankey_levels),
+                figure_job(slot_top10, "top 10 comparison", "top10", build_top10,
+                           year=2050, benefit=comparison_type),
+            ])
+
+    with tab2:
+        if tab2.open:
+            st.header("⏳ Evolution of Benefits (Animation)")
+            st.write("Press 'Play' to see how the benefits landscape changes from 2025 to 2050.")
     
-    anim_type = st.radio("Select Animation Style:", ["Bar Race (Ranking)", "Motion Bubble (Value vs Growth)"], horizontal=True)
+            anim_type = st.radio("Select Animation Style:", ["Bar Race (Ranking)", "Motion Bubble (Value vs Growth)"], horizontal=True)
     
-    if anim_type == "Bar Race (Ranking)":
-        fig_timelapse = plot_time_lapse(area_df_melted, display_pure_name)
-        st.plotly_chart(fig_timelapse, use_container_width=True)
-    else:
-        st.info("💡 **How to read:** The **X-axis** is the Total Value, **Y-axis** is the Speed of Growth. Bubbles moving UP are accelerating!")
-        fig_bubble = plot_motion_bubble_chart(area_df_melted, display_pure_name)
-        st.plotly_chart(fig_bubble, use_container_width=True)
+            if anim_type == "Bar Race (Ranking)":
+                slot_anim = figure_slot("bar race")
+                job_anim = figure_job(slot_anim, "bar race", "time_lapse",
+                                      lambda: plot_time_lapse(area_df_melted, display_pure_name))
+            else:
+                st.info("💡 **How to read:** The **X-axis** is the Total Value, **Y-axis** is the Speed of Growth. Bubbles moving UP are accelerating!")
+                slot_anim = figure_slot("motion bubbles")
+                job_anim = figure_job(slot_anim, "motion bubbles", "motion_bubble",
+                                      lambda: plot_motion_bubble_chart(area_df_melted, display_pure_name))
     
-    st.markdown("### 🔥 Intensity Heatmap")
-    fig_heat = plot_heatmap_year_benefit(area_df_melted)
-    st.plotly_chart(fig_heat, use_container_width=True)
+            st.markdown("### 🔥 Intensity Heatmap")
+            slot_heat = figure_slot("heatmap")
 
-with tab3:
-    st.header("🗺️ Geographic Distribution (Timeline)")
-    
-    # Load Shapefile (GeoJSON) - Cached
-    with st.spinner("Loading Map..."):
-        gdf_uk = load_shapefile()
+            render_figures([
+                job_anim,
+                figure_job(slot_heat, "heatmap", "heatmap", lambda: plot_heatmap_year_benefit(area_df_melted)),
+            ])
 
-    if not gdf_uk.empty:
-        col_map_1, col_map_2 = st.columns([3, 1])
-        with col_map_1:
-            
-            # --- MAP CONTROLS ---
-            map_year = st.slider("Select Year", min_value=2025, max_value=2050, value=2050, step=1)
-            map_benefit = st.selectbox("Select Benefit to Map:", ["Total"] + benefits_list)
+    with tab3:
+        if tab3.open:
+            st.header("🗺️ Geographic Distribution (Timeline)")
+    
+            # Resolution: small areas (level of detail picked from the selected extent) or local authorities
+            map_levels = ["Small areas"]
+            if os.path.exists(GEOMETRY_LEVELS["local_authority"]["path"]) and not df_lookup.empty:
+                map_levels.append("Local authorities")
+            map_resolution = st.radio("Map resolution:", map_levels, horizontal=True)
+
+            # Extent: whole UK, the selected area's local authority / nation, or a bounding box
+            focus_column, focus_name = None, None
+            if view_level is None:
+                area_la = df_lookup.loc[df_lookup['small_area'] == selected_area_code, 'local_authority'].dropna()
+                if len(area_la):
+                    focus_column, focus_name = "local_authority", area_la.iloc[0]
+            elif view_level in ("local_authority", "nation"):
+                focus_column, focus_name = view_level, selected_area_code
+            map_extents = ["United Kingdom"] + ([focus_name] if focus_name else []) + ["Bounding box"]
+            map_extent = st.radio("Map extent:", map_extents, horizontal=True, key="map_extent")
+
+            map_center, map_zoom, map_bbox = None, UK_ZOOM, None
+            if map_extent != "United Kingdom":
+                # Bounds from the coarse small areas (loaded once per process)
+                with st.spinner("Loading Map..."):
+                    bounds_cache = geometry_shapes("coarse")
+                focus_bbox = None
+                if bounds_cache is not None and focus_name:
+                    focus_codes = df_lookup.loc[df_lookup[focus_column] == focus_name, 'small_area']
+                    focus_bbox = region_bounds(bounds_cache, focus_codes)
+                if map_extent == "Bounding box":
+                    default_bbox = focus_bbox or (-4.5, 55.7, -4.0, 56.0)
+                    bbox_cols = st.columns(4)
+                    map_bbox = tuple(
+                        col.number_input(label, value=round(default, 3), step=0.05, format="%.3f", key=f"map_bbox_{i}")
+                        for i, (col, label, default) in enumerate(zip(
+                            bbox_cols, ["West (lon)", "South (lat)", "East (lon)", "North (lat)"], default_bbox))
+                    )
+                    if map_bbox[0] >= map_bbox[2] or map_bbox[1] >= map_bbox[3]:
+                        st.warning("West must be less than East and South less than North.")
+                        map_bbox = None
+                elif focus_bbox is None:
+                    st.warning(f"No map geometry found for {focus_name}; showing the whole UK.")
+                else:
+                    map_bbox = focus_bbox
+            if map_bbox is not None:
+                map_bbox = tuple(round(v, 4) for v in map_bbox)
+                map_center, map_zoom = fit_view(map_bbox)
+
+            geometry_level = "local_authority" if map_resolution == "Local authorities" else pick_lod(map_zoom)
+
+            # Load Geometry (pre-serialised GeoJSON + feature index) - Cached per process and level;
+            # regional views only carry the polygons intersecting their box (STRtree query)
+            with st.spinner("Loading Map..."):
+                if map_bbox is None:
+                    geo_cache = load_geometry_cache(geometry_level)
+                else:
+                    geo_cache = region_geometry(geometry_level, map_bbox)
+
+            if geo_cache is not None:
+                col_map_1, col_map_2 = st.columns([3, 1])
+                with col_map_1:
             
-            # Fetch Map Data on fly
-            if map_benefit == "Total":
-                query_map = f"SELECT small_area, SUM(\"{map_year}\") as Benefit_Value FROM 'data_chunks/level_3_part_*.parquet' GROUP BY small_area"
+                    # --- MAP CONTROLS ---
+                    # Play mode: one area x year query and one geometry payload, frames swap colours only
+                    map_animate = st.toggle("▶️ Play 2025→2050", value=False, key="map_animate")
+                    animation_bytes = estimate_animation_bytes(geo_cache, len(YEAR_COLUMNS))
+                    if map_animate and animation_bytes > MAP_ANIMATION_MAX_BYTES:
+                        # Too heavy to send on every rerun (e.g. every UK small area): single year instead
+                        st.info(f"Playing {len(geo_cache['codes']):,} areas would send ~{animation_bytes / 1e6:.1f} MB. "
+                                "Focus the map on a region or switch to local authorities to play it.")
+                        map_animate = False
+                    if not map_animate:
+                        map_year = st.slider("Select Year", min_value=2025, max_value=2050, value=2050, step=1, key="map_year")
+                    map_benefit = st.selectbox("Select Benefit to Map:", ["Total"] + benefits_list)
+
+                    if map_animate:
+                        def build_map_animation():
+                            codes, years, values = get_map_matrix(map_benefit)
+                            if geometry_level == "local_authority":
+                                codes, values = rollup_matrix(codes, values, "local_authority")
+                                values = normalise_matrix(codes, values, value_basis, level="local_authority")
+                            else:
+                                values = normalise_matrix(codes, values, value_basis)
+                            return plot_choropleth_animation(geo_cache, codes, years, values, map_benefit,
+                                                             center=map_center, zoom=map_zoom)
+
+                        # Shared by every session showing the same benefit, basis and extent
+                        map_options = (("basis", value_basis), ("bbox", map_bbox), ("benefit", map_benefit), ("level", geometry_level))
+                        fig_map = cached_figure(("map", "map_animation", None, map_options), build_map_animation, figure_fingerprint)
+                    else:
+                        # Fetch Map Data on fly (shared DuckDB connection, pooled cursors)
+                        df_map_data = get_map_data(map_benefit, map_year)
+
+                        if geometry_level == "local_authority":
+                            # Sum small areas per local authority
+                            area_to_la = pd.Series(df_lookup.local_authority.values, index=df_lookup.small_area)
+                            df_map_data = (
+                                df_map_data.assign(local_authority=df_map_data['small_area'].astype(str).map(area_to_la))
+                                .groupby('local_authority')['Benefit_Value'].sum()
+                                .reset_index()
+                            )
+                            df_map_data = normalise_values(df_map_data, value_basis, key='local_authority', level='local_authority')
+                        else:
+                            df_map_data = normalise_values(df_map_data, value_basis)
+
+                        with stage("figure", "map"):
+                            fig_map = plot_choropleth_map(geo_cache, df_map_data, map_benefit, center=map_center, zoom=map_zoom)
+                        # Update title dynamically for the year
+                        fig_map.update_layout(title=f"Geographic Distribution of Benefits ({map_benefit}, {map_year})")
+
+                    st.plotly_chart(fig_map, use_container_width=True)
+
+                with col_map_2:
+                    if map_bbox is None and not isinstance(geo_cache["geojson"], str):
+                        # Static serving off: the whole national geometry travels with every rerun
+                        st.warning("Static file serving is off, so the full map geometry is resent on every update. "
+                                   "Start the app from the repository root to enable it.")
+                    st.info("Interactive Map.")
+                    st.markdown(f"**Year:** {'2025-2050' if map_animate else map_year}")
+                    st.markdown(f"**Metric:** {map_benefit}")
+                    st.markdown(f"**Basis:** {basis_label}")
+                    st.markdown(f"**Areas drawn:** {len(geo_cache['codes']):,}")
+                    st.write("Using optimized GeoJSON + DuckDB.")
             else:
-                 query_map = f"SELECT small_area, \"{map_year}\" as Benefit_Value FROM 'data_chunks/level_3_part_*.parquet' WHERE \"co-benefit_type\" = '{map_benefit}'"
-            
-            import duckdb
-            df_map_data = duckdb.execute(query_map).fetchdf()
-            
-            # Use the existing plotter. df_map_data has 'Benefit_Value'.
-            # Add 'co-benefit_type' col if needed by filter logic in plotter, 
-            # OR modify plotter to accept simpler data. (Already modified plotter).
-            
-            # Add dummy year column if plotter strictly requires it, but we modified plotter to handle 'Benefit_Value' direct.
-            # Passing 2050 as benefit value name
-            
-            fig_map = plot_choropleth_map(gdf_uk, df_map_data.copy(), map_benefit)
-            # Update title dynamically for the year
-            fig_map.update_layout(title=f"Geographic Distribution of Benefits ({map_benefit}, {map_year})")
-            
-            st.plotly_chart(fig_map, use_container_width=True)
-            
-        with col_map_2:
-            st.info("Interactive Map.")
-            st.markdown(f"**Year:** {map_year}")
-            st.markdown(f"**Metric:** {map_benefit}")
-            st.write("Using optimized GeoJSON + DuckDB.")
-    else:
-        st.error("Shapefile could not be loaded.")
+                st.error("Shapefile could not be loaded.")
+
+    with tab4:
+        if tab4.open:
+            st.header("🆚 Compare Areas")
+            st.write("Pick up to 10 small areas; their data is fetched in a single query.")
+
+            # Options = current picks + search matches, so the page never carries all areas
+            compare_query = st.text_input("Search areas to add", value="", placeholder="Council name or area code", key="compare_query")
+            compare_picked = st.session_state.get("compare_areas", [])
+            compare_options = list(dict.fromkeys(compare_picked + area_index.search(compare_query)))
+
+            compare_areas = st.multiselect(
+                "Areas to compare",
+                compare_options,
+                max_selections=MAX_COMPARE_AREAS,
+                key="compare_areas"
+            )
+
+            if compare_areas:
+                compare_benefit = st.selectbox("Benefit", ["Total"] + get_unique_benefits(), key="compare_benefit")
+                compare_codes = [area_index.display_to_code[name] for name in compare_areas]
+                df_compare = get_areas_data_melted(compare_codes)
+                with stage("figure", "compare"):
+                    fig_compare = plot_area_comparison(df_compare, dict(zip(compare_codes, compare_areas)), compare_benefit)
+                st.plotly_chart(fig_compare, use_container_width=True)
+            else:
+                st.info("Search for an area above and add it to start comparing.")
+finally:
+    finish_rerun(rerun_trace)
+
+# --- DEBUG: RERUN TIMINGS ---
+with st.sidebar:
+    if st.toggle("🛠️ Show rerun timings", value=False, key="debug_timings"):
+        render_debug_panel(rerun_trace)
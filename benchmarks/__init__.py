@@ -0,0 +1,7 @@
+"""
+Benchmarks for the data and figure hot paths.
+
+    python -m benchmarks.generate --scale 1 --out bench_data   # synthetic national-scale dataset
+    python -m benchmarks.run --data bench_data                 # timed scenarios (p50 / p95 / RSS)
+    python -m benchmarks.load_test --data bench_data --sessions 8   # concurrent AppTest sessions
+"""
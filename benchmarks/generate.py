@@ -0,0 +1,215 @@
+"""
+Synthetic Level 3 co-benefits dataset at (multiples of) national scale.
+
+Same schema as the real data: small_area, co-benefit_type, damage_type,
+damage_pathway, one float32 column per year 2025-2050 and their sum, ~22 rows
+per area. Area codes, councils, nations and population come from the real
+lookup table when it is available; scales above 1 replicate the real areas
+with suffixed codes.
+The output directory gets the full build (clustered chunks, cube, rank index,
+roll-ups, lookup sidecar) and map geometry (one square per area, councils as
+blocks of squares), so the app and the benchmarks can run against it.
+
+    python -m benchmarks.generate --scale 1 --out bench_data
+"""
+import argparse
+import math
+import os
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+
+from src.schema import YEAR_COLUMNS, BENEFIT_TYPES, cast_table
+from src.data import LOOKUP_FILE, LOOKUP_SIDECAR, read_lookup_table
+from src.map_viz import GEOMETRY_LEVELS
+
+NATIONAL_AREAS = 46_426
+AREAS_PER_BATCH = 10_000
+
+# (damage_type, damage_pathway) rows per benefit: 22 rows per area, like Level 3
+BENEFIT_PATHWAYS = {
+    "air_quality": [("health", "reduced_mortality"), ("health", "NHS"), ("health", "QALY"), ("non-health", "society")],
+    "congestion": [("non-health", "time_saved")],
+    "dampness": [("health", "NHS"), ("health", "QALY")],
+    "diet_change": [("health", "reduced_mortality"), ("health", "NHS")],
+    "excess_cold": [("health", "NHS"), ("health", "QALY"), ("non-health", "society")],
+    "excess_heat": [("health", "reduced_mortality")],
+    "hassle_costs": [("non-health", "time_saved")],
+    "noise": [("health", "QALY"), ("non-health", "society")],
+    "physical_activity": [("health", "reduced_mortality"), ("health", "NHS"), ("health", "QALY")],
+    "road_repairs": [("non-health", "society")],
+    "road_safety": [("health", "reduced_mortality"), ("non-health", "society")],
+}
+
+# Net costs in the real data: longer journeys, and congestion in some areas
+NEGATIVE_BENEFITS = {"hassle_costs"}
+MIXED_SIGN_BENEFITS = {"congestion"}
+
+NATION_PREFIXES = {"E01": "Eng/Wales", "W01": "Eng/Wales", "S01": "Scotland", "N20": "NI"}
+
+# Synthetic geometry is laid out over the UK's extent (lon/lat, EPSG:4326)
+UK_EXTENT = (-6.0, 50.0, 2.0, 58.5)
+
+
+def _synthetic_lookup(n_areas, rng):
+    """
+    Lookup table with made-up codes when lookups.xlsx is not available:
+    nation shares roughly as in the UK, ~120 areas per council.
+    """
+    prefixes = rng.choice(list(NATION_PREFIXES), size=n_areas, p=[0.74, 0.04, 0.15, 0.07])
+    codes = [f"{p}{i:06d}" for i, p in enumerate(prefixes)]
+    councils = [f"Council {i // 120:03d}" for i in range(n_areas)]
+    population = rng.integers(800, 3000, n_areas)
+    return pd.DataFrame({
+        "small_area": codes,
+        "population": population,
+        "households": (population / rng.uniform(2.1, 2.6, n_areas)).astype(int),
+        "local_authority": councils,
+        "nation": [NATION_PREFIXES[p] for p in prefixes],
+    })
+
+
+def build_lookup(scale, rng):
+    """
+    Lookup rows for round(NATIONAL_AREAS * scale) areas, based on the real
+    lookup table of the current directory when there is one.
+    """
+    n_areas = max(1, int(round(NATIONAL_AREAS * scale)))
+    if not os.path.exists(LOOKUP_FILE) and not os.path.exists(LOOKUP_SIDECAR):
+        return _synthetic_lookup(n_areas, rng)
+    base = read_lookup_table().reset_index(drop=True)
+    rows = np.arange(n_areas) % len(base)
+    replica = np.arange(n_areas) // len(base)
+    df = base.iloc[rows].reset_index(drop=True)
+    codes = df["small_area"].astype(str)
+    df["small_area"] = np.where(replica == 0, codes, codes + "-" + replica.astype(str))
+    return df
+
+
+def write_geometry(df_lookup):
+    """
+    Map files for the lookup's areas in the current directory: each council is a
+    square block of square areas, blocks tiled over UK_EXTENT. Squares do not
+    simplify, so only the coarse small-area level is written (finer levels fall
+    back to it) plus the local authorities dissolved from it.
+    """
+    councils, council_ids = np.unique(df_lookup["local_authority"].astype(str), return_inverse=True)
+    position = pd.Series(np.arange(len(df_lookup))).groupby(council_ids).cumcount().to_numpy()
+    block = math.ceil(math.sqrt(np.bincount(council_ids).max()))
+    columns = math.ceil(math.sqrt(len(councils)))
+    rows = math.ceil(len(councils) / columns)
+    west, south, east, north = UK_EXTENT
+    cell = min((east - west) / (columns * block), (north - south) / (rows * block))
+
+    x = west + (council_ids % columns * block + position % block) * cell
+    y = north - (council_ids // columns * block + position // block + 1) * cell
+    areas = gpd.GeoDataFrame({
+        "small_area": df_lookup["small_area"].astype(str).to_numpy(),
+        "local_authority": councils[council_ids],
+    }, geometry=shapely.box(x, y, x + cell, y + cell), crs="EPSG:4326")
+
+    areas[["small_area", "geometry"]].to_file(GEOMETRY_LEVELS["coarse"]["path"], driver="GeoJSON")
+    authorities = areas[["local_authority", "geometry"]].dissolve(by="local_authority").reset_index()
+    authorities.to_file(GEOMETRY_LEVELS["local_authority"]["path"], driver="GeoJSON")
+
+
+def _area_batch(codes, rng, growth):
+    """
+    Long rows (area x benefit x pathway) with year values for a batch of areas.
+    """
+    keys = [(b, t, p) for b in BENEFIT_TYPES for t, p in BENEFIT_PATHWAYS[b]]
+    n_keys = len(keys)
+    n_rows = len(codes) * n_keys
+
+    # Area size effect (lognormal) x benefit/pathway magnitude (gamma) x growth curve + noise
+    area_factor = rng.lognormal(0.0, 0.6, len(codes)).astype(np.float32)
+    magnitude = rng.gamma(2.0, 0.004, n_rows).astype(np.float32) * np.repeat(area_factor, n_keys)
+    noise = rng.normal(1.0, 0.05, (n_rows, len(YEAR_COLUMNS))).astype(np.float32)
+    values = magnitude[:, None] * growth[None, :] * noise
+
+    benefits = np.tile(np.array([k[0] for k in keys]), len(codes))
+    sign = np.ones(n_rows, dtype=np.float32)
+    sign[np.isin(benefits, list(NEGATIVE_BENEFITS))] = -1
+    mixed = np.isin(benefits, list(MIXED_SIGN_BENEFITS))
+    sign[mixed] = rng.choice([-1.0, 1.0], size=int(mixed.sum()), p=[0.4, 0.6])
+    values *= sign[:, None]
+
+    data = {
+        "small_area": np.repeat(np.asarray(codes), n_keys),
+        "co-benefit_type": benefits,
+        "damage_type": np.tile(np.array([k[1] for k in keys]), len(codes)),
+        "damage_pathway": np.tile(np.array([k[2] for k in keys]), len(codes)),
+    }
+    for i, year in enumerate(YEAR_COLUMNS):
+        data[year] = values[:, i]
+    data["sum"] = values.sum(axis=1)
+    return pa.table(data)
+
+
+def generate_dataset(out_dir, scale=1.0, seed=0):
+    """
+    Writes the synthetic dataset and runs the regular build steps inside out_dir.
+    Run from the repository root to base the areas on the real lookup table.
+    Returns the number of Level 3 rows.
+    """
+    rng = np.random.default_rng(seed)
+    df_lookup = build_lookup(scale, rng)
+
+    # Benefits ramp up towards 2050 (net-zero pathway), discounting flattens the tail
+    years = np.arange(len(YEAR_COLUMNS), dtype=np.float32)
+    growth = (0.2 + 2.8 * (1 - np.exp(-years / 8))) * 0.97 ** years
+
+    os.makedirs(out_dir, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(out_dir)
+    try:
+        from cluster_data import cluster_parquet, PARQUET_FILE
+        from build_cube import build_cube, build_rank_index, build_rollups
+
+        started = time.perf_counter()
+        codes = df_lookup["small_area"].to_numpy()
+        total = 0
+        writer = None
+        try:
+            for start in range(0, len(codes), AREAS_PER_BATCH):
+                table = cast_table(_area_batch(codes[start:start + AREAS_PER_BATCH], rng, growth))
+                if writer is None:
+                    writer = pq.ParquetWriter(PARQUET_FILE, table.schema, compression="zstd")
+                writer.write_table(table)
+                total += table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        print(f"Generated {total:,} rows for {len(codes):,} areas in {time.perf_counter() - started:.1f}s")
+
+        # Sidecar only (no lookups.xlsx in out_dir): the app reads it as-is
+        os.makedirs(os.path.dirname(LOOKUP_SIDECAR), exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(df_lookup, preserve_index=False), LOOKUP_SIDECAR)
+        write_geometry(df_lookup)
+
+        cluster_parquet(memory_limit="1GB")
+        os.remove(PARQUET_FILE)
+        build_cube()
+        build_rank_index()
+        build_rollups()
+    finally:
+        os.chdir(cwd)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiple of national scale (46,426 areas)")
+    parser.add_argument("--out", default="bench_data", help="output directory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_dataset(args.out, args.scale, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Concurrent-session load test for app.py, driven headlessly with Streamlit's AppTest.
+
+Every simulated session is an AppTest instance on its own thread, all in this
+one process, so they share the process-wide caches (st.cache_resource, the
+area and figure caches) exactly like browser sessions of one `streamlit run`
+server. Each session runs a scripted journey, one rerun per step:
+
+    open app -> pick an area -> move metric_year -> animate the rose
+    -> open the Map tab -> scrub map_year
+
+A step that renders another tab than the one it drives counts as an error,
+so a journey cannot silently time the wrong page. Map steps are skipped (and
+reported as such) when the data directory has no geometry. A rerun that fails
+to compile app.py is a harness fault, not app latency: it is counted apart
+from the timings and fails the run. The harness reports rerun latency
+percentiles per step, CPU saturation (process CPU time over wall time and
+cores) and resident memory per session.
+
+    python -m benchmarks.load_test --data bench_data --sessions 8 --journeys 3
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.memory import current_rss_mb
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+OVERVIEW_TAB = "📊 Overview"
+MAP_TAB = "🗺️ Map"
+YEARS = range(2025, 2051)
+SAMPLE_INTERVAL_SECONDS = 0.5
+
+# Outcome of one rerun
+OK, ERROR, COMPILE_ERROR, SKIPPED = "ok", "error", "compile error", "skipped"
+
+# The script runner of the last run started on each session thread
+_runs = threading.local()
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def journey_steps(area, rng, scrub=3):
+    """
+    (step name, session-state changes, tab the step must render) for one
+    journey, one rerun per step. Widget values are set through their keys, as a
+    user interaction would. Every step sets its tab again rather than relying on
+    AppTest carrying it over, and Session.rerun checks it was rendered.
+    """
+    steps = [
+        ("pick area", {"main_tab": OVERVIEW_TAB, "rose_bloom": False, "area_query": area}, OVERVIEW_TAB),
+        ("move metric_year", {"main_tab": OVERVIEW_TAB, "metric_year": int(rng.choice(YEARS))}, OVERVIEW_TAB),
+        ("animate rose", {"main_tab": OVERVIEW_TAB, "rose_bloom": True}, OVERVIEW_TAB),
+        ("open map tab", {"main_tab": MAP_TAB, "map_animate": False}, MAP_TAB),
+    ]
+    for _ in range(scrub):
+        steps.append(("scrub map_year", {"main_tab": MAP_TAB, "map_year": int(rng.choice(YEARS))}, MAP_TAB))
+    return steps
+
+
+def map_available():
+    """True if the working directory has geometry for at least one map level."""
+    from src.map_viz import GEOMETRY_LEVELS, geometry_source
+
+    return any(os.path.exists(geometry_source(level)[0]) for level in GEOMETRY_LEVELS)
+
+
+def last_run_failed_to_compile():
+    """True if the last AppTest run on this thread stopped before executing app.py."""
+    from streamlit.runtime.scriptrunner.script_runner import ScriptRunnerEvent
+
+    runner = getattr(_runs, "runner", None)
+    return runner is not None and ScriptRunnerEvent.SCRIPT_STOPPED_WITH_COMPILE_ERROR in runner.events
+
+
+def rendered_tab(app):
+    """
+    The tab a finished run rendered, judged by its widgets: the Map tab has
+    the map_year slider or a choropleth, the Overview has the rose toggle.
+    """
+    if any(s.key == "map_year" for s in app.slider):
+        return MAP_TAB
+    for chart in app.get("plotly_chart"):
+        if '"choroplethmap"' in chart.proto.spec:
+            return MAP_TAB
+    if any(t.key == "rose_bloom" for t in app.toggle):
+        return OVERVIEW_TAB
+    return None
+
+
+def share_runtime_between_sessions():
+    """
+    AppTest is built for one test at a time: every run stores a fresh mock
+    Runtime as the global instance and clears it when the run ends, so with
+    sessions on several threads one run's clean-up pulls the runtime from under
+    the others. It also recompiles app.py on every run (AppTest and its script
+    runner each make their own bytecode cache), which a server does not do, and
+    concurrent compiles fail on Python 3.11 ("AST constructor recursion depth
+    mismatch").
+
+    This points AppTest at a Runtime subclass that keeps the first instance for
+    the whole process, as a server has exactly one, and both at one shared
+    bytecode cache. Its script runner also remembers itself per thread, so a
+    session can tell a compile failure from an app error. Relies on AppTest
+    internals; call it once before creating sessions.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    class ProcessRuntimeMeta(type(Runtime)):
+        def __setattr__(cls, name, value):
+            if name != "_instance":
+                super().__setattr__(name, value)
+            elif value is not None and Runtime._instance is None:
+                Runtime._instance = value
+
+    class ProcessRuntime(Runtime, metaclass=ProcessRuntimeMeta):
+        pass
+
+    class TrackedScriptRunner(local_script_runner.LocalScriptRunner):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            _runs.runner = self
+
+    script_cache = ScriptCache()
+    app_test.Runtime = ProcessRuntime
+    app_test.ScriptCache = lambda: script_cache
+    local_script_runner.ScriptCache = lambda: script_cache
+    app_test.LocalScriptRunner = TrackedScriptRunner
+
+
+class ResourceSampler(threading.Thread):
+    """
+    Samples process CPU utilisation (fraction of all cores) and RSS in the background.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL_SECONDS):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.cores = available_cores()
+        self.cpu = []
+        self.rss = []
+        self._stopped = threading.Event()
+
+    def run(self):
+        last_wall, last_cpu = time.perf_counter(), cpu_seconds()
+        while not self._stopped.wait(self.interval):
+            wall, cpu = time.perf_counter(), cpu_seconds()
+            self.cpu.append((cpu - last_cpu) / (wall - last_wall) / self.cores)
+            self.rss.append(current_rss_mb())
+            last_wall, last_cpu = wall, cpu
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Session:
+    """
+    One simulated browser session: an AppTest plus the timings of its reruns.
+    """
+
+    def __init__(self, session_id, areas, journeys, scrub, think_seconds, timeout, seed, with_map=True):
+        from streamlit.testing.v1 import AppTest
+
+        self.session_id = session_id
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.rng = np.random.default_rng([seed, session_id + 1])
+        self.areas = areas
+        self.journeys = journeys
+        self.scrub = scrub
+        self.think_seconds = think_seconds
+        self.with_map = with_map
+        self.records = []  # (step, latency_ms or None, outcome)
+
+    def rerun(self, step, changes=None, tab=None):
+        """
+        One rerun; it counts as an error if the app raised or, when `tab` is
+        given, rendered another tab (the journey would time the wrong page).
+        A rerun that never got to run app.py is a COMPILE_ERROR instead.
+        """
+        for key, value in (changes or {}).items():
+            self.app.session_state[key] = value
+        _runs.runner = None
+        started = time.perf_counter()
+        try:
+            self.app.run()
+            outcome = ERROR if self.app.exception else OK
+        except Exception as e:
+            print(f"Session {self.session_id}, {step}: {e}")
+            outcome = ERROR
+        latency_ms = (time.perf_counter() - started) * 1000
+        if last_run_failed_to_compile():
+            print(f"Session {self.session_id}, {step}: app.py failed to compile")
+            outcome = COMPILE_ERROR
+        elif outcome == OK and tab is not None and rendered_tab(self.app) != tab:
+            print(f"Session {self.session_id}, {step}: expected {tab}, got {rendered_tab(self.app)}")
+            outcome = ERROR
+        self.records.append((step, latency_ms, outcome))
+        if self.think_seconds:
+            time.sleep(self.think_seconds)
+
+    def run(self):
+        self.rerun("open app")
+        for _ in range(self.journeys):
+            area = str(self.rng.choice(self.areas))
+            for step, changes, tab in journey_steps(area, self.rng, self.scrub):
+                if tab == MAP_TAB and not self.with_map:
+                    self.records.append((step, None, SKIPPED))
+                else:
+                    self.rerun(step, changes, tab)
+
+
+def summarise(sessions, wall_seconds, sampler, rss_baseline):
+    """
+    Latency percentiles per step and overall, throughput, CPU and memory figures.
+    Latencies cover the reruns that ran app.py (OK or ERROR); skipped steps
+    and compile failures are only counted.
+    """
+    records = [r for s in sessions for r in s.records]
+    by_step = {}
+    for step, latency, outcome in records:
+        by_step.setdefault(step, []).append((latency, outcome))
+    by_step["all reruns"] = [(latency, outcome) for _, latency, outcome in records]
+
+    steps = []
+    for step, values in by_step.items():
+        latencies = np.array([v[0] for v in values if v[1] in (OK, ERROR)], dtype=float)
+        measured = len(latencies) > 0
+        steps.append({
+            "step": step,
+            "reruns": len(latencies),
+            "errors": sum(1 for v in values if v[1] == ERROR),
+            "compile_errors": sum(1 for v in values if v[1] == COMPILE_ERROR),
+            "skipped": sum(1 for v in values if v[1] == SKIPPED),
+            "p50_ms": float(np.percentile(latencies, 50)) if measured else None,
+            "p95_ms": float(np.percentile(latencies, 95)) if measured else None,
+            "p99_ms": float(np.percentile(latencies, 99)) if measured else None,
+            "max_ms": float(latencies.max()) if measured else None,
+        })
+
+    rss_peak = max(sampler.rss + [current_rss_mb()])
+    return {
+        "sessions": len(sessions),
+        "wall_seconds": wall_seconds,
+        "reruns_per_second": steps[-1]["reruns"] / wall_seconds if wall_seconds and steps else 0.0,
+        "cores": sampler.cores,
+        "cpu_mean": float(np.mean(sampler.cpu)) if sampler.cpu else 0.0,
+        "cpu_peak": float(np.max(sampler.cpu)) if sampler.cpu else 0.0,
+        "rss_baseline_mb": rss_baseline,
+        "rss_peak_mb": rss_peak,
+        "rss_per_session_mb": (rss_peak - rss_baseline) / len(sessions) if sessions else 0.0,
+        "steps": steps,
+    }
+
+
+def print_report(report):
+    def ms(value):
+        return f"{value:>9.0f}" if value is not None else f"{'-':>9}"
+
+    print(f"\n{'step':<18} {'reruns':>7} {'errors':>7} {'compile':>8} {'skipped':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for s in report["steps"]:
+        print(f"{s['step']:<18} {s['reruns']:>7} {s['errors']:>7} {s['compile_errors']:>8} {s['skipped']:>8} "
+              f"{ms(s['p50_ms'])} {ms(s['p95_ms'])} {ms(s['p99_ms'])} {ms(s['max_ms'])}")
+    print(f"\n{report['sessions']} sessions, {report['wall_seconds']:.1f}s, "
+          f"{report['reruns_per_second']:.2f} reruns/s")
+    print(f"CPU: {report['cpu_mean']:.0%} mean, {report['cpu_peak']:.0%} peak of {report['cores']} core(s)")
+    print(f"RSS: {report['rss_baseline_mb']:.0f} MB warm baseline, {report['rss_peak_mb']:.0f} MB peak, "
+          f"~{report['rss_per_session_mb']:.1f} MB per session")
+
+
+def run_load_test(sessions=4, journeys=1, scrub=3, think_seconds=0.0, ramp_seconds=0.0,
+                  timeout=120, seed=0):
+    """
+    Warms the process with one session, then runs `sessions` concurrent
+    sessions (started `ramp_seconds` apart in total) and returns the report.
+    """
+    from src.data import get_map_data
+
+    # Areas that have data (the lookup may list more than the dataset holds)
+    areas = get_map_data(None, 2050)["small_area"].astype(str).to_numpy()
+    if len(areas) == 0:
+        raise SystemExit("No area data found in the working directory.")
+
+    with_map = map_available()
+    if not with_map:
+        print("No map geometry in the working directory: Map steps are skipped.")
+
+    share_runtime_between_sessions()
+    print("Warm-up session (fills the process-wide caches, not measured)...")
+    Session(-1, areas, 1, scrub, 0.0, timeout, seed, with_map).run()
+    rss_baseline = current_rss_mb()
+
+    print(f"Running {sessions} concurrent sessions x {journeys} journey(s)...")
+    simulated = [Session(i, areas, journeys, scrub, think_seconds, timeout, seed, with_map) for i in range(sessions)]
+    threads = [threading.Thread(target=s.run, name=f"session-{s.session_id}") for s in simulated]
+    sampler = ResourceSampler()
+    sampler.start()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+        if ramp_seconds:
+            time.sleep(ramp_seconds / len(threads))
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+    sampler.stop()
+
+    # Sessions are still referenced here, so their state counts towards the peak
+    return summarise(simulated, wall_seconds, sampler, rss_baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=".", help="directory holding data_chunks/ (e.g. benchmarks.generate output)")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent sessions")
+    parser.add_argument("--journeys", type=int, default=1, help="journeys per session")
+    parser.add_argument("--scrub", type=int, default=3, help="map_year moves per journey")
+    parser.add_argument("--think", type=float, default=0.0, help="pause after each rerun, seconds")
+    parser.add_argument("--ramp", type=float, default=0.0, help="spread session starts over this many seconds")
+    parser.add_argument("--timeout", type=float, default=120, help="rerun timeout, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    # AppTest runs outside `streamlit run` and Streamlit applies its own logger levels:
+    # drop the bare-mode and deprecation warnings globally
+    logging.disable(logging.WARNING)
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    os.chdir(args.data)
+    report = run_load_test(args.sessions, args.journeys, args.scrub, args.think, args.ramp,
+                           args.timeout, args.seed)
+    print_report(report)
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {json_path}")
+
+    compile_errors = report["steps"][-1]["compile_errors"] if report["steps"] else 0
+    if compile_errors:
+        sys.exit(f"{compile_errors} rerun(s) failed to compile app.py: the harness, not the app, is at fault.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+Process memory readings shared by the benchmark scripts.
+"""
+import os
+import resource
+import sys
+
+
+def peak_rss_mb():
+    """Highest RSS of the process so far (lifetime, never goes down)."""
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    """Resident set size now (Linux /proc), else the lifetime peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return peak_rss_mb()
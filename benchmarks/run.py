@@ -0,0 +1,171 @@
+"""
+Timed benchmark scenarios for the data layer and the figure builders.
+
+Runs against a dataset directory built by benchmarks.generate (generated on
+the fly if missing) and reports p50 / p95 latency per scenario, the process's
+resident memory after it and how much the scenario added. All scenarios share
+one process (and its caches), so memory is attributed by difference, not as
+isolated peaks. Streamlit caches work outside a running app, so the functions
+are called exactly as the app calls them.
+
+    python -m benchmarks.run --data bench_data --repeat 20
+    python -m benchmarks.run --data bench_data --json results.json
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.memory import current_rss_mb, peak_rss_mb
+
+
+def time_scenario(name, func, repeat, setup=None):
+    """
+    Calls func() `repeat` times (setup() before each call, untimed).
+    Returns {"scenario", "runs", "p50_ms", "p95_ms", "rss_mb", "rss_delta_mb"}:
+    RSS after the scenario and its change over the scenario.
+    """
+    rss_before = current_rss_mb()
+    timings = []
+    for i in range(repeat):
+        if setup is not None:
+            setup(i)
+        started = time.perf_counter()
+        func(i)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "scenario": name,
+        "runs": repeat,
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "rss_mb": current_rss_mb(),
+        "rss_delta_mb": current_rss_mb() - rss_before,
+    }
+
+
+def _synthetic_geo_cache(codes):
+    """
+    Geometry cache shaped like map_viz.load_geometry_cache, without geometry:
+    measures value alignment and figure construction, not GeoJSON parsing.
+    """
+    codes = np.asarray(codes).astype(str)
+    return {
+        "geojson": {"type": "FeatureCollection", "features": []},
+        "codes": codes,
+        "index": pd.Index(codes),
+        "key": "small_area",
+        "path": "synthetic",
+    }
+
+
+def run_scenarios(repeat=10, seed=0):
+    # Imported here: the data module resolves its files relative to the working directory
+    from src import data
+    from src import visualizations as viz
+    from src.map_viz import align_values, plot_choropleth_map
+
+    rng = np.random.default_rng(seed)
+    codes = data.read_lookup_table()["small_area"].astype(str).to_numpy()
+    picks = rng.choice(codes, size=repeat * 11, replace=len(codes) < repeat * 11)
+    cache = data.get_area_cache()
+    results = []
+
+    # One-off loads per process, not part of any request's latency
+    data.load_rank_index()
+    data.load_denominators()
+    data.load_rollups()
+
+    def record(name, func, setup=None):
+        result = time_scenario(name, func, repeat, setup)
+        results.append(result)
+        print(f"  {name:<34} p50 {result['p50_ms']:8.1f} ms   p95 {result['p95_ms']:8.1f} ms")
+
+    # Process start-up: the memory-mapped sidecar, and the Excel parse it replaces
+    record("read_lookup_table (sidecar)", lambda i: data.read_lookup_table())
+    if os.path.exists(data.LOOKUP_FILE):
+        record("read_lookup_table (xlsx parse)", lambda i: data.build_lookup_sidecar())
+
+    # Data layer
+    record("get_area_data (cold)", lambda i: data.get_area_data(picks[i]), setup=lambda i: cache.clear())
+    record("get_area_data (cached)", lambda i: data.get_area_data(picks[0]))
+    record("get_areas_data (10 areas, cold)", lambda i: data.get_areas_data(list(picks[i * 10 + 1:i * 10 + 11])),
+           setup=lambda i: cache.clear())
+    record("process_area_data_from_df", lambda i: data.process_area_data_from_df(data.get_area_data(picks[0])))
+    record("get_top_areas_data (absolute)", lambda i: data.get_top_areas_data(None, 2025 + i % 26))
+    record("get_top_areas_data (per_capita)", lambda i: data.get_top_areas_data(None, 2025 + i % 26, basis="per_capita"))
+
+    geo_cache = _synthetic_geo_cache(codes)
+
+    def map_aggregation(i):
+        df = data.normalise_values(data.get_map_data(None, 2025 + i % 26), "per_capita")
+        return align_values(geo_cache, df)
+
+    record("map aggregation (national)", map_aggregation)
+
+    # Figure builders (one area, as on the dashboard tabs)
+    area = picks[0]
+    df_melted = data.get_area_data_melted(area)
+    df_wide = data.get_area_data(area)
+    df_map = data.get_map_data(None, 2050)
+    builders = {
+        "plot_projected_benefits_timeline": lambda i: viz.plot_projected_benefits_timeline(df_melted, area),
+        "plot_benefit_breakdown_2050": lambda i: viz.plot_benefit_breakdown_2050(df_melted, area),
+        "plot_top_areas_comparison": lambda i: viz.plot_top_areas_comparison(df_wide),
+        "plot_time_lapse": lambda i: viz.plot_time_lapse(df_melted, area),
+        "plot_heatmap_year_benefit": lambda i: viz.plot_heatmap_year_benefit(df_melted),
+        "plot_motion_bubble_chart": lambda i: viz.plot_motion_bubble_chart(df_melted, area),
+        "plot_benefit_rose_chart": lambda i: viz.plot_benefit_rose_chart(df_melted, area, year=2050),
+        "plot_benefit_rose_chart (bloom)": lambda i: viz.plot_benefit_rose_chart(df_melted, area),
+        "plot_benefit_sankey": lambda i: viz.plot_benefit_sankey(df_melted, area, year=2050),
+        "plot_area_comparison": lambda i: viz.plot_area_comparison(data.get_areas_data_melted(list(picks[1:11]))),
+        "plot_choropleth_map": lambda i: plot_choropleth_map(geo_cache, df_map),
+    }
+    for name, build in builders.items():
+        record(name, build)
+
+    return results
+
+
+def print_table(results):
+    print(f"\n{'scenario':<34} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'RSS after MB':>13} {'RSS +MB':>8}")
+    for r in results:
+        print(f"{r['scenario']:<34} {r['runs']:>5} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['rss_mb']:>13.0f} {r['rss_delta_mb']:>+8.1f}")
+    print(f"\nProcess peak RSS over all scenarios: {peak_rss_mb():.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="bench_data", help="dataset directory (benchmarks.generate output)")
+    parser.add_argument("--scale", type=float, default=1.0, help="scale used if the dataset has to be generated")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # Outside `streamlit run` every cached call warns about the missing runtime
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    if not os.path.isdir(os.path.join(args.data, "data_chunks")):
+        from benchmarks.generate import generate_dataset
+        print(f"No dataset in {args.data}, generating one at scale {args.scale}...")
+        generate_dataset(args.data, args.scale, args.seed)
+
+    os.chdir(args.data)
+    print(f"Benchmarking {os.getcwd()} ({args.repeat} runs per scenario)")
+    results = run_scenarios(args.repeat, args.seed)
+    print_table(results)
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {json_path}")
+
+
+if __name__ == "__main__":
+    main()
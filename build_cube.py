@@ -0,0 +1,128 @@
+import duckdb
+import glob
+import os
+from src.data import (
+    PARQUET_PATTERN,
+    CUBE_FILE,
+    RANK_INDEX_FILE,
+    QUANTILES_FILE,
+    ROLLUP_FILE,
+    LOOKUP_FILE,
+    LOOKUP_SIDECAR,
+    RANK_INDEX_K,
+    YEAR_COLUMNS,
+    cube_select_sql,
+    rollup_select_sql,
+    read_lookup_table,
+    build_lookup_sidecar
+)
+
+# ~46k areas per benefit -> a few row groups per benefit, pruned via min/max on co-benefit_type
+ROW_GROUP_SIZE = 16384
+
+def build_cube():
+    """
+    Materialises the aggregate cube (area x benefit x year, plus "Total")
+    as one small parquet file next to the chunks.
+    """
+    files = sorted(glob.glob(PARQUET_PATTERN))
+    if not files:
+        print("No chunk files found. Run cluster_data.py first.")
+        return
+
+    con = duckdb.connect()
+    con.read_parquet(files).create_view("level_3")
+
+    tmp_file = CUBE_FILE + ".tmp"
+    print(f"Aggregating {len(files)} chunk file(s) into {CUBE_FILE}...")
+    con.execute(f"""
+        COPY (
+            SELECT * FROM ({cube_select_sql()})
+            ORDER BY "co-benefit_type", small_area
+        ) TO '{tmp_file}' (FORMAT PARQUET, ROW_GROUP_SIZE {ROW_GROUP_SIZE}, COMPRESSION zstd)
+    """)
+    con.close()
+    os.replace(tmp_file, CUBE_FILE)
+
+    size_mb = os.path.getsize(CUBE_FILE) / 1_000_000
+    print(f"Done! {CUBE_FILE} ({size_mb:.1f} MB)")
+
+def build_rank_index(k=RANK_INDEX_K):
+    """
+    Writes the rank index from the cube, for every (benefit incl. "Total", year):
+    - RANK_INDEX_FILE: the top-k and bottom-k areas with their ranks
+    - QUANTILES_FILE: the 0..100 percentile breakpoints of the value distribution
+    """
+    if not os.path.exists(CUBE_FILE):
+        print("Cube not found. Run build_cube() first.")
+        return
+
+    con = duckdb.connect()
+    year_list = ", ".join(f'"{y}"' for y in YEAR_COLUMNS)
+    con.execute(f"""
+        CREATE TEMP TABLE cube_long AS
+        SELECT small_area, "co-benefit_type", CAST(Year AS SMALLINT) AS Year, Benefit_Value
+        FROM (UNPIVOT read_parquet('{CUBE_FILE}') ON {year_list} INTO NAME Year VALUE Benefit_Value)
+    """)
+
+    print(f"Writing top/bottom {k} areas per benefit and year to {RANK_INDEX_FILE}...")
+    con.execute(f"""
+        COPY (
+            SELECT * FROM (
+                SELECT
+                    "co-benefit_type", Year, small_area, Benefit_Value,
+                    row_number() OVER (PARTITION BY "co-benefit_type", Year ORDER BY Benefit_Value DESC, small_area) AS top_rank,
+                    row_number() OVER (PARTITION BY "co-benefit_type", Year ORDER BY Benefit_Value ASC, small_area) AS bottom_rank
+                FROM cube_long
+            )
+            WHERE top_rank <= {int(k)} OR bottom_rank <= {int(k)}
+            ORDER BY "co-benefit_type", Year, top_rank
+        ) TO '{RANK_INDEX_FILE}' (FORMAT PARQUET, COMPRESSION zstd)
+    """)
+
+    print(f"Writing percentile breakpoints to {QUANTILES_FILE}...")
+    con.execute(f"""
+        COPY (
+            SELECT "co-benefit_type", Year,
+                   quantile_cont(Benefit_Value, [i / 100 for i in range(0, 101)]) AS breakpoints
+            FROM cube_long
+            GROUP BY "co-benefit_type", Year
+            ORDER BY "co-benefit_type", Year
+        ) TO '{QUANTILES_FILE}' (FORMAT PARQUET, COMPRESSION zstd)
+    """)
+    con.close()
+    print("Done! Rank index written.")
+
+def build_rollups():
+    """
+    Writes benefit x year sums for every level of the lookups.xlsx hierarchy
+    (local authority, nation, UK) so whole regions are a single read at runtime.
+    """
+    if not os.path.exists(CUBE_FILE):
+        print("Cube not found. Run build_cube() first.")
+        return
+    if not os.path.exists(LOOKUP_FILE) and not os.path.exists(LOOKUP_SIDECAR):
+        print(f"{LOOKUP_FILE} not found, skipping roll-ups.")
+        return
+
+    con = duckdb.connect()
+    con.read_parquet(CUBE_FILE).create_view("cube")
+    con.register("lookup", read_lookup_table())
+
+    print(f"Rolling up to local authority / nation / UK into {ROLLUP_FILE}...")
+    con.execute(f"""
+        COPY (
+            SELECT * FROM ({rollup_select_sql()})
+            ORDER BY level, area, "co-benefit_type"
+        ) TO '{ROLLUP_FILE}' (FORMAT PARQUET, COMPRESSION zstd)
+    """)
+    con.close()
+    print("Done! Roll-ups written.")
+
+if __name__ == "__main__":
+    if os.path.exists(LOOKUP_FILE):
+        print("Compiling lookups.xlsx into the parquet sidecar...")
+        build_lookup_sidecar()
+    build_cube()
+    build_rank_index()
+    build_rollups()
@@ -0,0 +1,103 @@
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+import glob
+import os
+from src.schema import cast_table
+
+PARQUET_FILE = "Level_3.parquet"
+OUTPUT_DIR = "data_chunks"
+PART_PATTERN = "level_3_part_*.parquet"
+
+# Keep the dataset split into a few files (GitHub / Streamlit Cloud size limits),
+# but make every file cover a contiguous, sorted range of small areas.
+NUM_PARTS = 2
+
+# Small row groups = tight min/max statistics on small_area.
+# ~22 rows per area in Level 3 -> roughly 100 areas per row group,
+# so a `WHERE small_area = ?` lookup reads one row group instead of the whole file.
+ROW_GROUP_SIZE = 2048
+
+def _source_files():
+    """
+    Prefer the full converted parquet, fall back to re-clustering the existing chunks.
+    """
+    if os.path.exists(PARQUET_FILE):
+        return [PARQUET_FILE]
+    return sorted(glob.glob(os.path.join(OUTPUT_DIR, PART_PATTERN)))
+
+def _area_ranges(areas, num_parts):
+    """
+    Splits the sorted list of area codes into `num_parts` contiguous (first, last) ranges.
+    """
+    num_parts = max(1, min(num_parts, len(areas)))
+    size, extra = divmod(len(areas), num_parts)
+    ranges = []
+    start = 0
+    for i in range(num_parts):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((areas[start], areas[end - 1]))
+        start = end
+    return ranges
+
+def cluster_parquet(num_parts=NUM_PARTS, row_group_size=ROW_GROUP_SIZE, memory_limit=None):
+    sources = _source_files()
+    if not sources:
+        print("No Level 3 parquet found. Run convert_data.py first.")
+        return
+
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
+
+    con = duckdb.connect()
+    if memory_limit:
+        # Bounded memory: the sort spills to disk instead of growing
+        con.execute(f"SET memory_limit = '{memory_limit}'")
+
+    # Materialise once (DuckDB spills to disk if needed) so the sources can be overwritten safely.
+    print(f"Reading {len(sources)} file(s) and sorting by small_area...")
+    con.execute(
+        'CREATE TEMP TABLE level_3 AS SELECT * FROM read_parquet(?) ORDER BY small_area, "co-benefit_type"',
+        [sources]
+    )
+
+    # pandas may have stored its index in the source file; it is not part of the dataset
+    columns = [row[0] for row in con.execute("DESCRIBE level_3").fetchall()]
+    select_list = ", ".join(f'"{c}"' for c in columns if not c.startswith("__index_level_"))
+
+    areas = [row[0] for row in con.execute("SELECT DISTINCT small_area FROM level_3 ORDER BY small_area").fetchall()]
+    print(f"{len(areas)} small areas found.")
+
+    # Write to temporary names first, then swap, so a failed build never leaves a half-written dataset.
+    tmp_files = []
+    for i, (first, last) in enumerate(_area_ranges(areas, num_parts)):
+        reader = con.execute(
+            f'SELECT {select_list} FROM level_3 WHERE small_area BETWEEN ? AND ? ORDER BY small_area, "co-benefit_type"',
+            [first, last]
+        ).fetch_record_batch(row_group_size)
+
+        tmp_name = os.path.join(OUTPUT_DIR, f"level_3_part_{i}.parquet.tmp")
+        print(f"Saving part {i}: {first} -> {last}...")
+        writer = None
+        # Each batch (<= row_group_size rows) becomes exactly one row group,
+        # cast to the declared compact schema (float32 values, dictionary-encoded keys)
+        for batch in reader:
+            table = cast_table(pa.Table.from_batches([batch]))
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_name, table.schema, compression="zstd", write_statistics=True)
+            writer.write_table(table, row_group_size=row_group_size)
+        if writer is not None:
+            writer.close()
+        tmp_files.append(tmp_name)
+
+    con.close()
+
+    for old_file in glob.glob(os.path.join(OUTPUT_DIR, PART_PATTERN)):
+        os.remove(old_file)
+    for tmp_name in tmp_files:
+        os.replace(tmp_name, tmp_name[:-len(".tmp")])
+
+    print(f"Done! {len(tmp_files)} clustered files created in {OUTPUT_DIR}/")
+
+if __name__ == "__main__":
+    cluster_parquet()
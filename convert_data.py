@@ -1,6 +1,9 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import time
 import os
+from src.schema import cast_table
 
 excel_file = 'Level_3.xlsx'
 parquet_file = 'Level_3.parquet'
@@ -18,7 +21,10 @@ try:
     print(f"[{time.strftime('%H:%M:%S')}] Excel read complete. Rows: {len(df)}")
     
     print(f"[{time.strftime('%H:%M:%S')}] Saving to Parquet...")
-    df.to_parquet(parquet_file)
+    # Year columns come out of Excel as ints; the app expects string column names
+    df.columns = [str(c) for c in df.columns]
+    # Compact declared schema: float32 values, dictionary-encoded keys
+    pq.write_table(cast_table(pa.Table.from_pandas(df, preserve_index=False)), parquet_file)
     print(f"[{time.strftime('%H:%M:%S')}] SUCCESS: Saved to {parquet_file}")
     
 except Exception as e:
@@ -1,30 +1,69 @@
 import geopandas as gpd
+import pandas as pd
 import os
+from src.data import read_lookup_table
 
 shp_path = "small_areas_british_grid.shp"
-geojson_path = "small_areas.geojson"
+lookup_path = "lookups.xlsx"
+
+# Levels of detail, simplified in British National Grid metres (topology preserved).
+# src/map_viz.py picks the level that fits the map zoom.
+LOD_TOLERANCES = {
+    "fine": 10,
+    "medium": 100,
+    "coarse": 500,
+}
+LOD_PATHS = {level: f"small_areas_{level}.geojson" for level in LOD_TOLERANCES}
+
+# Local authorities dissolved from small areas, for the national overview
+LA_TOLERANCE = 500
+LA_PATH = "local_authorities.geojson"
+
+def simplify_keep_all(gdf, tolerance):
+    """
+    Topology-preserving simplification. Any area that still collapses to an
+    empty/invalid shape keeps its original geometry, so no area is dropped.
+    """
+    simplified = gdf.geometry.simplify(tolerance=tolerance, preserve_topology=True)
+    broken = simplified.is_empty | simplified.isna() | ~simplified.is_valid
+    if broken.any():
+        print(f"  {int(broken.sum())} areas kept at full resolution")
+        simplified[broken] = gdf.geometry[broken]
+    result = gdf.copy()
+    result['geometry'] = simplified
+    return result
 
 def convert():
     try:
         print("Loading Shapefile...")
         gdf = gpd.read_file(shp_path)
-        
+
         print(f"Original CRS: {gdf.crs}")
-        
-        # Reproject to WGS84
-        print("Reprojecting to EPSG:4326...")
-        gdf = gdf.to_crs("EPSG:4326")
-        
-        # ULTRA AGGRESSIVE SIMPLIFICATION
-        # Target: < 5MB file size
-        # 0.02 degrees ~ 2km precision. Good enough for national view.
-        print("Simplifying geometries (Aggressive)...")
-        gdf['geometry'] = gdf['geometry'].simplify(tolerance=0.02, preserve_topology=False)
-        
-        print(f"Saving to {geojson_path}...")
-        gdf.to_file(geojson_path, driver='GeoJSON')
+
+        for level, tolerance in LOD_TOLERANCES.items():
+            print(f"Simplifying geometries ({level}: {tolerance} m)...")
+            lod = simplify_keep_all(gdf, tolerance)
+
+            # Reproject to WGS84
+            lod = lod.to_crs("EPSG:4326")
+
+            print(f"Saving to {LOD_PATHS[level]}...")
+            lod.to_file(LOD_PATHS[level], driver='GeoJSON')
+            print(f"  {os.path.getsize(LOD_PATHS[level]) / 1_000_000:.1f} MB")
+
+        if os.path.exists(lookup_path):
+            print("Dissolving to local authorities...")
+            df_lookup = read_lookup_table()[['small_area', 'local_authority']]
+            gdf_la = gdf.merge(df_lookup, on='small_area', how='inner')
+            gdf_la = gdf_la[['local_authority', 'geometry']].dissolve(by='local_authority').reset_index()
+            gdf_la = simplify_keep_all(gdf_la, LA_TOLERANCE).to_crs("EPSG:4326")
+
+            print(f"Saving to {LA_PATH}...")
+            gdf_la.to_file(LA_PATH, driver='GeoJSON')
+            print(f"  {os.path.getsize(LA_PATH) / 1_000_000:.1f} MB")
+
         print("Conversion Complete!")
-        
+
     except Exception as e:
         print(f"Error: {e}")
 
@@ -0,0 +1,108 @@
+import openpyxl
+import pyarrow as pa
+import pyarrow.parquet as pq
+import numpy as np
+import time
+import os
+from cluster_data import cluster_parquet, PARQUET_FILE
+from src.schema import arrow_type
+
+EXCEL_FILE = "Level_3.xlsx"
+BATCH_SIZE = 50_000
+
+# DuckDB memory cap for the clustering sort; it spills to disk beyond this
+SORT_MEMORY_LIMIT = "1GB"
+
+def _log(message):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}")
+
+def _column_types(header):
+    """
+    Declared types (src/schema.py), from the header alone: year columns and "sum" -> float32,
+    everything else (area codes, benefit types, pathways) -> dictionary-encoded strings.
+    """
+    return [arrow_type(name) for name in header]
+
+def _to_record_batch(header, types, rows):
+    arrays = []
+    for i, arrow_type in enumerate(types):
+        column = [row[i] for row in rows]
+        if pa.types.is_dictionary(arrow_type):
+            values = pa.array([None if v is None else str(v) for v in column], type=pa.string())
+            arrays.append(values.cast(arrow_type))
+        else:
+            try:
+                values = np.array([np.nan if v is None else v for v in column], dtype=np.float32)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Column {header[i]!r} is declared numeric but holds text: {e}") from None
+            arrays.append(pa.array(values, type=arrow_type))
+    return pa.RecordBatch.from_arrays(arrays, names=header)
+
+def stream_excel_to_parquet(excel_file=EXCEL_FILE, parquet_file=PARQUET_FILE, batch_size=BATCH_SIZE):
+    """
+    Reads the workbook row by row (openpyxl read-only mode) and appends one
+    row group per batch, so memory stays at one batch whatever the file size.
+    Returns the number of data rows written.
+    """
+    workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    sheet = workbook.worksheets[0]
+    rows = sheet.iter_rows(values_only=True)
+
+    header = [str(h) for h in next(rows)]
+    types = _column_types(header)
+    tmp_file = parquet_file + ".tmp"
+    writer = pq.ParquetWriter(tmp_file, pa.schema(list(zip(header, types))), compression="zstd")
+    total = 0
+    started = time.perf_counter()
+
+    try:
+        batch = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            batch.append(row)
+            if len(batch) < batch_size:
+                continue
+
+            writer.write_batch(_to_record_batch(header, types, batch))
+            total += len(batch)
+            batch = []
+            _log(f"{total:,} rows ({total / (time.perf_counter() - started):,.0f} rows/s)")
+
+        if batch:
+            writer.write_batch(_to_record_batch(header, types, batch))
+            total += len(batch)
+    finally:
+        writer.close()
+        workbook.close()
+
+    if total == 0:
+        os.remove(tmp_file)
+        raise ValueError(f"{excel_file} has no data rows")
+    os.replace(tmp_file, parquet_file)
+    return total
+
+def ingest():
+    """
+    Level_3.xlsx -> Level_3.parquet (streamed) -> clustered data_chunks/ (out-of-core sort).
+    """
+    if not os.path.exists(EXCEL_FILE):
+        _log(f"ERROR: {EXCEL_FILE} not found.")
+        return
+
+    _log(f"Streaming {EXCEL_FILE} in batches of {BATCH_SIZE:,} rows...")
+    started = time.perf_counter()
+    total = stream_excel_to_parquet()
+    elapsed = time.perf_counter() - started
+    _log(f"Excel read complete: {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+    # Clustering needs a global sort by small_area, so it runs over the whole
+    # intermediate file (DuckDB spills to disk) rather than over the stream
+    _log("Clustering into data_chunks/...")
+    started = time.perf_counter()
+    cluster_parquet(memory_limit=SORT_MEMORY_LIMIT)
+    elapsed = time.perf_counter() - started
+    _log(f"SUCCESS: clustered {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    ingest()
@@ -1,6 +1,9 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import os
+from src.schema import cast_table
 
 PARQUET_FILE = "Level_3.parquet"
 OUTPUT_DIR = "data_chunks"
@@ -17,12 +20,13 @@ def split_parquet():
     df = pd.read_parquet(PARQUET_FILE)
     
     # Split into 2 chunks
-    chunks = np.array_split(df, 2)
+    chunks = np.array_split(np.arange(len(df)), 2)
     
-    for i, chunk in enumerate(chunks):
+    for i, rows in enumerate(chunks):
         filename = f"{OUTPUT_DIR}/level_3_part_{i}.parquet"
         print(f"Saving {filename}...")
-        chunk.to_parquet(filename)
+        table = pa.Table.from_pandas(df.iloc[rows], preserve_index=False)
+        pq.write_table(cast_table(table), filename)
         
     print("Done! Files created in data_chunks/")
 
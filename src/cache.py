@@ -0,0 +1,167 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+
+def estimate_size(value):
+    """
+    Approximate memory footprint of a cached value in bytes, including the
+    strings held by object and string columns.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return int(value.nbytes) + sum(sys.getsizeof(v) for v in value.ravel())
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with a byte budget, per-entry TTL and hit/miss counters.
+    Entries are tagged with a data fingerprint; when the fingerprint changes
+    (data files rebuilt), the whole cache is dropped.
+    Cached values are shared between sessions and must be treated as read-only.
+    Concurrent get_or_compute calls for one missing key compute it once: the
+    first caller computes, the others wait for its result.
+    """
+
+    def __init__(self, max_bytes, ttl_seconds=None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._bytes = 0
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._inflight = {}  # (key, fingerprint) -> Future of the running compute
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_fingerprint(self, fingerprint):
+        if fingerprint != self._fingerprint:
+            self._entries.clear()
+            self._bytes = 0
+            self._fingerprint = fingerprint
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _live_entry(self, key, fingerprint):
+        """The entry for key, or None if missing, expired or from older data. Holds the lock."""
+        self._check_fingerprint(fingerprint)
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl_seconds is not None:
+            if time.monotonic() - entry[2] > self.ttl_seconds:
+                self._drop(key)
+                return None
+        return entry
+
+    def get(self, key, fingerprint=None):
+        """Returns (found, value)."""
+        with self._lock:
+            entry = self._live_entry(key, fingerprint)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key, value, fingerprint=None):
+        size = estimate_size(value)
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            if key in self._entries:
+                self._drop(key)
+            # A single value larger than the whole budget is not worth caching
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def contains(self, key, fingerprint=None):
+        """
+        True if get() would hit: same expiry and fingerprint checks, without
+        counting a hit or a miss or refreshing the LRU order.
+        """
+        with self._lock:
+            return self._live_entry(key, fingerprint) is not None
+
+    def __contains__(self, key):
+        # Checks expiry against the current fingerprint, never drops the cache for a new one
+        with self._lock:
+            return self._live_entry(key, self._fingerprint) is not None
+
+    def get_or_compute(self, key, compute, fingerprint=None, cache_if=None):
+        """
+        Returns the cached value for `key`, computing and storing it on a miss.
+        `cache_if(value)` can veto storing a result (e.g. empty frames after an error).
+        Callers missing the same key while it is being computed (prefetch and
+        render threads) wait for that compute and get its value or exception.
+        """
+        found, value = self.get(key, fingerprint)
+        if found:
+            return value
+
+        with self._lock:
+            # Filled between the miss above and here
+            entry = self._live_entry(key, fingerprint)
+            if entry is not None:
+                return entry[0]
+            flight = self._inflight.get((key, fingerprint))
+            computing = flight is None
+            if computing:
+                flight = self._inflight[(key, fingerprint)] = Future()
+        if not computing:
+            return flight.result()
+
+        try:
+            value = compute()
+            if cache_if is None or cache_if(value):
+                self.put(key, value, fingerprint)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[(key, fingerprint)]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
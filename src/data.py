@@ -1,12 +1,316 @@
 import pandas as pd
+import numpy as np
 import streamlit as st
 import os
 import glob
 import duckdb
+import threading
+from contextlib import contextmanager
+import hashlib
+import logging
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.cache import ResultCache
+from src.search import build_search_index
+from src.prefetch import Prefetcher
+from src.schema import YEAR_MIN, YEAR_MAX, YEAR_COLUMNS, VALUE_DTYPE, to_categoricals, icon_labels
+from src.instrument import stage, frame_size, capture_profile
 
 DATA_CHUNKS_DIR = "data_chunks"
 LOOKUP_FILE = "lookups.xlsx"
+# Columnar copy of the lookup table, tagged with the sha256 of the xlsx it was built from
+LOOKUP_SIDECAR = f"{DATA_CHUNKS_DIR}/lookups.parquet"
+LOOKUP_HASH_KEY = b"source_sha256"
 PARQUET_PATTERN = f"{DATA_CHUNKS_DIR}/level_3_part_*.parquet"
+CUBE_FILE = f"{DATA_CHUNKS_DIR}/level_3_cube.parquet"
+RANK_INDEX_FILE = f"{DATA_CHUNKS_DIR}/level_3_rank_index.parquet"
+QUANTILES_FILE = f"{DATA_CHUNKS_DIR}/level_3_quantiles.parquet"
+ROLLUP_FILE = f"{DATA_CHUNKS_DIR}/level_3_rollup.parquet"
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_COLUMNS = ['small_area', 'local_authority', 'nation', 'population', 'households']
+
+# Administrative hierarchy above small_area (lookups.xlsx): level -> lookup column.
+# "uk" is the grand total of every small area.
+ROLLUP_LEVELS = {
+    "local_authority": "local_authority",
+    "nation": "nation",
+    "uk": None,
+}
+UK_NAME = "United Kingdom"
+
+# One level down the hierarchy, for regional breakdowns (e.g. Sankey region -> benefit)
+CHILD_LEVELS = {
+    "uk": "nation",
+    "nation": "local_authority",
+    "local_authority": "small_area",
+}
+
+# Value bases: lookup column used as denominator (None = absolute values)
+NORMALISATION_BASES = {
+    "absolute": None,
+    "per_capita": "population",
+    "per_household": "households",
+}
+# Values are million GBP; per-capita / per-household values are GBP per person / household
+VALUE_SCALE_GBP = 1_000_000
+
+# Number of top and bottom areas kept per (benefit, year) in the rank index
+RANK_INDEX_K = 100
+
+# Batch area queries inline up to this many codes; longer lists use a semi-join
+MAX_IN_LIST = 1000
+
+# Per-area result cache (shared by all sessions of this process)
+AREA_CACHE_MAX_BYTES = 64 * 1024 * 1024
+AREA_CACHE_TTL_SECONDS = 60 * 60
+
+TOTAL_BENEFIT = "Total"
+
+# --- CONNECTION LAYER ---
+# One DuckDB connection per process (shared by all sessions) and a pool of cursors on it.
+# Streamlit runs every rerun on a new thread, so cursors are borrowed per query rather
+# than kept per thread. Values are always bound as parameters, never spliced into SQL.
+
+# Statements that need a year column are templated with {year} (validated, it is a column name).
+# Map and top-N read the aggregate cube (area x benefit x year, plus a "Total" benefit).
+STATEMENTS = {
+    "area_rows": 'SELECT * FROM level_3 WHERE small_area = $1',
+    "benefit_types": f'SELECT DISTINCT "co-benefit_type" FROM cube WHERE "co-benefit_type" <> \'{TOTAL_BENEFIT}\' ORDER BY 1',
+    "top_areas": """
+        SELECT small_area, "{year}" as Benefit_Value
+        FROM cube
+        WHERE "co-benefit_type" = $1
+        ORDER BY Benefit_Value DESC
+        LIMIT $2
+    """,
+    "bottom_areas": """
+        SELECT small_area, "{year}" as Benefit_Value
+        FROM cube
+        WHERE "co-benefit_type" = $1
+        ORDER BY Benefit_Value ASC
+        LIMIT $2
+    """,
+    "map_values": 'SELECT small_area, "{year}" as Benefit_Value FROM cube WHERE "co-benefit_type" = $1',
+    # Every year at once: the animated map's area x year matrix
+    "map_matrix": 'SELECT small_area, ' + ", ".join(f'"{y}"' for y in YEAR_COLUMNS)
+                  + ' FROM cube WHERE "co-benefit_type" = $1',
+}
+
+def cube_select_sql(source="level_3"):
+    """
+    SQL that aggregates the raw Level 3 rows into the cube:
+    one row per (small_area, co-benefit_type) summed over damage pathways,
+    plus a "Total" row per area, with one column per year.
+    Used by build_cube.py and as the fallback view when the cube file is missing.
+    """
+    # Sums are computed in double precision, stored as float32 like the raw data
+    sums = ", ".join(f'CAST(SUM("{y}") AS FLOAT) AS "{y}"' for y in YEAR_COLUMNS)
+    return f"""
+        SELECT small_area, "co-benefit_type", {sums}
+        FROM {source}
+        GROUP BY small_area, "co-benefit_type"
+        UNION ALL
+        SELECT small_area, '{TOTAL_BENEFIT}' AS "co-benefit_type", {sums}
+        FROM {source}
+        GROUP BY small_area
+    """
+
+def rollup_select_sql(cube="cube", lookup="lookup"):
+    """
+    SQL that sums the cube (excluding "Total") to every level of ROLLUP_LEVELS:
+    [level, area, co-benefit_type, <year columns>].
+    Used by build_cube.py and as the in-process fallback when the rollup file is missing.
+    """
+    sums = ", ".join(f'CAST(SUM(c."{y}") AS FLOAT) AS "{y}"' for y in YEAR_COLUMNS)
+    selects = []
+    for level, column in ROLLUP_LEVELS.items():
+        if column is None:
+            selects.append(f"""
+                SELECT '{level}' AS level, '{UK_NAME}' AS area, c."co-benefit_type", {sums}
+                FROM {cube} c
+                WHERE c."co-benefit_type" <> '{TOTAL_BENEFIT}'
+                GROUP BY c."co-benefit_type"
+            """)
+        else:
+            selects.append(f"""
+                SELECT '{level}' AS level, l.{column} AS area, c."co-benefit_type", {sums}
+                FROM {cube} c JOIN {lookup} l ON c.small_area = l.small_area
+                WHERE c."co-benefit_type" <> '{TOTAL_BENEFIT}' AND l.{column} IS NOT NULL
+                GROUP BY l.{column}, c."co-benefit_type"
+            """)
+    return " UNION ALL ".join(selects)
+
+CURSOR_POOL_SIZE = 8  # idle cursors kept; more are opened under load and closed after
+
+class CursorPool:
+    """
+    Idle cursors on one connection, lent out for one query at a time.
+    DuckDB connections are not safe to use from several threads at once; cursors are.
+    """
+
+    def __init__(self, con, size=CURSOR_POOL_SIZE):
+        self.con = con
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def cursor(self):
+        with self._lock:
+            cursor = self._idle.pop() if self._idle else None
+        if cursor is None:
+            cursor = self.con.cursor()
+        try:
+            yield cursor
+        finally:
+            with self._lock:
+                keep = len(self._idle) < self.size
+                if keep:
+                    self._idle.append(cursor)
+            if not keep:
+                cursor.close()
+
+@st.cache_resource
+def get_connection():
+    """
+    Opens the process-wide DuckDB connection and registers the Level 3 view once.
+    The chunk files are globbed here only, and parquet footers are cached between queries.
+    """
+    con = duckdb.connect(database=":memory:")
+    con.execute("SET enable_object_cache = true")
+    con.execute("SET parquet_metadata_cache = true")
+
+    files = sorted(glob.glob(PARQUET_PATTERN))
+    # Views cannot take parameters, so the paths are quoted literals
+    if files:
+        file_list = ", ".join(_sql_literal(f) for f in files)
+        con.execute(f"CREATE VIEW level_3 AS SELECT * FROM read_parquet([{file_list}])")
+
+    if os.path.exists(CUBE_FILE):
+        con.execute(f"CREATE VIEW cube AS SELECT * FROM read_parquet({_sql_literal(CUBE_FILE)})")
+    elif files:
+        # No prebuilt cube (run build_cube.py): aggregate on the fly, slower but same results
+        con.execute(f"CREATE VIEW cube AS {cube_select_sql()}")
+    return con
+
+def _sql_literal(value):
+    """Quotes a string as a SQL literal (DDL only; queries bind their values)."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _check_year(year):
+    year = int(year)
+    if not YEAR_MIN <= year <= YEAR_MAX:
+        raise ValueError(f"Year {year} outside {YEAR_MIN}-{YEAR_MAX}")
+    return year
+
+@st.cache_resource
+def get_cursor_pool():
+    """
+    Process-wide cursor pool on the shared connection.
+    """
+    return CursorPool(get_connection())
+
+def _cursor():
+    """
+    Borrows a cursor for the duration of a `with` block.
+    """
+    return get_cursor_pool().cursor()
+
+def _placeholders(values):
+    return ", ".join("?" * len(values))
+
+def run_statement(name, params=(), year=None):
+    """
+    Executes a named statement from STATEMENTS with bound parameters and returns a DataFrame.
+    """
+    sql = STATEMENTS[name]
+    if year is not None:
+        year = _check_year(year)
+        sql = sql.format(year=year)
+
+    params = list(params)
+    with _cursor() as cursor:
+        with stage("query", name, year=year) as record:
+            df = cursor.execute(sql, params).fetchdf()
+            record.update(frame_size(df))
+        capture_profile(cursor, name, sql, params)
+    return to_categoricals(df)
+
+def data_fingerprint():
+    """
+    (path, mtime, size) of every data file the queries and cached results read:
+    the chunks, the cube, the rank index with its quantiles and the roll-ups.
+    Changes whenever the build scripts rewrite the data.
+    """
+    paths = sorted(glob.glob(PARQUET_PATTERN)) + [CUBE_FILE, RANK_INDEX_FILE, QUANTILES_FILE, ROLLUP_FILE]
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            continue
+    return tuple(fingerprint)
+
+@st.cache_resource
+def get_area_cache():
+    """
+    Bounded LRU cache for per-area query results and their melted form.
+    """
+    return ResultCache(AREA_CACHE_MAX_BYTES, ttl_seconds=AREA_CACHE_TTL_SECONDS)
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _sidecar_hash():
+    try:
+        metadata = pq.read_schema(LOOKUP_SIDECAR).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    value = metadata.get(LOOKUP_HASH_KEY)
+    return value.decode() if value else None
+
+def build_lookup_sidecar(source_hash=None):
+    """
+    Parses lookups.xlsx once and writes LOOKUP_SIDECAR, tagged with the xlsx hash.
+    Returns the lookup frame.
+    """
+    df_lookup = pd.read_excel(LOOKUP_FILE, usecols=LOOKUP_COLUMNS)
+    df_lookup = df_lookup.drop_duplicates(subset=['small_area']).reset_index(drop=True)
+
+    table = pa.Table.from_pandas(df_lookup, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[LOOKUP_HASH_KEY] = (source_hash or _file_sha256(LOOKUP_FILE)).encode()
+    try:
+        os.makedirs(os.path.dirname(LOOKUP_SIDECAR), exist_ok=True)
+        tmp_path = LOOKUP_SIDECAR + ".tmp"
+        pq.write_table(table.replace_schema_metadata(metadata), tmp_path)
+        os.replace(tmp_path, LOOKUP_SIDECAR)
+    except OSError as e:
+        # Read-only deployment: still usable, just parsed from Excel each process
+        logger.warning("Lookup sidecar not written: %s", e)
+    return df_lookup
+
+def read_lookup_table():
+    """
+    Reads the small_area -> local_authority / nation / population / households table.
+    Memory-maps the parquet sidecar when its hash matches lookups.xlsx,
+    otherwise rebuilds it from the Excel file.
+    """
+    if not os.path.exists(LOOKUP_FILE):
+        # Deployed without the xlsx: trust the sidecar as-is
+        return pq.read_table(LOOKUP_SIDECAR, memory_map=True).to_pandas()
+
+    source_hash = _file_sha256(LOOKUP_FILE)
+    if _sidecar_hash() == source_hash:
+        return pq.read_table(LOOKUP_SIDECAR, memory_map=True).to_pandas()
+    return build_lookup_sidecar(source_hash)
 
 @st.cache_data
 def load_lookups():
@@ -14,126 +318,494 @@ def load_lookups():
     Loads ONLY the lookup table (Small, safe for memory).
     """
     try:
-        if os.path.exists(LOOKUP_FILE):
-             df_lookup = pd.read_excel(LOOKUP_FILE, usecols=['small_area', 'local_authority'])
-             df_lookup = df_lookup.drop_duplicates(subset=['small_area'])
-             return df_lookup
+        if os.path.exists(LOOKUP_FILE) or os.path.exists(LOOKUP_SIDECAR):
+             return read_lookup_table()
     except Exception as e:
         st.error(f"Error loading lookups: {e}")
-    return pd.DataFrame(columns=['small_area', 'local_authority'])
+    return pd.DataFrame(columns=LOOKUP_COLUMNS)
 
-def get_area_options(df_lookup):
+@st.cache_resource
+def get_area_index():
     """
-    Returns a dict mapping {Display Name -> small_area code}.
-    Uses the lookup dataframe.
+    Search index over all small areas ({display name <-> code}, prefix search),
+    built once per process from the lookup table.
     """
-    if df_lookup.empty:
-        return {}
-    
-    # Create a map code -> name
-    code_to_name = pd.Series(df_lookup.local_authority.values, index=df_lookup.small_area).to_dict()
-    
-    # We need a list of ALL valid area codes.
-    # To avoid scanning the big file, we assume the lookup covers most.
-    # OR we can do a distinct query on parquet if needed, but lookups is faster.
-    
-    options = {}
-    # Sort by name
-    sorted_items = sorted(code_to_name.items(), key=lambda x: str(x[1]))
-    
-    for code, name in sorted_items:
-        display = f"{name} ({code})"
-        options[display] = code
-        
-    return options
+    return build_search_index(load_lookups())
+
+def _query_area_data(area_code):
+    try:
+        # Use duckdb to query parquet directly without loading into pandas first
+        return run_statement("area_rows", [area_code])
+    except Exception as e:
+        st.error(f"Error reading data for {area_code}: {e}")
+        return pd.DataFrame()
 
 def get_area_data(area_code):
     """
     Fetches rows for a specific area using DuckDB (Low Memory).
+    Results are cached per area; the returned frame is shared and must not be modified.
+    """
+    return get_area_cache().get_or_compute(
+        ("raw", area_code),
+        lambda: _query_area_data(area_code),
+        fingerprint=data_fingerprint(),
+        cache_if=lambda df: not df.empty
+    )
+
+def get_area_data_melted(area_code):
+    """
+    Long-form (melted) data for one area, cached like get_area_data.
+    """
+    return get_area_cache().get_or_compute(
+        ("melted", area_code),
+        lambda: process_area_data_from_df(get_area_data(area_code)),
+        fingerprint=data_fingerprint(),
+        cache_if=lambda df: not df.empty
+    )
+
+def _query_areas_data(area_codes):
+    """
+    Raw rows for several areas in one pass: an IN-list (min/max pruning on the
+    area-sorted chunks), or a semi-join against a registered table for long lists.
     """
-    query = f"SELECT * FROM '{PARQUET_PATTERN}' WHERE small_area = ?"
     try:
-        # Use duckdb to query parquet directly without loading into pandas first
-        df = duckdb.execute(query, [area_code]).fetchdf()
-        return df
+        with _cursor() as cursor:
+            if len(area_codes) <= MAX_IN_LIST:
+                params = [str(c) for c in area_codes]
+                sql = f"SELECT * FROM level_3 WHERE small_area IN ({_placeholders(params)}) ORDER BY small_area"
+                with stage("query", "areas_in_list", areas=len(area_codes)) as record:
+                    df = cursor.execute(sql, params).fetchdf()
+                    record.update(frame_size(df))
+                capture_profile(cursor, "areas_in_list", sql, params)
+                return to_categoricals(df)
+
+            cursor.register("wanted_areas", pd.DataFrame({"small_area": area_codes}))
+            try:
+                sql = """
+                    SELECT l.* FROM level_3 l
+                    SEMI JOIN wanted_areas w ON l.small_area = w.small_area
+                    ORDER BY l.small_area
+                """
+                with stage("query", "areas_semi_join", areas=len(area_codes)) as record:
+                    df = cursor.execute(sql).fetchdf()
+                    record.update(frame_size(df))
+                capture_profile(cursor, "areas_semi_join", sql)
+                return to_categoricals(df)
+            finally:
+                cursor.unregister("wanted_areas")
     except Exception as e:
-        st.error(f"Error reading data for {area_code}: {e}")
+        st.error(f"Error reading data for {len(area_codes)} areas: {e}")
         return pd.DataFrame()
 
+def get_areas_data(area_codes):
+    """
+    Raw rows for a set of areas, fetched in a single query, as one frame grouped
+    by area (in the order given). Areas already in the result cache are reused and
+    newly fetched areas are cached individually, so get_area_data hits afterwards.
+    """
+    codes = list(dict.fromkeys(str(c) for c in area_codes))
+    cache = get_area_cache()
+    fingerprint = data_fingerprint()
+
+    frames = {}
+    missing = []
+    for code in codes:
+        found, df_area = cache.get(("raw", code), fingerprint)
+        if found:
+            frames[code] = df_area
+        else:
+            missing.append(code)
+
+    if missing:
+        df_new = _query_areas_data(missing)
+        if not df_new.empty:
+            for code, df_area in df_new.groupby('small_area', observed=True, sort=False):
+                df_area = df_area.reset_index(drop=True)
+                df_area['small_area'] = df_area['small_area'].cat.remove_unused_categories()
+                cache.put(("raw", code), df_area, fingerprint)
+                frames[code] = df_area
+
+    found_codes = [c for c in codes if c in frames]
+    if not found_codes:
+        return pd.DataFrame()
+    df_areas = to_categoricals(pd.concat([frames[c] for c in found_codes], ignore_index=True))
+    # Category order = requested order, so sorting by area keeps it
+    df_areas['small_area'] = pd.Categorical(df_areas['small_area'].astype(str), categories=found_codes)
+    return df_areas
+
+def get_areas_data_melted(area_codes):
+    """
+    Long-form data for several areas (one get_areas_data call), sorted by area
+    (requested order) then year.
+    """
+    df_long = process_area_data_from_df(get_areas_data(area_codes))
+    if df_long.empty:
+        return df_long
+    return df_long.sort_values(['small_area', 'Year'], kind='stable', ignore_index=True)
+
+@st.cache_resource
+def get_prefetcher():
+    """
+    Process-wide background prefetcher that warms get_area_data_melted results.
+    """
+    cache = get_area_cache()
+    return Prefetcher(
+        warm=get_area_data_melted,
+        is_cached=lambda area_code: cache.contains(("melted", area_code), data_fingerprint())
+    )
+
 def get_unique_benefits(sample_df=None):
     """
     Returns unique co-benefit types.
     Optimization: Hardcode or query once.
     """
-    # Hardcoded or efficient query
-    # return ["Health", "Job Creation", "Economic", "Social"] # Example
-    # Let's query distinct
-    query = f"SELECT DISTINCT \"co-benefit_type\" FROM '{PARQUET_PATTERN}'"
     try:
-        df = duckdb.execute(query).fetchdf()
+        df = run_statement("benefit_types")
         return sorted(df['co-benefit_type'].tolist())
     except:
         return []
 
-def get_top_areas_data(benefit_type=None, year=2050):
+@st.cache_resource
+def load_rank_index():
     """
-    Get top 10 areas for a specific benefit/year.
+    Loads the prebuilt rank index (build_cube.py) once per process.
+    Returns {(benefit, year): {"top": df, "bottom": df, "breakpoints": ndarray}},
+    or an empty dict if the index files are missing.
     """
-    col_name = str(year)
-    
-    if benefit_type:
-        query = f"""
-            SELECT small_area, "{year}" as Benefit_Value
-            FROM '{PARQUET_PATTERN}'
-            WHERE "co-benefit_type" = ?
-            ORDER BY "{year}" DESC
-            LIMIT 10
-        """
-        params = [benefit_type]
-    else:
-        # Aggregate ALL benefits
-        query = f"""
-            SELECT small_area, SUM("{year}") as Benefit_Value
-            FROM '{PARQUET_PATTERN}'
-            GROUP BY small_area
-            ORDER BY Benefit_Value DESC
-            LIMIT 10
-        """
-        params = []
-        
+    index = {}
+    if not (os.path.exists(RANK_INDEX_FILE) and os.path.exists(QUANTILES_FILE)):
+        return index
     try:
-        df = duckdb.execute(query, params).fetchdf()
-        # Add 'co-benefit_type' col for consistency in plotting if needed
-        # df['co-benefit_type'] = benefit_type if benefit_type else "Total"
-        return df
+        df_rank = to_categoricals(pd.read_parquet(RANK_INDEX_FILE))
+        df_quantiles = pd.read_parquet(QUANTILES_FILE)
+    except Exception as e:
+        st.error(f"Error loading rank index: {e}")
+        return index
+
+    for (benefit, year), group in df_rank.groupby(['co-benefit_type', 'Year'], sort=False, observed=True):
+        top = group[group['top_rank'] <= RANK_INDEX_K].sort_values('top_rank')
+        bottom = group[group['bottom_rank'] <= RANK_INDEX_K].sort_values('bottom_rank')
+        index[(benefit, int(year))] = {
+            "top": top[['small_area', 'Benefit_Value']].reset_index(drop=True),
+            "bottom": bottom[['small_area', 'Benefit_Value']].reset_index(drop=True),
+        }
+    for row in df_quantiles.itertuples(index=False):
+        key = (row[0], int(row[1]))
+        if key in index:
+            index[key]["breakpoints"] = np.asarray(row[2], dtype=float)
+    return index
+
+def get_top_areas_data(benefit_type=None, year=2050, n=10, ascending=False, basis="absolute"):
+    """
+    Get top N areas for a specific benefit/year (bottom N with ascending=True).
+    Served from the rank index when possible, otherwise queried from the cube.
+    basis "per_capita" / "per_household" ranks by the normalised value instead.
+    """
+    if NORMALISATION_BASES.get(basis) is not None:
+        try:
+            return _rank_normalised(benefit_type, year, n, ascending, basis)
+        except Exception as e:
+            st.error(f"Error fetching top areas: {e}")
+            return pd.DataFrame()
+
+    benefit = benefit_type or TOTAL_BENEFIT
+    entry = load_rank_index().get((benefit, int(year)))
+    if entry is not None and n <= RANK_INDEX_K:
+        return entry["bottom" if ascending else "top"].head(n).copy()
+
+    try:
+        # None = Total (all benefits), precomputed in the cube
+        statement = "bottom_areas" if ascending else "top_areas"
+        return run_statement(statement, [benefit, int(n)], year=year)
     except Exception as e:
         st.error(f"Error fetching top areas: {e}")
         return pd.DataFrame()
 
+def get_value_percentile(value, benefit_type=None, year=2050):
+    """
+    Percentile (0-100) of a benefit value among all areas for that benefit/year,
+    interpolated from the precomputed breakpoints. None if the index is missing.
+    """
+    entry = load_rank_index().get((benefit_type or TOTAL_BENEFIT, int(year)))
+    if entry is None or "breakpoints" not in entry:
+        return None
+    breakpoints = entry["breakpoints"]
+    return float(np.interp(value, breakpoints, np.arange(len(breakpoints))))
+
+@st.cache_resource
+def load_rollups():
+    """
+    Benefit x year sums for every level of the hierarchy, loaded once per process:
+    {(level, area name): wide frame [level, area, co-benefit_type, years...]}.
+    Reads ROLLUP_FILE (build_cube.py); if missing, computes the same table once from the cube.
+    """
+    try:
+        if os.path.exists(ROLLUP_FILE):
+            df_rollup = pd.read_parquet(ROLLUP_FILE)
+        else:
+            df_lookup = load_lookups()
+            if df_lookup.empty:
+                return {}
+            with _cursor() as cursor:
+                cursor.register("lookup", df_lookup)
+                try:
+                    df_rollup = cursor.execute(rollup_select_sql()).fetchdf()
+                finally:
+                    cursor.unregister("lookup")
+    except Exception as e:
+        st.error(f"Error loading regional totals: {e}")
+        return {}
+
+    df_rollup = to_categoricals(df_rollup)
+    return {
+        (level, area): group.reset_index(drop=True)
+        for (level, area), group in df_rollup.groupby(['level', 'area'], sort=True, observed=True)
+    }
+
+def get_rollup_areas(level):
+    """
+    Sorted area names available at a hierarchy level (e.g. all local authorities).
+    """
+    return sorted(area for (lvl, area) in load_rollups() if lvl == level)
+
+def get_rollup_data(level, area):
+    """
+    Wide frame for a whole local authority / nation / the UK (same shape as get_area_data).
+    Constant-time dictionary read; the frame is shared and must not be modified.
+    """
+    return load_rollups().get((level, area), pd.DataFrame())
+
+def get_rollup_data_melted(level, area):
+    """
+    Long-form roll-up data, cached like get_area_data_melted.
+    """
+    return get_area_cache().get_or_compute(
+        ("rollup", level, area),
+        lambda: process_area_data_from_df(get_rollup_data(level, area)),
+        fingerprint=data_fingerprint(),
+        cache_if=lambda df: not df.empty
+    )
+
+def _query_breakdown(level, area):
+    child = CHILD_LEVELS[level]
+    if child == "small_area":
+        # Every small area of the council straight from the cube, one IN-list query
+        df_lookup = load_lookups()
+        codes = df_lookup.loc[df_lookup['local_authority'] == area, 'small_area'].astype(str).tolist()
+        if not codes:
+            return pd.DataFrame()
+        year_cols = ", ".join(f'"{y}"' for y in YEAR_COLUMNS)
+        sql = f"""
+            SELECT small_area, "co-benefit_type", {year_cols}
+            FROM cube
+            WHERE "co-benefit_type" <> '{TOTAL_BENEFIT}' AND small_area IN ({_placeholders(codes)})
+        """
+        with _cursor() as cursor:
+            with stage("query", "breakdown", areas=len(codes)) as record:
+                df = cursor.execute(sql, codes).fetchdf()
+                record.update(frame_size(df))
+            capture_profile(cursor, "breakdown", sql, codes)
+        return to_categoricals(df)
+
+    children = get_rollup_areas(child)
+    if level == "nation":
+        df_lookup = load_lookups()
+        in_nation = set(df_lookup.loc[df_lookup['nation'] == area, 'local_authority'].dropna())
+        children = [c for c in children if c in in_nation]
+    frames = [get_rollup_data(child, c) for c in children]
+    if not frames:
+        return pd.DataFrame()
+    df_wide = pd.concat(frames, ignore_index=True).drop(columns=['level'])
+    return df_wide.rename(columns={'area': child}).astype({child: 'category'})
+
+def get_region_breakdown(level, area):
+    """
+    Long-form data of every child of a region, one level down the hierarchy
+    (UK -> nations, nation -> local authorities, local authority -> small areas):
+    [<child level>, co-benefit_type, Year, Benefit_Value, Label]. Cached like the area data.
+    """
+    def compute():
+        try:
+            return process_area_data_from_df(_query_breakdown(level, area))
+        except Exception as e:
+            st.error(f"Error loading breakdown for {area}: {e}")
+            return pd.DataFrame()
+
+    return get_area_cache().get_or_compute(
+        ("breakdown", level, area),
+        compute,
+        fingerprint=data_fingerprint(),
+        cache_if=lambda df: not df.empty
+    )
+
+@st.cache_resource
+def load_denominators():
+    """
+    Population and household counts loaded once per process:
+    {"index": pd.Index of small_area codes, "arrays": {column: float ndarray aligned to index},
+     "regional": {level: pd.Series of summed counts per region name, per column}}.
+    """
+    df_lookup = load_lookups()
+    index = pd.Index(df_lookup['small_area'].astype(str))
+    columns = [c for c in NORMALISATION_BASES.values() if c]
+    arrays = {c: df_lookup[c].to_numpy(dtype=float) for c in columns}
+
+    regional = {}
+    for level, column in ROLLUP_LEVELS.items():
+        if column is None:
+            regional[level] = {c: pd.Series([arrays[c].sum()], index=[UK_NAME]) for c in columns}
+        else:
+            sums = df_lookup.groupby(column)[columns].sum()
+            regional[level] = {c: sums[c].astype(float) for c in columns}
+    return {"index": index, "arrays": arrays, "regional": regional}
+
+def _denominators_for(keys, basis, level=None):
+    """
+    Denominator per key (small_area codes, or region names when level is given),
+    as a float array aligned with keys; NaN where unknown or zero.
+    """
+    column = NORMALISATION_BASES[basis]
+    denominators = load_denominators()
+    keys = pd.Index(pd.Series(keys).astype(str))
+    if level is None:
+        positions = denominators["index"].get_indexer(keys)
+        values = np.where(positions >= 0, denominators["arrays"][column][positions], np.nan)
+    else:
+        values = denominators["regional"][level][column].reindex(keys).to_numpy(dtype=float)
+    return np.where(values > 0, values, np.nan)
+
+def normalise_values(df, basis, key='small_area', level=None):
+    """
+    Divides Benefit_Value by each row's denominator (vectorised join on the key column).
+    Returns a new frame in GBP per person / household; absolute basis returns df unchanged.
+    """
+    if NORMALISATION_BASES.get(basis) is None or df.empty:
+        return df
+    denominators = _denominators_for(df[key], basis, level)
+    return df.assign(Benefit_Value=df['Benefit_Value'].to_numpy(dtype=float) * VALUE_SCALE_GBP / denominators)
+
+def get_normalisation_factor(basis, area, level=None):
+    """
+    Scalar multiplier turning one area's (or region's) values into the chosen basis.
+    1.0 for absolute values, NaN if the denominator is unknown.
+    """
+    if NORMALISATION_BASES.get(basis) is None:
+        return 1.0
+    return float(VALUE_SCALE_GBP / _denominators_for([area], basis, level)[0])
+
+def _rank_normalised(benefit_type, year, n, ascending, basis):
+    """
+    Top/bottom N areas by a normalised value: one cube column read,
+    a vectorised division and an O(areas) partial sort.
+    """
+    df = normalise_values(get_map_data(benefit_type, year), basis)
+    values = df['Benefit_Value'].to_numpy(dtype=float)
+    valid = np.flatnonzero(~np.isnan(values))
+    if valid.size == 0:
+        return df.iloc[0:0]
+    keyed = values[valid] if ascending else -values[valid]
+    n = min(int(n), valid.size)
+    best = valid[np.argpartition(keyed, n - 1)[:n]]
+    best = best[np.argsort(values[best] if ascending else -values[best], kind='stable')]
+    return df.iloc[best].reset_index(drop=True)
+
+def get_map_data(benefit_type=None, year=2050):
+    """
+    Per-area benefit value for the choropleth: [small_area, Benefit_Value].
+    benefit_type None or "Total" sums all benefits.
+    """
+    try:
+        return run_statement("map_values", [benefit_type or TOTAL_BENEFIT], year=year)
+    except Exception as e:
+        st.error(f"Error fetching map data: {e}")
+        return pd.DataFrame(columns=['small_area', 'Benefit_Value'])
+
+def get_map_matrix(benefit_type=None):
+    """
+    Every area's value for every year in one query, for the animated map:
+    (codes, years, values) with values float32 [n_areas, n_years].
+    Cached like the area data (~5 MB at national scale).
+    """
+    benefit = benefit_type or TOTAL_BENEFIT
+
+    def compute():
+        try:
+            df = run_statement("map_matrix", [benefit])
+        except Exception as e:
+            st.error(f"Error fetching map data: {e}")
+            df = pd.DataFrame(columns=['small_area'] + YEAR_COLUMNS)
+        return (
+            df['small_area'].astype(str).to_numpy(),
+            np.array([int(y) for y in YEAR_COLUMNS]),
+            df[YEAR_COLUMNS].to_numpy(dtype=np.float32)
+        )
+
+    return get_area_cache().get_or_compute(
+        ("map_matrix", benefit),
+        compute,
+        fingerprint=data_fingerprint(),
+        cache_if=lambda matrix: len(matrix[0]) > 0
+    )
+
+def rollup_matrix(codes, values, level):
+    """
+    Sums an area x year matrix to the regions of `level` ("local_authority", "nation"):
+    (region names, values). Areas missing from the lookup are dropped.
+    """
+    df_lookup = load_lookups()
+    regions = pd.Series(df_lookup[ROLLUP_LEVELS[level]].to_numpy(), index=df_lookup['small_area'].astype(str))
+    inverse, names = pd.factorize(regions.reindex(codes))
+    valid = inverse >= 0
+    sums = pd.DataFrame(values[valid]).groupby(inverse[valid]).sum()
+    return np.asarray(names, dtype=str)[sums.index.to_numpy()], sums.to_numpy(dtype=np.float32)
+
+def normalise_matrix(codes, values, basis, level=None):
+    """
+    normalise_values for an area x year matrix: one denominator per row.
+    """
+    if NORMALISATION_BASES.get(basis) is None or not len(codes):
+        return values
+    factors = VALUE_SCALE_GBP / _denominators_for(codes, basis, level)
+    return (values * factors[:, None]).astype(np.float32)
+
 def process_area_data_from_df(df_area):
     """
-    Melts the single-area dataframe.
+    Reshapes the wide area dataframe (one column per year) to long form
+    [id columns..., Year, Benefit_Value, Label], same row order as DataFrame.melt.
+
+    Built straight from the NumPy year block: values are raveled column-major,
+    ids tiled and years repeated, so no per-column Python work or melt copy.
+    'co-benefit_type' and 'Label' are categoricals; the icon label is computed
+    once per benefit type, not per row.
     """
     if df_area.empty:
         return pd.DataFrame()
 
-    # Smart Melt
-    # identify numeric columns that look like years
-    cols = df_area.columns
-    year_cols = []
-    for col in cols:
-        # Check if column name is exactly a year string or int
-        if str(col).isdigit() and 2025 <= int(col) <= 2050:
-             year_cols.append(col)
-             
-    id_vars = [c for c in cols if c not in year_cols]
-    
-    df_melted = df_area.melt(
-        id_vars=id_vars,
-        value_vars=year_cols,
-        var_name='Year',
-        value_name='Benefit_Value'
-    )
-    
-    df_melted['Year'] = df_melted['Year'].astype(int)
-    return df_melted
+    with stage("reshape", "melt", rows=len(df_area)) as record:
+        year_set = set(YEAR_COLUMNS)
+        year_cols = [c for c in df_area.columns if str(c) in year_set]
+        id_vars = [c for c in df_area.columns if str(c) not in year_set]
+
+        values = df_area[year_cols].to_numpy(dtype=VALUE_DTYPE)
+        n_rows, n_years = values.shape
+
+        long_data = {}
+        for col in id_vars:
+            series = df_area[col]
+            if col == 'co-benefit_type' or isinstance(series.dtype, pd.CategoricalDtype):
+                categorical = series.astype('category')
+                long_data[col] = pd.Categorical.from_codes(
+                    np.tile(categorical.cat.codes.to_numpy(), n_years),
+                    dtype=categorical.dtype
+                )
+            else:
+                long_data[col] = np.tile(series.to_numpy(), n_years)
+
+        long_data['Year'] = np.repeat(np.array([int(c) for c in year_cols], dtype=np.int16), n_rows)
+        long_data['Benefit_Value'] = values.ravel(order='F')
+
+        df_long = pd.DataFrame(long_data)
+        if 'co-benefit_type' in df_long.columns:
+            df_long['Label'] = icon_labels(df_long['co-benefit_type'])
+        record["long_rows"] = len(df_long)
+    return df_long
@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Per-stage timings of a rerun: DuckDB queries (rows, bytes), reshaping, geometry
+# work and figure builds (serialised size). Every stage feeds process-wide rolling
+# windows; stages of the current rerun are also collected in a RerunTrace, which
+# can be written to a JSON-lines log and shown in the debug panel of the sidebar.
+
+TIMINGS_LOG_ENV = "COBENEFITS_TIMINGS_LOG"  # path of the JSON-lines log; unset = no log
+ROLLING_WINDOW = 500  # timings kept per stage
+HISTOGRAM_EDGES_MS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf")]
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+class RerunTrace:
+    """
+    Stages recorded during one script rerun, from any thread bound to it.
+    explain=True also captures DuckDB EXPLAIN ANALYZE profiles of its queries.
+    """
+
+    def __init__(self, session=None, explain=False):
+        self.session = session
+        self.explain = explain
+        self.timestamp = time.time()
+        self.started = time.perf_counter()
+        self.total_ms = None
+        self.stages = []
+        self.profiles = []  # (statement, profile text)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.stages.append(record)
+
+    def add_profile(self, statement, profile):
+        with self._lock:
+            self.profiles.append((statement, profile))
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "timestamp": self.timestamp,
+                "session": self.session,
+                "total_ms": self.total_ms,
+                "stages": list(self.stages),
+                "profiles": [{"statement": s, "profile": p} for s, p in self.profiles],
+            }
+
+
+class StageStats:
+    """
+    Rolling window of the last ROLLING_WINDOW timings per stage, shared by all sessions.
+    """
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.window = window
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, ms):
+        with self._lock:
+            timings = self._timings.get(key)
+            if timings is None:
+                timings = self._timings[key] = deque(maxlen=self.window)
+            timings.append(ms)
+
+    def _snapshot(self):
+        with self._lock:
+            return {key: np.array(timings) for key, timings in self._timings.items()}
+
+    def summary(self):
+        """
+        One row per stage (count, p50, p95, max, total ms in the window), largest total first.
+        """
+        rows = [{
+            "stage": key,
+            "count": len(ms),
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)),
+            "max_ms": float(ms.max()),
+            "total_ms": float(ms.sum()),
+        } for key, ms in self._snapshot().items()]
+        df = pd.DataFrame(rows, columns=["stage", "count", "p50_ms", "p95_ms", "max_ms", "total_ms"])
+        return df.sort_values("total_ms", ascending=False, ignore_index=True)
+
+    def histogram(self, key):
+        """
+        Counts per HISTOGRAM_EDGES_MS bucket for one stage, as a Series labelled by bucket.
+        """
+        ms = self._snapshot().get(key, np.empty(0))
+        counts, _ = np.histogram(ms, bins=HISTOGRAM_EDGES_MS)
+        labels = [f"<{hi:g} ms" if np.isfinite(hi) else f"≥{lo:g} ms"
+                  for lo, hi in zip(HISTOGRAM_EDGES_MS[:-1], HISTOGRAM_EDGES_MS[1:])]
+        return pd.Series(counts, index=pd.CategoricalIndex(labels, categories=labels, ordered=True))
+
+
+@st.cache_resource
+def get_stage_stats():
+    """
+    Process-wide rolling stage timings.
+    """
+    return StageStats()
+
+
+def start_rerun(session=None, explain=False):
+    """
+    Starts collecting the stages of this script run on the calling thread.
+    """
+    trace = RerunTrace(session, explain)
+    _local.trace = trace
+    return trace
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+def bind_trace(func, trace=None):
+    """
+    Wraps func so stages it records on another thread (render pool) go to the
+    trace of the rerun that submitted it.
+    """
+    trace = trace or current_trace()
+
+    def bound(*args, **kwargs):
+        previous = current_trace()
+        _local.trace = trace
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.trace = previous
+
+    return bound
+
+
+def frame_size(df):
+    """Rows and shallow bytes of a query result."""
+    return {"rows": len(df), "bytes": int(df.memory_usage(index=False).sum())}
+
+
+@contextmanager
+def stage(kind, name=None, **fields):
+    """
+    Times the block as one stage. Yields the record dict, so the block can add
+    fields such as rows or bytes. Stages outside a rerun (prefetch threads, scripts)
+    only feed the rolling timings.
+    """
+    record = {"stage": kind, "name": name, **fields}
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["ms"] = (time.perf_counter() - started) * 1000
+        get_stage_stats().record(kind if name is None else f"{kind}:{name}", record["ms"])
+        trace = current_trace()
+        if trace is not None:
+            trace.add(record)
+
+
+def capture_profile(cursor, statement, sql, params=None):
+    """
+    Runs EXPLAIN ANALYZE for `sql` (with the same bound params) if the current rerun asked for profiles.
+    The query runs a second time, so this is only for debugging.
+    """
+    trace = current_trace()
+    if trace is None or not trace.explain:
+        return
+    try:
+        rows = cursor.execute(f"EXPLAIN ANALYZE {sql}", params).fetchall()
+        trace.add_profile(statement, "\n".join(str(row[-1]) for row in rows))
+    except Exception as e:
+        trace.add_profile(statement, f"EXPLAIN ANALYZE failed: {e}")
+
+
+def finish_rerun(trace):
+    """
+    Closes the trace: records the rerun total and appends it to the JSON log if configured.
+    """
+    trace.total_ms = (time.perf_counter() - trace.started) * 1000
+    get_stage_stats().record("rerun", trace.total_ms)
+    if getattr(_local, "trace", None) is trace:
+        _local.trace = None
+
+    log_path = os.environ.get(TIMINGS_LOG_ENV)
+    if log_path:
+        line = json.dumps(trace.to_dict(), default=str)
+        try:
+            with _log_lock, open(log_path, "a") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning("Could not write timings log %s: %s", log_path, e)
+    return trace
+
+
+def render_debug_panel(trace):
+    """
+    Sidebar panel: this rerun's stages, the rolling hot-path table and a histogram.
+    Call at the end of the script, after finish_rerun.
+    """
+    st.caption(f"This rerun: {trace.total_ms:,.0f} ms, {len(trace.stages)} stages")
+    if trace.stages:
+        df_stages = pd.DataFrame(trace.stages)
+        st.dataframe(df_stages.sort_values("ms", ascending=False), hide_index=True, use_container_width=True)
+
+    summary = get_stage_stats().summary()
+    st.caption(f"Last {ROLLING_WINDOW} timings per stage, all sessions (hot path first)")
+    st.dataframe(summary.round(1), hide_index=True, use_container_width=True)
+    if not summary.empty:
+        key = st.selectbox("Histogram of", summary["stage"].tolist(), key="debug_histogram_stage")
+        st.bar_chart(get_stage_stats().histogram(key))
+
+    st.checkbox("Capture DuckDB profiles (EXPLAIN ANALYZE, next rerun)", key="debug_explain")
+    for statement, profile in trace.profiles:
+        with st.expander(f"Profile: {statement}"):
+            st.code(profile, language=None)
@@ -1,74 +1,392 @@
 import geopandas as gpd
-import plotly.express as px
+import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
 import streamlit as st
 import json
+import logging
+import math
+import os
+import shapely
+from src.instrument import stage
+from src.visualizations import animation_controls
 
 GEOJSON_PATH = "small_areas.geojson"
 
-@st.cache_data
-def load_shapefile():
+# Levels of detail written by convert_to_geojson.py: file + feature key column.
+# A small-area level whose file is not built uses the nearest built one, else
+# GEOJSON_PATH (single resolution).
+GEOMETRY_LEVELS = {
+    "fine": {"path": "small_areas_fine.geojson", "key": "small_area"},
+    "medium": {"path": "small_areas_medium.geojson", "key": "small_area"},
+    "coarse": {"path": "small_areas_coarse.geojson", "key": "small_area"},
+    "local_authority": {"path": "local_authorities.geojson", "key": "local_authority"},
+}
+SMALL_AREA_LODS = ["fine", "medium", "coarse"]
+
+# Levels drawn whole (published as one FeatureCollection). The fine level is only
+# drawn culled to a region, so it is kept as shapes plus their STRtree.
+WHOLE_MAP_LEVELS = ["medium", "coarse", "local_authority"]
+
+# (minimum map zoom, small-area level): national view -> coarse, city view -> fine.
+# The zoom is the one fitted to the selected extent; zooming in the browser is
+# client-side only and never reaches the app, so it cannot change the level.
+LOD_ZOOM_LEVELS = [(9, "fine"), (7, "medium"), (0, "coarse")]
+
+UK_CENTER = {"lat": 54.5, "lon": -2.0}
+UK_ZOOM = 5
+MAX_FOCUS_ZOOM = 13
+
+# Approximate size of the map figure in pixels, used to fit a bounding box
+MAP_VIEWPORT_PX = (700, 450)
+
+# Regional views are cut out of the loaded geometry with its STRtree; one entry
+# per (geometry file, bounding box), a few hundred features each.
+REGION_CACHE_ENTRIES = 64
+
+# Largest animated map spec sent to the browser: above it the map shows a single
+# year instead. Frame colours go out as base64 float32 (4 bytes per area and year),
+# so every UK small area over 26 years is ~7 MB and only fits when focused on a
+# region or drawn per local authority.
+MAP_ANIMATION_MAX_BYTES = 4 * 1024 * 1024
+
+# Pre-serialised feature collections served by Streamlit's static file server
+# (server.enableStaticServing in .streamlit/config.toml). The browser downloads and
+# caches each one once; figures then only reference it by URL.
+STATIC_DIR = "static"
+
+logger = logging.getLogger(__name__)
+
+def pick_lod(zoom):
+    """
+    Small-area level of detail for the zoom fitted to the selected extent (fit_view).
+    """
+    for min_zoom, level in LOD_ZOOM_LEVELS:
+        if zoom >= min_zoom:
+            return level
+    return LOD_ZOOM_LEVELS[-1][1]
+
+def _json_bytes(collection):
+    return len(json.dumps(collection, separators=(",", ":")))
+
+def _feature_collection(gdf, key):
+    """
+    Minimal FeatureCollection: feature id = key column, no other properties.
+    """
+    features = json.loads(gdf[[key, 'geometry']].to_json(drop_id=True))['features']
+    for feature in features:
+        feature['id'] = feature.pop('properties')[key]
+    return {"type": "FeatureCollection", "features": features}
+
+def _publish_static(collection, file_name):
+    """
+    Writes the collection to the static folder and returns its URL,
+    or None if static serving is disabled / the folder is not writable:
+    the caller then inlines the collection in every figure, which is logged.
+    """
+    if not st.get_option("server.enableStaticServing"):
+        size_mb = _json_bytes(collection) / 1e6
+        logger.warning(
+            "server.enableStaticServing is off: %s (%.1f MB) is inlined in every map figure. "
+            "Start the app from the repository root so .streamlit/config.toml is read.",
+            file_name, size_mb
+        )
+        return None
+    try:
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        tmp_path = os.path.join(STATIC_DIR, file_name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(collection, f, separators=(",", ":"))
+        os.replace(tmp_path, os.path.join(STATIC_DIR, file_name))
+        return f"app/static/{file_name}"
+    except OSError as e:
+        logger.warning("Static geometry not published, inlining %s in every map figure: %s", file_name, e)
+        return None
+
+def geometry_source(level):
+    """
+    (path, key column) of the file drawn for `level`: its own file if built,
+    else the nearest coarser small-area level, then the nearest finer one,
+    then the single-resolution GEOJSON_PATH.
+    """
+    path, key = GEOMETRY_LEVELS[level]["path"], GEOMETRY_LEVELS[level]["key"]
+    if key != "small_area" or os.path.exists(path):
+        return path, key
+    i = SMALL_AREA_LODS.index(level)
+    for fallback in SMALL_AREA_LODS[i + 1:] + SMALL_AREA_LODS[:i][::-1]:
+        if os.path.exists(GEOMETRY_LEVELS[fallback]["path"]):
+            return GEOMETRY_LEVELS[fallback]["path"], key
+    return GEOJSON_PATH, key
+
+def geometry_shapes(level="coarse"):
+    """
+    Shapes of a level of detail without a serialised FeatureCollection: enough
+    for bounds lookups (region_bounds) and for culling (region_geometry).
     """
-    Loads the GeoJSON file.
+    return _load_shapes(*geometry_source(level))
+
+def load_geometry_cache(level="coarse"):
+    """
+    Geometry cache for drawing a whole level. Only WHOLE_MAP_LEVELS are drawn
+    whole, so only their files are serialised and published; the fine level is
+    only ever culled to a region. Levels that resolve to the same file (see
+    geometry_source) share one cached load.
+    """
+    if level not in WHOLE_MAP_LEVELS:
+        raise ValueError(f"{level!r} geometry is only drawn culled to a region (region_geometry)")
+    return _load_geometry(*geometry_source(level))
+
+@st.cache_resource
+def _load_shapes(path, key):
+    """
+    Built once per process and file: the geometries with a stable feature-id
+    index, an STRtree and per-feature bounds, so views can be aligned and
+    regions cut out without reading the file again.
+
+    Returns {"codes": ndarray, "index": pd.Index, "key": key column,
+    "path": source file, "gdf": GeoDataFrame [key, geometry],
+    "tree": STRtree, "bounds": (n, 4) ndarray}, or None.
     """
     try:
-        # Load GeoJSON using geopandas
-        gdf = gpd.read_file(GEOJSON_PATH)
-        return gdf
+        with stage("geometry", "read", path=path) as record:
+            gdf = gpd.read_file(path)
+            # Empty geometries cannot be drawn (legacy file has POLYGON EMPTY; LOD files do not)
+            empty = gdf.geometry.is_empty | gdf.geometry.isna()
+            record.update(rows=len(gdf), empty=int(empty.sum()))
     except Exception as e:
         st.error(f"Error loading map: {e}")
-        return gpd.GeoDataFrame()
+        return None
+
+    gdf = gdf[~empty]
+    gdf = gdf.drop_duplicates(subset=[key]).reset_index(drop=True)
+    gdf[key] = gdf[key].astype(str)
+
+    codes = gdf[key].to_numpy()
+    geometries = gdf.geometry.to_numpy()
+    with stage("geometry", "index", path=path):
+        tree = shapely.STRtree(geometries)
+        bounds = shapely.bounds(geometries)
+    return {
+        "codes": codes,
+        "index": pd.Index(codes),
+        "key": key,
+        "path": path,
+        "gdf": gdf[[key, "geometry"]],
+        "tree": tree,
+        "bounds": bounds,
+    }
+
+@st.cache_resource
+def _load_geometry(path, key):
+    """
+    The shapes of a file plus the whole file as a pre-serialised
+    FeatureCollection keyed by area, built once per process and file.
+    Map updates then only need a value array aligned to 'codes'.
 
-def plot_choropleth_map(gdf, df_data, selected_benefit="Total"):
+    Returns the _load_shapes dict with "geojson": URL, or the dict itself if
+    static serving is off, and "geojson_bytes": size of the inlined dict
+    (0 for a URL); or None.
     """
-    Plots a Choropleth map using GeoJSON.
+    shapes = _load_shapes(path, key)
+    if shapes is None:
+        return None
+    with stage("geometry", "serialise", path=path):
+        collection = _feature_collection(shapes["gdf"], key)
+    file_name = os.path.splitext(os.path.basename(path))[0] + "_features.geojson"
+    url = _publish_static(collection, file_name)
+    return {
+        **shapes,
+        "geojson": url or collection,
+        "geojson_bytes": 0 if url else _json_bytes(collection),
+    }
+
+def region_bounds(geo_cache, codes):
+    """
+    (min_lon, min_lat, max_lon, max_lat) around the given features, or None if none are drawn.
+    """
+    positions = geo_cache["index"].get_indexer(pd.Index(codes).astype(str))
+    positions = positions[positions >= 0]
+    if not len(positions):
+        return None
+    bounds = geo_cache["bounds"][positions]
+    return (
+        float(bounds[:, 0].min()), float(bounds[:, 1].min()),
+        float(bounds[:, 2].max()), float(bounds[:, 3].max())
+    )
+
+def fit_view(bbox, padding=0.1):
+    """
+    Map centre and zoom that fit a (min_lon, min_lat, max_lon, max_lat) box into
+    MAP_VIEWPORT_PX (Web Mercator: 256 px per 360 degrees at zoom 0).
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lat = (min_lat + max_lat) / 2
+    lon_span = max(max_lon - min_lon, 1e-4) * (1 + padding)
+    lat_span = max(max_lat - min_lat, 1e-4) * (1 + padding)
+    width, height = MAP_VIEWPORT_PX
+    zoom = min(
+        math.log2(width * 360 / (256 * lon_span)),
+        math.log2(height * 360 * math.cos(math.radians(lat)) / (256 * lat_span))
+    )
+    center = {"lat": lat, "lon": (min_lon + max_lon) / 2}
+    return center, max(UK_ZOOM, min(MAX_FOCUS_ZOOM, zoom))
+
+def region_geometry(level, bbox):
+    """
+    Geometry cache of `level` restricted to the features intersecting bbox
+    (STRtree query), with its own inline FeatureCollection. Same shape as
+    load_geometry_cache, so align_values and plot_choropleth_map take either.
+    """
+    return _region_geometry(*geometry_source(level), bbox)
+
+@st.cache_resource(max_entries=REGION_CACHE_ENTRIES)
+def _region_geometry(path, key, bbox):
+    geo_cache = _load_shapes(path, key)
+    if geo_cache is None:
+        return None
+    with stage("geometry", "cull", path=path) as record:
+        hits = np.sort(geo_cache["tree"].query(shapely.box(*bbox), predicate="intersects"))
+        gdf = geo_cache["gdf"].iloc[hits]
+        collection = _feature_collection(gdf, key) if len(gdf) else {"type": "FeatureCollection", "features": []}
+        record["rows"] = len(hits)
+    codes = geo_cache["codes"][hits]
+    return {
+        "geojson": collection,
+        "geojson_bytes": _json_bytes(collection),
+        "codes": codes,
+        "index": pd.Index(codes),
+        "key": key,
+        "path": path,
+        "bbox": bbox,
+    }
+
+def align_values(geo_cache, df_sums):
+    """
+    Benefit values as a float array aligned to geo_cache["codes"] (missing areas -> 0).
+    df_sums: [<key column>, Benefit_Value].
+    """
+    key = geo_cache["key"]
+    with stage("geometry", "align", rows=len(df_sums)):
+        values = np.zeros(len(geo_cache["codes"]), dtype=np.float32)
+        positions = geo_cache["index"].get_indexer(df_sums[key].astype(str))
+        found = positions >= 0
+        values[positions[found]] = df_sums['Benefit_Value'].to_numpy(dtype=np.float32)[found]
+    return values
+
+def plot_choropleth_map(geo_cache, df_data, selected_benefit="Total", center=None, zoom=UK_ZOOM):
+    """
+    Plots a Choropleth map from the cached geometry (any level of detail).
     Supports both Raw Data (needs aggregation) and Pre-Aggregated Data.
     """
-    
+    key = geo_cache["key"]
+
     # CASE 1: PRE-AGGREGATED DATA (from DuckDB)
-    if 'Benefit_Value' in df_data.columns and 'small_area' in df_data.columns:
-        df_sums = df_data[['small_area', 'Benefit_Value']].copy()
-        
+    if 'Benefit_Value' in df_data.columns and key in df_data.columns:
+        df_sums = df_data[[key, 'Benefit_Value']]
+
     # CASE 2: RAW DATA (Needs filtering & aggregation)
     else:
         target_year = 2050
         year_col = target_year if target_year in df_data.columns else str(target_year)
-        
+
         if selected_benefit and selected_benefit != "Total":
             df_filtered = df_data[df_data['co-benefit_type'] == selected_benefit]
         else:
             df_filtered = df_data
-        
-        # Group by small_area
-        df_sums = df_filtered.groupby('small_area')[year_col].sum().reset_index()
-        df_sums.rename(columns={year_col: 'Benefit_Value'}, inplace=True)
-    
-    # Merge with GeoDataFrame
-    # gdf key: 'small_area' 
-    gdf_merged = gdf.merge(df_sums, on='small_area', how='left')
-    gdf_merged['Benefit_Value'] = gdf_merged['Benefit_Value'].fillna(0)
-    
-    # Filter out empty geometries if any (saw POLYGON EMPTY in debug)
-    gdf_merged = gdf_merged[~gdf_merged.geometry.is_empty]
-    
-    fig = px.choropleth_mapbox(
-        gdf_merged,
-        geojson=gdf_merged.geometry,
-        locations=gdf_merged.index,
-        color='Benefit_Value',
-        hover_name='small_area',
-        hover_data=['Benefit_Value'],
-        color_continuous_scale="Viridis",
-        mapbox_style="carto-darkmatter",
-        center={"lat": 54.5, "lon": -2.0}, # UK Center
-        zoom=5,
+
+        # Group by area
+        df_sums = df_filtered.groupby(key, observed=True)[year_col].sum().reset_index()
+        df_sums = df_sums.rename(columns={year_col: 'Benefit_Value'})
+
+    # Only the value array changes between updates; geometry is referenced by feature id
+    fig = go.Figure(go.Choroplethmap(
+        geojson=geo_cache["geojson"],
+        featureidkey="id",
+        locations=geo_cache["codes"],
+        z=align_values(geo_cache, df_sums),
+        colorscale="Viridis",
+        marker_opacity=0.6,
+        marker_line_width=0,
+        colorbar=dict(title="Benefit_Value"),
+        hovertemplate="<b>%{location}</b><br>Benefit_Value=%{z}<extra></extra>"
+    ))
+
+    fig.update_layout(
+        map_style="carto-darkmatter",
+        map_center=center or UK_CENTER,
+        map_zoom=zoom,
         title=f"Geographic Distribution of Benefits ({selected_benefit}, 2050)",
-        opacity=0.6
+        margin={"r":0,"t":40,"l":0,"b":0},
+        font=dict(family="Inter, sans-serif")
+    )
+
+    return fig
+
+def align_matrix(geo_cache, codes, values):
+    """
+    Area x year matrix reordered to geo_cache["codes"] (missing areas -> 0):
+    float32 [n_features, n_years].
+    """
+    aligned = np.zeros((len(geo_cache["codes"]), values.shape[1]), dtype=np.float32)
+    positions = geo_cache["index"].get_indexer(pd.Index(codes).astype(str))
+    found = positions >= 0
+    aligned[positions[found]] = values[found]
+    return aligned
+
+def estimate_animation_bytes(geo_cache, n_years):
+    """
+    Approximate size of the plot_choropleth_animation spec: base64 float32
+    colours per feature and year, the feature ids once, and the geometry if inlined.
+    """
+    n_features = len(geo_cache["codes"])
+    z_bytes = n_features * n_years * 4 * 4 // 3
+    id_bytes = sum(len(code) + 3 for code in geo_cache["codes"])
+    return z_bytes + id_bytes + geo_cache.get("geojson_bytes", 0)
+
+def plot_choropleth_animation(geo_cache, codes, years, values, selected_benefit="Total",
+                              center=None, zoom=UK_ZOOM, duration=400):
+    """
+    Year-animated choropleth from an area x year matrix (data.get_map_matrix).
+    The geometry and locations go into the base trace once; each frame only
+    carries that year's colour array (float32, sent base64-encoded). The colour
+    scale is fixed across years (2nd-98th percentile of the whole matrix) so
+    frames are comparable. Check estimate_animation_bytes first for large extents.
+    """
+    with stage("geometry", "align_matrix", rows=len(codes)):
+        z = align_matrix(geo_cache, codes, values)
+    finite = z[np.isfinite(z)]
+    zmin, zmax = (np.percentile(finite, [2, 98]) if finite.size else (0.0, 1.0))
+    if zmin == zmax:
+        zmax = zmin + 1
+
+    fig = go.Figure(
+        data=[go.Choroplethmap(
+            geojson=geo_cache["geojson"],
+            featureidkey="id",
+            locations=geo_cache["codes"],
+            z=z[:, 0],
+            zmin=float(zmin),
+            zmax=float(zmax),
+            colorscale="Viridis",
+            marker_opacity=0.6,
+            marker_line_width=0,
+            colorbar=dict(title="Benefit_Value"),
+            hovertemplate="<b>%{location}</b><br>Benefit_Value=%{z}<extra></extra>"
+        )],
+        frames=[go.Frame(name=str(year), data=[go.Choroplethmap(z=z[:, i])], traces=[0])
+                for i, year in enumerate(years)]
     )
-    
+
+    updatemenus, sliders = animation_controls(years, f"▶️ Play {years[0]}→{years[-1]}", duration)
     fig.update_layout(
+        map_style="carto-darkmatter",
+        map_center=center or UK_CENTER,
+        map_zoom=zoom,
+        title=f"Geographic Distribution of Benefits ({selected_benefit}, {years[0]}-{years[-1]})",
         margin={"r":0,"t":40,"l":0,"b":0},
+        updatemenus=updatemenus,
+        sliders=sliders,
         font=dict(family="Inter, sans-serif")
     )
-    
+
     return fig
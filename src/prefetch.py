@@ -0,0 +1,133 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Background warming of the area result cache. Users step through neighbouring
+# entries of the area selector, so after serving one area the app queues the
+# next few on a small thread pool; by the time they are clicked, the result is
+# already cached and the page does not block on DuckDB.
+
+PREFETCH_WORKERS = 2
+PREFETCH_RADIUS = 2   # selector entries on each side of the current one
+PREFETCH_LIMIT = 8    # areas queued per selection (neighbours first, then same council)
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """
+    Bounded prefetch queue shared by all sessions of the process.
+
+    warm(key) computes and caches one result; is_cached(key) skips keys that are
+    already warm. Each owner (browser session) has its own pending set: a new
+    schedule() cancels that owner's queued tasks that are no longer wanted,
+    tasks already running finish and still fill the cache. Finished and
+    cancelled tasks leave the pending set, and an owner with nothing pending
+    is forgotten, so closed sessions leave no state behind.
+    """
+
+    def __init__(self, warm, is_cached=None, max_workers=PREFETCH_WORKERS):
+        self._warm = warm
+        self._is_cached = is_cached or (lambda key: False)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        # Reentrant: cancelling a future under the lock runs its done callback on this thread
+        self._lock = threading.RLock()
+        self._pending = {}   # owner -> {key: Future}
+        self._warmed = set()  # keys filled by prefetch and not yet requested
+        self.scheduled = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self.errors = 0
+        self.hits = 0
+        self.requests = 0
+
+    def _run(self, key):
+        try:
+            self._warm(key)
+        except Exception as e:
+            logger.warning("Prefetch of %s failed: %s", key, e)
+            with self._lock:
+                self.errors += 1
+            return
+        with self._lock:
+            self.completed += 1
+            self._warmed.add(key)
+
+    def _forget(self, owner, key, future):
+        """Done callback: drops a finished or cancelled task, and its owner once idle."""
+        with self._lock:
+            pending = self._pending.get(owner)
+            if pending is None or pending.get(key) is not future:
+                return
+            del pending[key]
+            if not pending:
+                del self._pending[owner]
+
+    def schedule(self, keys, owner=None):
+        """
+        Queues keys (most likely first) for warming and cancels this owner's
+        queued keys that are not in the new list.
+        """
+        keys = list(dict.fromkeys(keys))
+        wanted = set(keys)
+        with self._lock:
+            pending = {}
+            for key, future in self._pending.pop(owner, {}).items():
+                if future.done():
+                    continue
+                if key in wanted:
+                    pending[key] = future
+                elif future.cancel():
+                    self.cancelled += 1
+
+            submitted = []
+            for key in keys:
+                if key in pending:
+                    continue
+                if self._is_cached(key):
+                    self.skipped += 1
+                    continue
+                pending[key] = self._executor.submit(self._run, key)
+                submitted.append(key)
+                self.scheduled += 1
+            if pending:
+                self._pending[owner] = pending
+            # Registered once the owner's set is in place; runs at once for tasks already done
+            for key in submitted:
+                pending[key].add_done_callback(lambda f, key=key: self._forget(owner, key, f))
+
+    def cancel(self, owner=None):
+        self.schedule([], owner)
+
+    def record_request(self, key):
+        """
+        Counts a foreground request; a hit if prefetch had already warmed the key.
+        """
+        with self._lock:
+            self.requests += 1
+            if key in self._warmed:
+                self._warmed.discard(key)
+                self.hits += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "scheduled": self.scheduled,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "skipped": self.skipped,
+                "errors": self.errors,
+                "pending": sum(1 for p in self._pending.values() for f in p.values() if not f.done()),
+                "requests": self.requests,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.requests if self.requests else 0.0,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            for pending in self._pending.values():
+                for future in pending.values():
+                    future.cancel()
+            self._pending.clear()
+        self._executor.shutdown(wait=False)
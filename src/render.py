@@ -0,0 +1,91 @@
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import plotly.io as pio
+import streamlit as st
+
+from src.cache import ResultCache
+from src.instrument import stage, bind_trace
+
+# Progressive figure rendering: the page layout (headers, widgets, empty chart
+# slots) is written first, the figures are built concurrently on a worker pool
+# and each slot is filled as soon as its figure is ready.
+
+RENDER_WORKERS = 4
+
+# Serialised figure specs, keyed by (area, chart, year, options)
+FIGURE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+FIGURE_CACHE_TTL_SECONDS = 3600
+
+
+@st.cache_resource
+def get_render_pool():
+    """
+    Process-wide pool for figure builds (shared by all sessions). Builds pass
+    their own template copy to Plotly (visualizations.figure_template), never a
+    shared pio.templates entry.
+    """
+    return ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+
+
+@st.cache_resource
+def get_figure_cache():
+    """
+    Bounded LRU cache of figure JSON shared by all sessions.
+    """
+    return ResultCache(FIGURE_CACHE_MAX_BYTES, ttl_seconds=FIGURE_CACHE_TTL_SECONDS)
+
+
+def cached_figure(key, build, fingerprint=None):
+    """
+    Figure spec (dict) for `key`, building and serialising it only on a miss.
+    The key must cover everything the figure depends on: area, chart type,
+    year and option flags. A hit skips both the pandas work and the Plotly
+    construction; st.plotly_chart accepts the dict as-is.
+    """
+    chart = key[1] if isinstance(key, tuple) and len(key) > 1 else str(key)
+
+    # "figure_cache" covers the whole lookup; on a miss it contains the build and serialise stages
+    with stage("figure_cache", chart, hit=True) as lookup:
+        def compute():
+            lookup["hit"] = False
+            with stage("figure", chart):
+                fig = build()
+            with stage("serialise", chart) as record:
+                spec = pio.to_json(fig, validate=False)
+                record["bytes"] = len(spec)
+            return spec
+
+        spec = get_figure_cache().get_or_compute(key, compute, fingerprint=fingerprint)
+        lookup["bytes"] = len(spec)
+    return json.loads(spec)
+
+
+def figure_slot(label):
+    """
+    Empty placeholder for a figure, showing a short loading note until it is filled.
+    """
+    slot = st.empty()
+    slot.caption(f"⏳ Building {label}...")
+    return slot
+
+
+def render_figures(jobs):
+    """
+    jobs: list of (slot, label, build) where build() returns a Plotly figure
+    or a figure spec dict (cached_figure).
+
+    Builds run on the pool; slots are filled on the calling (script) thread in
+    completion order, since only that thread may write to the page. build() must
+    not call st.* itself. A failing build shows an error in its own slot only.
+    """
+    pool = get_render_pool()
+    futures = {pool.submit(bind_trace(build)): (slot, label) for slot, label, build in jobs}
+    for future in as_completed(futures):
+        slot, label = futures[future]
+        try:
+            fig = future.result()
+        except Exception as e:
+            slot.error(f"Could not render {label}: {e}")
+            continue
+        slot.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Declared schema of the Level 3 co-benefits dataset, shared by the build
+# scripts (ingest/convert/split/cluster/cube) and the query layer (src/data.py).
+
+AREA_COLUMN = "small_area"
+BENEFIT_COLUMN = "co-benefit_type"
+
+YEAR_MIN = 2025
+YEAR_MAX = 2050
+YEAR_COLUMNS = [str(y) for y in range(YEAR_MIN, YEAR_MAX + 1)]
+# Numeric columns besides the years (the raw sheet carries each row's total over the years)
+EXTRA_VALUE_COLUMNS = ["sum"]
+
+BENEFIT_TYPES = [
+    "air_quality",
+    "congestion",
+    "dampness",
+    "diet_change",
+    "excess_cold",
+    "excess_heat",
+    "hassle_costs",
+    "noise",
+    "physical_activity",
+    "road_repairs",
+    "road_safety",
+]
+
+# Values: float32 is plenty for million-GBP figures and halves the footprint of float64.
+VALUE_TYPE = pa.float32()
+VALUE_DTYPE = "float32"
+
+# Keys: dictionary-encoded strings, i.e. small integer ids + one copy of each string.
+# ~46k areas need int32 ids, 11 benefit types fit in int8.
+AREA_TYPE = pa.dictionary(pa.int32(), pa.string())
+BENEFIT_TYPE = pa.dictionary(pa.int8(), pa.string())
+TEXT_TYPE = pa.dictionary(pa.int16(), pa.string())
+
+BENEFIT_DTYPE = pd.CategoricalDtype(BENEFIT_TYPES)
+
+# Display labels, shared by the charts and the query layer
+BENEFIT_ICONS = {
+    "air_quality": "💨",
+    "congestion": "🚦",
+    "dampness": "💧",
+    "diet_change": "🥗",
+    "excess_cold": "❄️",
+    "excess_heat": "☀️",
+    "hassle_costs": "⏳",
+    "noise": "📢",
+    "physical_activity": "🏃",
+    "road_repairs": "🚧",
+    "road_safety": "🚸"
+}
+
+
+def get_icon_label(raw_name):
+    """Helper to convert 'air_quality' -> '💨 Air Quality'"""
+    pure_name = raw_name.replace('_', ' ').title()
+    icon = BENEFIT_ICONS.get(raw_name, "✨")
+    return f"{icon} {pure_name}"
+
+
+def icon_labels(benefit_series):
+    """Vectorised get_icon_label: categorical '💨 Air Quality' labels for a benefit column."""
+    categorical = benefit_series.astype('category')
+    labels = [get_icon_label(c) for c in categorical.cat.categories]
+    if len(set(labels)) == len(labels):
+        # Keep the benefit order (alphabetical by key), not the emoji sort order
+        return pd.Categorical.from_codes(categorical.cat.codes.to_numpy(), categories=labels)
+    # Two keys share a label: map per category, code -1 (missing) picks the trailing None
+    mapped = np.array(labels + [None], dtype=object)
+    return pd.Categorical(mapped[categorical.cat.codes.to_numpy()])
+
+
+def is_year_column(name):
+    name = str(name)
+    return name.isdigit() and YEAR_MIN <= int(name) <= YEAR_MAX
+
+
+def arrow_type(name, numeric=False):
+    """
+    Declared Arrow type for a column: years, EXTRA_VALUE_COLUMNS and other numeric
+    columns -> float32, area / benefit keys and any other text -> dictionary-encoded strings.
+    """
+    if is_year_column(name) or name in EXTRA_VALUE_COLUMNS or numeric:
+        return VALUE_TYPE
+    if name == AREA_COLUMN:
+        return AREA_TYPE
+    if name == BENEFIT_COLUMN:
+        return BENEFIT_TYPE
+    return TEXT_TYPE
+
+
+def arrow_schema(columns, numeric_columns=()):
+    numeric_columns = set(numeric_columns)
+    return pa.schema([(str(c), arrow_type(str(c), c in numeric_columns)) for c in columns])
+
+
+def cast_table(table):
+    """
+    Casts an Arrow table (e.g. from pandas or DuckDB) to the declared schema.
+    Columns keep their names and order; pandas index columns are dropped.
+    """
+    keep = [name for name in table.column_names if not name.startswith("__index_level_")]
+    table = table.select(keep)
+    numeric = [
+        field.name for field in table.schema
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+    ]
+    return table.cast(arrow_schema(table.column_names, numeric), safe=False)
+
+
+def benefit_dtype(values=()):
+    """Categorical dtype for benefit types; unknown values (e.g. "Total") are appended."""
+    extra = sorted(set(values) - set(BENEFIT_TYPES))
+    return pd.CategoricalDtype(BENEFIT_TYPES + extra) if extra else BENEFIT_DTYPE
+
+
+def to_categoricals(df):
+    """
+    Area and benefit columns of a query result -> pandas categoricals.
+    Returns a new frame; df is not modified.
+    """
+    converted = {}
+    if BENEFIT_COLUMN in df.columns and not isinstance(df[BENEFIT_COLUMN].dtype, pd.CategoricalDtype):
+        benefits = df[BENEFIT_COLUMN]
+        converted[BENEFIT_COLUMN] = benefits.astype(benefit_dtype(benefits.dropna().unique()))
+    if AREA_COLUMN in df.columns and not isinstance(df[AREA_COLUMN].dtype, pd.CategoricalDtype):
+        converted[AREA_COLUMN] = df[AREA_COLUMN].astype("category")
+    return df.assign(**converted) if converted else df
@@ -0,0 +1,126 @@
+import bisect
+import re
+
+import numpy as np
+import pandas as pd
+
+# Search-as-you-type over small areas: matches area codes and local-authority
+# names by word prefix ("glas", "S01", "east ayr"), returns only the top matches.
+
+DEFAULT_LIMIT = 50
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+class AreaSearchIndex:
+    """
+    Prefix index over "<local authority> (<code>)" display names.
+
+    Entries are ordered by (name, code), the same order as the old selectbox.
+    Every word of the name and the code itself is stored once in a sorted token
+    list with a posting array of entry ids, so a prefix lookup is two bisects
+    and a multi-word query is an intersection of sorted id arrays.
+    Built once per process; read-only afterwards, so safe to share between sessions.
+    """
+
+    def __init__(self, codes, names):
+        entries = pd.DataFrame({"code": pd.Series(codes).astype(str), "name": pd.Series(names).astype(str)})
+        entries = entries.drop_duplicates(subset=["code"]).sort_values(["name", "code"], ignore_index=True)
+
+        self.codes = entries["code"].to_numpy()
+        self.displays = (entries["name"] + " (" + entries["code"] + ")").to_numpy()
+        self.display_to_code = dict(zip(self.displays, self.codes))
+        self.code_to_name = pd.Series(entries["name"].to_numpy(), index=self.codes)
+        self._names = entries["name"].to_numpy()
+        self._positions = pd.Index(self.codes)
+        # Case-folded code -> entry id, for the exact-match promotion (tokens are lower case too)
+        self._folded_codes = {}
+        for entry_id, code in enumerate(self.codes):
+            self._folded_codes.setdefault(code.lower(), entry_id)
+
+        # Names repeat (~400 local authorities for ~46k areas): tokenise each distinct name once
+        name_tokens = {name: set(_tokens(name)) for name in entries["name"].unique()}
+        postings = {}
+        for entry_id, (code, name) in enumerate(zip(self.codes, entries["name"])):
+            for token in name_tokens[name] | {code.lower()}:
+                postings.setdefault(token, []).append(entry_id)
+
+        self._tokens = sorted(postings)
+        self._postings = [np.asarray(postings[t], dtype=np.int32) for t in self._tokens]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _prefix_ids(self, prefix):
+        """Sorted entry ids having a token that starts with `prefix`."""
+        lo = bisect.bisect_left(self._tokens, prefix)
+        hi = bisect.bisect_left(self._tokens, prefix + "\uffff", lo)
+        if hi - lo == 1:
+            return self._postings[lo]
+        if hi == lo:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(self._postings[lo:hi]))
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        Display names matching every word of `query` as a prefix, best first
+        (exact code match in any case, then name order). An empty query returns the first entries.
+        """
+        terms = _tokens(query)
+        if not terms:
+            return list(self.displays[:limit])
+
+        ids = None
+        for term in terms:
+            matches = self._prefix_ids(term)
+            ids = matches if ids is None else np.intersect1d(ids, matches, assume_unique=True)
+            if len(ids) == 0:
+                return []
+
+        exact = self._folded_codes.get(query.strip().lower())
+        if exact is not None and exact in ids:
+            ids = np.concatenate([[exact], ids[ids != exact]])
+        return list(self.displays[ids[:limit]])
+
+    def position(self, code):
+        """Entry id of an area code, or None."""
+        pos = self._positions.get_indexer([str(code)])[0]
+        return None if pos < 0 else int(pos)
+
+    def display_name(self, code):
+        pos = self.position(code)
+        return None if pos is None else self.displays[pos]
+
+    def neighbours(self, code, radius, limit):
+        """
+        Codes near `code` in selector order, closest first: `radius` entries on each
+        side, then further areas of the same local authority (a contiguous run, since
+        entries are sorted by name), up to `limit` codes.
+        """
+        pos = self.position(code)
+        if pos is None:
+            return []
+        name = self._names[pos]
+        result = []
+        for step in range(1, len(self.codes)):
+            added = False
+            for p in (pos + step, pos - step):
+                if 0 <= p < len(self.codes) and (step <= radius or self._names[p] == name):
+                    result.append(self.codes[p])
+                    added = True
+                    if len(result) >= limit:
+                        return result
+            if not added and step > radius:
+                break
+        return result
+
+
+def build_search_index(df_lookup):
+    """
+    AreaSearchIndex from the lookup table (small_area, local_authority).
+    """
+    return AreaSearchIndex(df_lookup["small_area"], df_lookup["local_authority"])
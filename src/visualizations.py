@@ -1,27 +1,90 @@
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
+import copy
+import threading
+import plotly.io as pio
+from src.schema import BENEFIT_ICONS, get_icon_label, icon_labels
 
-# Centralized Icon Mapping for consistent visuals
-BENEFIT_ICONS = {
-    "air_quality": "💨",
-    "congestion": "🚦",
-    "dampness": "💧",
-    "diet_change": "🥗",
-    "excess_cold": "❄️",
-    "excess_heat": "☀️",
-    "hassle_costs": "⏳",
-    "noise": "📢",
-    "physical_activity": "🏃",
-    "road_repairs": "🚧",
-    "road_safety": "🚸"
-}
+_template_specs = {}
+_template_lock = threading.Lock()
+
+def figure_template(name='plotly_dark'):
+    """
+    A private copy of a named Plotly template for one figure build.
+    px reads the template it is given and creates its child objects lazily, so
+    two render threads sharing pio.templates[name] race on it ("Invalid value").
+    The registry template is read once, under a lock, into a plain dict; each
+    call builds a fresh Template from a copy of that dict (well under a millisecond).
+    """
+    with _template_lock:
+        spec = _template_specs.get(name)
+        if spec is None:
+            spec = _template_specs[name] = pio.templates[name].to_plotly_json()
+    return go.layout.Template(copy.deepcopy(spec), _validate=False)
+
+def map_categories(series, func):
+    """
+    Applies func once per distinct value of series (not once per row)
+    and returns an object array aligned with series.
+    """
+    categorical = series.astype('category')
+    mapped = np.array([func(c) for c in categorical.cat.categories] + [None], dtype=object)
+    # code -1 (missing) picks the trailing None
+    return mapped[categorical.cat.codes.to_numpy()]
+
+def recode_categories(series, func, categories=None):
+    """
+    Like map_categories but returns a Categorical built from integer codes,
+    so mapping many rows onto a few groups never materialises row strings.
+    categories fixes the output order (default: first-seen order of func's results).
+    """
+    categorical = series.astype('category')
+    mapped = [func(c) for c in categorical.cat.categories]
+    if categories is None:
+        categories = list(dict.fromkeys(mapped))
+    lookup = np.array([categories.index(m) for m in mapped] + [-1], dtype=np.int32)
+    # code -1 (missing) stays missing
+    return pd.Categorical.from_codes(lookup[categorical.cat.codes.to_numpy()], categories=categories)
+
+def _with_labels(df):
+    """
+    Adds the 'Label' column unless the long-form frame already carries it
+    (process_area_data_from_df precomputes it). Never modifies df in place.
+    """
+    if 'Label' in df.columns:
+        return df
+    return df.assign(Label=icon_labels(df['co-benefit_type']))
+
+def benefit_year_matrix(df_melted):
+    """
+    Summed values as a benefit x year matrix: (labels, benefit keys, years, values).
+    values is float32 [n_benefits, n_years]; the animated charts ship it once and
+    each frame only carries one column of it.
+    """
+    sums = df_melted.groupby(['co-benefit_type', 'Year'], observed=True)['Benefit_Value'].sum()
+    table = sums.unstack('Year', fill_value=0).sort_index(axis=1)
+    benefits = [str(b) for b in table.index]
+    labels = [get_icon_label(b) for b in benefits]
+    return labels, benefits, table.columns.to_numpy(), table.to_numpy(dtype=np.float32)
 
-def get_icon_label(raw_name):
-    """Helper to convert 'air_quality' -> '💨 Air Quality'"""
-    pure_name = raw_name.replace('_', ' ').title()
-    icon = BENEFIT_ICONS.get(raw_name, "✨")
-    return f"{icon} {pure_name}"
+def animation_controls(years, button_label, duration):
+    """
+    Play button + year slider driving frames named by year.
+    Frames only swap data arrays; redraw keeps axis ordering in sync.
+    """
+    play = dict(frame=dict(duration=duration, redraw=True), fromcurrent=True, transition=dict(duration=0))
+    updatemenus = [dict(type='buttons', showactive=False,
+        buttons=[dict(label=button_label, method='animate', args=[None, play])])]
+    sliders = [dict(
+        active=0,
+        currentvalue=dict(prefix="Year="),
+        steps=[dict(label=str(y), method='animate',
+                    args=[[str(y)], dict(mode='immediate', frame=dict(duration=0, redraw=True))])
+               for y in years]
+    )]
+    return updatemenus, sliders
 
 def plot_projected_benefits_timeline(df_melted, area):
     """
@@ -31,10 +94,9 @@ def plot_projected_benefits_timeline(df_melted, area):
     if df_melted.empty:
         return go.Figure()
 
-    df = df_melted.copy()
-    df['Label'] = df['co-benefit_type'].apply(get_icon_label)
+    df = _with_labels(df_melted)
 
-    grouped = df.groupby(['Year', 'Label'])['Benefit_Value'].sum().reset_index()
+    grouped = df.groupby(['Year', 'Label'], observed=True)['Benefit_Value'].sum().reset_index()
     
     fig = px.area(
         grouped, 
@@ -42,7 +104,7 @@ def plot_projected_benefits_timeline(df_melted, area):
         y='Benefit_Value', 
         color='Label',
         title=f"📈 Projected Benefits Trajectory ({area})",
-        template='plotly_dark'
+        template=figure_template()
     )
     
     fig.update_layout(
@@ -56,19 +118,58 @@ def plot_projected_benefits_timeline(df_melted, area):
     
     return fig
 
+def plot_area_comparison(df_melted, area_names=None, benefit_type=None):
+    """
+    Line chart comparing the yearly benefit trajectories of several areas.
+    df_melted: long form with a 'small_area' column (get_areas_data_melted).
+    area_names: optional {small_area code -> display name} for the legend.
+    """
+    if df_melted.empty:
+        return go.Figure()
+
+    df = df_melted
+    if benefit_type and benefit_type != "Total":
+        df = df[df['co-benefit_type'] == benefit_type]
+
+    grouped = df.groupby(['small_area', 'Year'], observed=True)['Benefit_Value'].sum().reset_index()
+    codes = grouped['small_area'].astype(str)
+    grouped['Area'] = codes.map(area_names).fillna(codes) if area_names else codes
+
+    title_benefit = get_icon_label(benefit_type) if benefit_type and benefit_type != "Total" else "All Benefits"
+    fig = px.line(
+        grouped,
+        x='Year',
+        y='Benefit_Value',
+        color='Area',
+        markers=True,
+        title=f"🆚 Area Comparison ({title_benefit})",
+        template=figure_template()
+    )
+
+    fig.update_layout(
+        xaxis_title="Year",
+        yaxis_title="Benefit Value (£)",
+        legend_title="Area",
+        font=dict(family="Inter, sans-serif"),
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)"
+    )
+
+    return fig
+
 def plot_benefit_breakdown_2050(df_melted, area):
     """
     Bar chart showing the breakdown of benefits in 2050.
     """
     # Filter for 2050
-    data_2050 = df_melted[df_melted['Year'] == 2050].copy()
+    data_2050 = df_melted[df_melted['Year'] == 2050]
     
     if data_2050.empty:
         return go.Figure()
 
-    data_2050['Label'] = data_2050['co-benefit_type'].apply(get_icon_label)
+    data_2050 = _with_labels(data_2050)
 
-    grouped = data_2050.groupby('Label')['Benefit_Value'].sum().reset_index()
+    grouped = data_2050.groupby('Label', observed=True)['Benefit_Value'].sum().reset_index()
     grouped = grouped.sort_values('Benefit_Value', ascending=True) # For H bar
     
     fig = px.bar(
@@ -79,7 +180,7 @@ def plot_benefit_breakdown_2050(df_melted, area):
         title=f"🧩 Co-Benefits Composition in 2050",
         color='Benefit_Value',
         color_continuous_scale=px.colors.sequential.Teal,
-        template='plotly_dark'
+        template=figure_template()
     )
     
     fig.update_layout(
@@ -125,7 +226,7 @@ def plot_top_areas_comparison(df_wide, benefit_type=None):
         y='small_area',
         orientation='h',
         title=title,
-        template='plotly_dark',
+        template=figure_template(),
         color='Benefit_Value',
         color_continuous_scale=px.colors.sequential.Bluyl
     )
@@ -143,58 +244,48 @@ def plot_top_areas_comparison(df_wide, benefit_type=None):
 def plot_time_lapse(df_melted, area):
     """
     Bar Chart Race: Animated ranking of benefits over time.
+    Built from the benefit x year matrix: the first year is the base trace and
+    each frame only swaps the bar lengths (text is formatted client-side).
     """
     if df_melted.empty:
         return go.Figure()
 
-    df = df_melted.copy()
-    
-    # 1. Add Icons to Labels
-    df['Label'] = df['co-benefit_type'].apply(get_icon_label)
-    
-    # 2. Sort Data Correctly for Bar Race (Year asc, Value asc for H-Bar)
-    # We want top item at top of chart, so usually Value ascending for Y-axis H-bar
-    df = df.sort_values(['Year', 'Benefit_Value'], ascending=[True, True])
-    
-    # 3. Create Basic Bar Frame
+    labels, _, years, values = benefit_year_matrix(df_melted)
+    colors = [px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)] for i in range(len(labels))]
+
     # To stabilize animation, we ensure range_x covers max value
-    max_val = df['Benefit_Value'].max()
-    
-    fig = px.bar(
-        df, 
-        x='Benefit_Value', 
-        y='Label', 
-        orientation='h',
-        animation_frame='Year', 
-        hover_name='Label',
-        text='Benefit_Value', # Show value on bar
-        title=f"⏳ Evolution of Benefits Ranking ({area})",
-        template='plotly_dark',
-        color='Label', # Distinct colors
-        range_x=[0, max_val * 1.1] # Fixed X-axis for smooth animation
-    )
-    
-    # 4. Polish Appearance
-    fig.update_traces(
-        texttemplate='%{text:.4f}', 
-        textposition='outside',
-        marker_line_width=0
+    max_val = float(values.max())
+
+    fig = go.Figure(
+        data=[go.Bar(
+            x=values[:, 0],
+            y=labels,
+            orientation='h',
+            marker=dict(color=colors, line=dict(width=0)),
+            texttemplate='%{x:.4f}',
+            textposition='outside',
+            hovertemplate='<b>%{y}</b><br>Benefit_Value=%{x}<extra></extra>'
+        )],
+        frames=[go.Frame(name=str(year), data=[go.Bar(x=values[:, i])], traces=[0])
+                for i, year in enumerate(years)]
     )
-    
+
+    updatemenus, sliders = animation_controls(years, '▶️ Play Race', 600)
     fig.update_layout(
-        xaxis_title="Benefit Value (£)",
-        yaxis_title="",
+        title=f"⏳ Evolution of Benefits Ranking ({area})",
+        template=figure_template(),
+        xaxis=dict(title="Benefit Value (£)", range=[0, max_val * 1.1]), # Fixed X-axis for smooth animation
+        # Top item at the top: the axis re-sorts by value on every frame
+        yaxis=dict(title="", categoryorder='total ascending'),
         showlegend=False, # Labels are on Axis
-        updatemenus=[dict(type='buttons', showactive=False,
-            buttons=[dict(label='▶️ Play Race',
-                          method='animate',
-                          args=[None, dict(frame=dict(duration=600, redraw=True), fromcurrent=True)])])],
+        updatemenus=updatemenus,
+        sliders=sliders,
         font=dict(family="Inter, sans-serif"),
         plot_bgcolor="rgba(0,0,0,0)",
         paper_bgcolor="rgba(0,0,0,0)",
         margin=dict(l=0, r=0, t=50, b=0)
     )
-    
+
     return fig
 
 def plot_heatmap_year_benefit(df_melted):
@@ -204,10 +295,9 @@ def plot_heatmap_year_benefit(df_melted):
     if df_melted.empty:
         return go.Figure()
         
-    df = df_melted.copy()
-    df['Label'] = df['co-benefit_type'].apply(get_icon_label)
+    df = _with_labels(df_melted)
     
-    grouped = df.groupby(['Year', 'Label'])['Benefit_Value'].sum().reset_index()
+    grouped = df.groupby(['Year', 'Label'], observed=True)['Benefit_Value'].sum().reset_index()
     
     fig = px.density_heatmap(
         grouped,
@@ -216,7 +306,7 @@ def plot_heatmap_year_benefit(df_melted):
         z="Benefit_Value",
         title="🔥 Heatmap: Intensity of Benefits over Time",
         color_continuous_scale="Viridis",
-        template='plotly_dark'
+        template=figure_template()
     )
     
     fig.update_layout(
@@ -233,110 +323,113 @@ def plot_motion_bubble_chart(df_melted, area):
     X = Total Benefit Value
     Y = Growth (Year-over-Year Change)
     Text = Emoji Icon
+    Frames only carry x, y and font size per benefit (benefit x year matrix).
     """
     if df_melted.empty:
         return go.Figure()
-        
-    df = df_melted.copy()
-    
-    # Pre-calculate mapping
-    df['Icon'] = df['co-benefit_type'].map(BENEFIT_ICONS).fillna("✨")
-    df['Label'] = df['co-benefit_type'].apply(get_icon_label)
-    
-    df.sort_values(['Label', 'Year'], inplace=True)
-    
+
+    labels, benefits, years, values = benefit_year_matrix(df_melted)
+    icons = [BENEFIT_ICONS.get(b, "✨") for b in benefits]
+
     # Calculate Growth (Absolute Change)
-    df['Growth'] = df.groupby('Label')['Benefit_Value'].diff().fillna(0)
-    
-    # Use text size mapping instead of circle size
-    # We want larger value = larger emoji
-    # Normalize size between 20px and 60px
-    min_val = df['Benefit_Value'].min()
-    max_val = df['Benefit_Value'].max()
+    growth = np.zeros_like(values)
+    growth[:, 1:] = np.diff(values, axis=1)
+
+    # Larger value = larger emoji: font size scaled between 20px and 60px
+    min_val = float(values.min())
+    max_val = float(values.max())
     # Avoid division by zero
     if max_val == min_val: max_val += 1
-    
-    # Simple linear scaling for font size
-    df['FontSize'] = 20 + ((df['Benefit_Value'] - min_val) / (max_val - min_val)) * 40
-    
-    fig = px.scatter(
-        df,
-        x="Benefit_Value",
-        y="Growth",
-        animation_frame="Year",
-        animation_group="Label",
-        text="Icon", # RENDER EMOJI AS MARKER
-        hover_name="Label",
-        hover_data={"Benefit_Value": ":.4f", "Growth": ":.4f", "Icon": False, "FontSize": False},
-        title=f"🏎️ The Co-Benefit Race: Value vs. Speed ({area})",
-        template='plotly_dark',
-        range_x=[df['Benefit_Value'].min(), df['Benefit_Value'].max() * 1.15], # Extra room for emojis
-        range_y=[df['Growth'].min(), df['Growth'].max() * 1.25]
+    font_size = (20 + (values - min_val) / (max_val - min_val) * 40).astype(np.float32)
+
+    fig = go.Figure(
+        data=[go.Scatter(
+            x=values[:, 0],
+            y=growth[:, 0],
+            mode='text', # RENDER EMOJI AS MARKER
+            text=icons,
+            textfont=dict(size=font_size[:, 0]),
+            hovertext=labels,
+            hovertemplate='<b>%{hovertext}</b><br>Benefit_Value=%{x:.4f}<br>Growth=%{y:.4f}<extra></extra>'
+        )],
+        frames=[go.Frame(name=str(year),
+                         data=[go.Scatter(x=values[:, i], y=growth[:, i], textfont=dict(size=font_size[:, i]))],
+                         traces=[0])
+                for i, year in enumerate(years)]
     )
-    
-    # Update traces to show TEXT only (Emoji) not dots
-    fig.update_traces(mode='text', textfont_size=df['FontSize'])
-    
+
+    updatemenus, sliders = animation_controls(years, '▶️ Start Race', 600)
     fig.update_layout(
-        xaxis_title="Total Value (£)",
-        yaxis_title="Yearly Growth Speed (£)",
+        title=f"🏎️ The Co-Benefit Race: Value vs. Speed ({area})",
+        template=figure_template(),
+        xaxis=dict(title="Total Value (£)", range=[min_val, max_val * 1.15]), # Extra room for emojis
+        yaxis=dict(title="Yearly Growth Speed (£)", range=[float(growth.min()), float(growth.max()) * 1.25]),
         font=dict(family="Inter, sans-serif"),
         plot_bgcolor="rgba(0,0,0,0)",
         paper_bgcolor="rgba(0,0,0,0)",
-         updatemenus=[dict(type='buttons', showactive=False,
-            buttons=[dict(label='▶️ Start Race',
-                          method='animate',
-                          args=[None, dict(frame=dict(duration=600, redraw=True), fromcurrent=True)])])]
+        updatemenus=updatemenus,
+        sliders=sliders
     )
-    
+
     return fig
 
 def plot_benefit_rose_chart(df, area_name, year=None):
     """
     Plots a Nightingale Rose Chart (Polar Bar).
-    If year is None, it animates from 2025 to 2050 (Bloom Effect).
+    If year is None, it animates from 2025 to 2050 (Bloom Effect): petals keep
+    their place and each frame only swaps the radii (benefit x year matrix).
     If year is specific, it shows static.
     """
-    # Filter POSITIVE values only
-    df_clean = df[df['Benefit_Value'] > 0].copy()
-    df_clean['Display_Label'] = df_clean['co-benefit_type'].apply(get_icon_label)
-    
     if year:
         # Static Mode
+        # Filter POSITIVE values only
+        df_clean = _with_labels(df[df['Benefit_Value'] > 0])
+        df_clean = df_clean.assign(Display_Label=df_clean['Label'])
         df_plot = df_clean[df_clean['Year'] == year]
-        title_text = f"🌹 The 'Flower' of Benefits in {year}"
-        anim_args = {}
+
+        # Sort for petal organization
+        df_plot = df_plot.sort_values(['Year', 'Benefit_Value'], ascending=[True, False])
+
+        fig = px.bar_polar(
+            df_plot,
+            r="Benefit_Value",
+            theta="Display_Label",
+            color="Benefit_Value",
+            template=figure_template(),
+            color_continuous_scale="Viridis",
+            title=f"🌹 The 'Flower' of Benefits in {year}",
+            hover_data={"Display_Label": True, "Benefit_Value": ":.4f"}
+        )
+        updatemenus, sliders = [], []
     else:
         # Animation Mode
-        df_plot = df_clean.sort_values("Year")
-        title_text = f"🌹 The Blooming Benefits (2025-2050)"
-        anim_args = {
-            "animation_frame": "Year",
-            "range_r": [0, df_clean['Benefit_Value'].max() * 1.1] # Fix scale so it grows
-        }
-    
-    # Sort for petal organization
-    df_plot = df_plot.sort_values(['Year', 'Benefit_Value'], ascending=[True, False])
-
-    fig = px.bar_polar(
-        df_plot,
-        r="Benefit_Value",
-        theta="Display_Label",
-        color="Benefit_Value",
-        template="plotly_dark",
-        color_continuous_scale="Viridis",
-        title=title_text,
-        hover_data={"Display_Label": True, "Benefit_Value": ":.4f"},
-        **anim_args
-    )
-    
-    # Add Play Button if animating
-    updatemenus = []
-    if not year:
-        updatemenus = [dict(type='buttons', showactive=False,
-            buttons=[dict(label='▶️ Bloom',
-                          method='animate',
-                          args=[None, dict(frame=dict(duration=500, redraw=True), fromcurrent=True)])])]
+        if df.empty:
+            return go.Figure()
+        # POSITIVE values only, row by row as in the single-year rose; costs count
+        # as 0 so every year keeps its frame and every petal its place
+        positive = df.assign(Benefit_Value=df['Benefit_Value'].where(df['Benefit_Value'] > 0, 0))
+        labels, _, years, values = benefit_year_matrix(positive)
+        max_val = float(values.max()) or 1.0
+
+        def petals(column):
+            return go.Barpolar(r=column, marker=dict(color=column))
+
+        fig = go.Figure(
+            data=[go.Barpolar(
+                r=values[:, 0],
+                theta=labels,
+                marker=dict(color=values[:, 0], colorscale="Viridis",
+                            cmin=0, cmax=max_val, colorbar=dict(title="Benefit_Value")),
+                hovertemplate='<b>%{theta}</b><br>Benefit_Value=%{r:.4f}<extra></extra>'
+            )],
+            frames=[go.Frame(name=str(y), data=[petals(values[:, i])], traces=[0]) for i, y in enumerate(years)]
+        )
+        fig.update_layout(
+            title=f"🌹 The Blooming Benefits (2025-2050)",
+            template=figure_template(),
+            polar=dict(radialaxis=dict(range=[0, max_val * 1.1])) # Fix scale so it grows
+        )
+        updatemenus, sliders = animation_controls(years, '▶️ Bloom', 500)
 
     fig.update_layout(
         plot_bgcolor="rgba(0,0,0,0)",
@@ -347,107 +440,157 @@ def plot_benefit_rose_chart(df, area_name, year=None):
             angularaxis=dict(tickfont=dict(size=14, color="#EEE"))
         ),
         margin=dict(l=40, r=40, t=50, b=40),
-        updatemenus=updatemenus
+        updatemenus=updatemenus,
+        sliders=sliders
     )
-    
+
     return fig
 
-def plot_benefit_sankey(df, area_name, year=2050):
+# Sankey: benefit -> category grouping and neon palette (category colour tints links and nodes)
+SANKEY_CATEGORIES = {
+    '🏥 Health': ['physical_activity', 'diet_change', 'dampness', 'excess_cold', 'excess_heat'],
+    '🏗️ Infra': ['congestion', 'road_safety', 'road_repairs', 'hassle_costs'],
+    '🌳 Env': ['air_quality', 'noise']
+}
+BENEFIT_CATEGORY = {b: cat for cat, benefits in SANKEY_CATEGORIES.items() for b in benefits}
+LABEL_CATEGORY = {get_icon_label(b): cat for b, cat in BENEFIT_CATEGORY.items()}
+OTHER_CATEGORY = 'Other'
+
+# HIGH CONTRAST NEON PALETTE
+CATEGORY_COLORS = {
+    '🏥 Health': '#FF0055',       # Neon Red/Pink
+    '🏗️ Infra': '#00F0FF', # Cyan/Electric Blue
+    '🌳 Env': '#CCFF00',    # Lime Green
+    OTHER_CATEGORY: '#888888'
+}
+NEUTRAL_NODE_COLOR = '#AAAAAA'
+
+def hex_to_rgba(hex_code, opacity=0.8):
+    h = hex_code.lstrip('#')
+    try:
+        rgb = tuple(int(h[i:i+2], 16) for i in (0, 2, 4))
+        return f"rgba({rgb[0]}, {rgb[1]}, {rgb[2]}, {opacity})"
+    except ValueError:
+        return f"rgba(255, 255, 255, {opacity})"
+
+# Link colours per category, computed once (links are translucent, nodes solid)
+CATEGORY_LINK_COLORS = {cat: hex_to_rgba(color, 0.6) for cat, color in CATEGORY_COLORS.items()}
+
+def year_bucket(year, width=5, first=2025, last=2050):
+    start = first + (int(year) - first) // width * width
+    end = min(start + width - 1, last)
+    return f"{start}-{end}" if end > start else str(start)
+
+def _sankey_columns(df, levels):
+    """
+    Adds the derived level columns a Sankey can use: 'Category' (from the benefit),
+    'Label' (icon label) and 'Year_Bucket' (5-year buckets). Never modifies df.
+    """
+    extra = {}
+    if 'Category' not in df.columns:
+        extra['Category'] = recode_categories(
+            df['co-benefit_type'], lambda b: BENEFIT_CATEGORY.get(b, OTHER_CATEGORY), list(CATEGORY_COLORS)
+        )
+    if 'Label' in levels and 'Label' not in df.columns:
+        extra['Label'] = icon_labels(df['co-benefit_type'])
+    if 'Year_Bucket' in levels:
+        extra['Year_Bucket'] = recode_categories(df['Year'], year_bucket)
+    return df.assign(**extra) if extra else df
+
+def sankey_flows(df, levels, max_nodes=None, value='Benefit_Value'):
+    """
+    Vectorised multi-level flows, e.g. ['Category', 'Label'] or
+    ['nation', 'Category', 'Label'] or ['Label', 'Year_Bucket'].
+
+    One groupby per adjacent pair of levels (plus the category, which colours
+    the link); node ids come from per-level offsets, so there is no per-row Python.
+    max_nodes keeps the largest nodes of the first level and folds the rest
+    into one 'Other (n more)' node, which cannot clash with an existing 'Other'.
+    Returns (node labels, node colours, source, target, value, link colours).
+    """
+    df = _sankey_columns(df[df[value] > 0], levels)
+    if max_nodes:
+        first = levels[0]
+        totals = df.groupby(first, observed=True)[value].sum()
+        if len(totals) > max_nodes:
+            keep = set(totals.nlargest(max_nodes).index)
+            folded = f"{OTHER_CATEGORY} ({len(totals) - max_nodes} more)"
+            df = df.assign(**{first: recode_categories(
+                df[first], lambda v: v if v in keep else folded,
+                [v for v in totals.index if v in keep] + [folded]
+            )})
+
+    # Node tables: one block of ids per level
+    node_labels, node_colors, node_index = [], [], {}
+    for level in levels:
+        values = df[level].astype('category').cat.remove_unused_categories().cat.categories
+        node_index[level] = pd.Index(values.astype(str))
+        node_labels.extend(str(v) for v in values)
+        if level == 'Category':
+            node_colors.extend(CATEGORY_COLORS.get(str(v), NEUTRAL_NODE_COLOR) for v in values)
+        elif level in ('co-benefit_type', 'Label'):
+            # Benefit nodes take their category colour
+            category_of = BENEFIT_CATEGORY if level == 'co-benefit_type' else LABEL_CATEGORY
+            node_colors.extend(CATEGORY_COLORS[category_of.get(str(v), OTHER_CATEGORY)] for v in values)
+        else:
+            node_colors.extend([NEUTRAL_NODE_COLOR] * len(values))
+
+    offsets = np.cumsum([0] + [len(node_index[level]) for level in levels])
+    sources, targets, link_values, link_colors = [], [], [], []
+    for i, (a, b) in enumerate(zip(levels[:-1], levels[1:])):
+        keys = list(dict.fromkeys([a, b, 'Category']))
+        links = df.groupby(keys, observed=True)[value].sum().reset_index()
+        links = links[links[value] > 0]
+        sources.append(offsets[i] + node_index[a].get_indexer(links[a].astype(str).to_numpy()))
+        targets.append(offsets[i + 1] + node_index[b].get_indexer(links[b].astype(str).to_numpy()))
+        link_values.append(links[value].to_numpy(dtype=np.float32))
+        link_colors.append(map_categories(links['Category'], lambda c: CATEGORY_LINK_COLORS.get(c, CATEGORY_LINK_COLORS[OTHER_CATEGORY])))
+
+    if not sources:
+        return node_labels, node_colors, np.array([]), np.array([]), np.array([]), np.array([])
+    return (
+        node_labels,
+        node_colors,
+        np.concatenate(sources),
+        np.concatenate(targets),
+        np.concatenate(link_values),
+        np.concatenate(link_colors),
+    )
+
+def plot_benefit_sankey(df, area_name, year=2050, levels=('Category', 'Label'), max_nodes=None):
     """
     Sankey Diagram with High Contrast/Neon Colors.
+    Default flow is category -> benefit; any chain of columns works, e.g.
+    region -> category -> benefit for a breakdown frame with a region column,
+    or ('Label', 'Year_Bucket') with year=None for benefit -> 5-year buckets.
     """
-    df_year = df[df['Year'] == year].copy()
+    df_year = df if year is None else df[df['Year'] == year]
     
     if df_year.empty:
         return go.Figure()
 
-    categories = {
-        '🏥 Health': ['physical_activity', 'diet_change', 'dampness', 'excess_cold', 'excess_heat'],
-        '🏗️ Infra': ['congestion', 'road_safety', 'road_repairs', 'hassle_costs'],
-        '🌳 Env': ['air_quality', 'noise']
-    }
-    
-    benefit_to_cat = {}
-    for cat, benefits in categories.items():
-        for b in benefits:
-            benefit_to_cat[b] = cat
-            
-    cat_list = list(categories.keys())
-    benefit_list = df_year['co-benefit_type'].unique().tolist()
-    
-    # Map benefit list to Icon Labels
-    benefit_labels_map = {b: get_icon_label(b) for b in benefit_list}
-    all_labels = cat_list + [benefit_labels_map[b] for b in benefit_list]
-    label_to_idx = {lbl: i for i, lbl in enumerate(all_labels)}
-    
-    sources = []
-    targets = []
-    values = []
-    colors = []
-    
-    # HIGH CONTRAST NEON PALETTE
-    cat_colors = {
-        '🏥 Health': '#FF0055',       # Neon Red/Pink
-        '🏗️ Infra': '#00F0FF', # Cyan/Electric Blue
-        '🌳 Env': '#CCFF00'     # Lime Green
-    }
-
-    def hex_to_rgba(hex_code, opacity=0.8): # Increased opacity for visibility
-        h = hex_code.lstrip('#')
-        try:
-            rgb = tuple(int(h[i:i+2], 16) for i in (0, 2, 4))
-            return f"rgba({rgb[0]}, {rgb[1]}, {rgb[2]}, {opacity})"
-        except:
-             return f"rgba(255, 255, 255, {opacity})"
-
-    for _, row in df_year.iterrows():
-        benefit = row['co-benefit_type']
-        val = row['Benefit_Value']
-        cat = benefit_to_cat.get(benefit, 'Other')
-        benefit_lbl = benefit_labels_map[benefit]
-        
-        if val > 0:
-            sources.append(label_to_idx[cat])
-            targets.append(label_to_idx[benefit_lbl])
-            values.append(val)
-            base_color = cat_colors.get(cat, '#FFFFFF')
-            colors.append(hex_to_rgba(base_color, 0.6)) # Link opacity
-            
-    # Node Colors (Matches Links but Solid)
-    node_colors = []
-    for lbl in all_labels:
-        # Determine category of the node
-        if lbl in cat_colors:
-            node_colors.append(cat_colors[lbl])
-        else:
-            # It's a benefit node, find its category
-            found_cat = "Other"
-            for b_code, b_lbl in benefit_labels_map.items():
-                if b_lbl == lbl:
-                    found_cat = benefit_to_cat.get(b_code, "Other")
-                    break
-            node_colors.append(cat_colors.get(found_cat, '#888'))
+    labels, node_colors, sources, targets, values, link_colors = sankey_flows(df_year, list(levels), max_nodes)
 
     fig = go.Figure(data=[go.Sankey(
         node = dict(
           pad = 20,
           thickness = 25,
           line = dict(color = "white", width = 1), # White outline for pop
-          label = all_labels,
+          label = labels,
           color = node_colors # Explicit colorful nodes
         ),
         link = dict(
           source = sources,
           target = targets,
           value = values,
-          color = colors
+          color = link_colors
         ))])
 
     fig.update_layout(
-        title_text=f"🌊 Value Flow Analysis ({year})", 
+        title_text=f"🌊 Value Flow Analysis ({year if year is not None else '2025-2050'})", 
         font=dict(family="Inter", size=14, color="white"), # Bigger white text
         plot_bgcolor="rgba(0,0,0,0)",
         paper_bgcolor="rgba(0,0,0,0)",
-        template='plotly_dark'
+        template=figure_template()
     )
     return fig
@@ -0,0 +1,34 @@
+import logging
+import os
+import sys
+
+import pytest
+
+# The app imports its modules as src.*, relative to the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Outside `streamlit run` every cached call warns about the missing runtime
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+# ~280 areas in 3 councils and 4 nations: enough for roll-ups and rankings, built in seconds
+TEST_DATASET_SCALE = 0.006
+
+
+@pytest.fixture(scope="session")
+def dataset(tmp_path_factory):
+    """
+    Synthetic dataset (benchmarks.generate) built once per test run. The data
+    layer reads its files relative to the working directory, so the tests
+    using it run from inside it.
+    """
+    from benchmarks.generate import generate_dataset
+
+    data_dir = tmp_path_factory.mktemp("data")
+    cwd = os.getcwd()
+    # From data_dir, the generator makes up its own lookup instead of reading lookups.xlsx
+    os.chdir(data_dir)
+    try:
+        generate_dataset(".", TEST_DATASET_SCALE, seed=0)
+        yield data_dir
+    finally:
+        os.chdir(cwd)
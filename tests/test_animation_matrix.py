@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from src.data import process_area_data_from_df
+from src.schema import YEAR_COLUMNS, get_icon_label
+from src.visualizations import benefit_year_matrix, plot_benefit_rose_chart, plot_time_lapse
+
+
+def melted_area(seed=0):
+    rng = np.random.default_rng(seed)
+    benefits = ["air_quality", "noise", "dampness", "road_safety"]
+    df = pd.DataFrame({
+        "small_area": "E01000001",
+        "co-benefit_type": np.repeat(benefits, 3),
+        "damage_pathway": [f"pathway {i}" for i in range(12)],
+    })
+    for year in YEAR_COLUMNS:
+        df[year] = rng.uniform(0, 0.01, len(df)).astype(np.float32)
+    return process_area_data_from_df(df)
+
+
+def test_matrix_equals_per_year_benefit_sums():
+    df = melted_area()
+    labels, benefits, years, values = benefit_year_matrix(df)
+    expected = df.assign(**{"co-benefit_type": df["co-benefit_type"].astype(str)}).pivot_table(
+        index="co-benefit_type", columns="Year", values="Benefit_Value", aggfunc="sum")
+
+    assert benefits == list(expected.index)
+    assert labels == [get_icon_label(b) for b in benefits]
+    assert list(years) == [int(y) for y in YEAR_COLUMNS]
+    assert values.dtype == np.float32
+    np.testing.assert_allclose(values, expected.to_numpy(), rtol=1e-5)
+
+
+def test_time_lapse_frames_only_carry_the_bar_lengths():
+    df = melted_area()
+    _, _, years, values = benefit_year_matrix(df)
+    fig = plot_time_lapse(df, "E01000001")
+
+    assert [frame.name for frame in fig.frames] == [str(y) for y in years]
+    for i, frame in enumerate(fig.frames):
+        trace = frame.data[0]
+        assert trace.y is None and trace.text is None
+        np.testing.assert_allclose(trace.x, values[:, i])
+
+
+def test_rose_bloom_has_one_frame_per_year():
+    df = melted_area()
+    fig = plot_benefit_rose_chart(df, "E01000001")
+    assert len(fig.frames) == len(YEAR_COLUMNS)
+    assert plot_benefit_rose_chart(df, "E01000001", year=2050).frames == ()
+
+
+def test_rose_bloom_frames_match_the_single_year_rose_for_mixed_signs():
+    df = melted_area()
+    # One pathway of each benefit turns into a cost in odd years
+    flip = (df["damage_pathway"].isin({"pathway 0", "pathway 4", "pathway 8"})) & (df["Year"] % 2 == 1)
+    df.loc[flip, "Benefit_Value"] *= -50
+
+    bloom = plot_benefit_rose_chart(df, "E01000001")
+    for frame in bloom.frames:
+        year = int(frame.name)
+        static = plot_benefit_rose_chart(df, "E01000001", year=year)
+        petals = pd.DataFrame({"theta": static.data[0].theta, "r": static.data[0].r}).groupby("theta")["r"].sum()
+        animated = pd.Series(frame.data[0].r, index=bloom.data[0].theta)
+        np.testing.assert_allclose(animated[petals.index].to_numpy(), petals.to_numpy(), rtol=1e-5)
+        assert (animated.drop(petals.index) == 0).all()
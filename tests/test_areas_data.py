@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import data
+from src.instrument import get_stage_stats
+from src.schema import YEAR_COLUMNS
+
+
+@pytest.fixture
+def codes(dataset):
+    data.get_area_cache().clear()
+    yield data.load_lookups()["small_area"].astype(str).tolist()
+    data.get_area_cache().clear()
+
+
+def sorted_rows(df):
+    df = df.assign(**{c: df[c].astype(str) for c in ["small_area", "co-benefit_type", "damage_pathway"]})
+    return df.sort_values(["small_area", "co-benefit_type", "damage_pathway"], ignore_index=True)
+
+
+def test_keeps_requested_order_and_drops_unknown_codes(codes):
+    wanted = [codes[7], "NOT_AN_AREA", codes[2], codes[7], codes[40]]
+    df = data.get_areas_data(wanted)
+
+    assert list(df["small_area"].cat.categories) == [codes[7], codes[2], codes[40]]
+    assert list(dict.fromkeys(df["small_area"].astype(str))) == [codes[7], codes[2], codes[40]]
+    for code in (codes[7], codes[2], codes[40]):
+        area = sorted_rows(df[df["small_area"] == code])
+        single = sorted_rows(data.get_area_data(code))
+        np.testing.assert_array_equal(area[YEAR_COLUMNS].to_numpy(), single[YEAR_COLUMNS].to_numpy())
+    assert data.get_areas_data(["NOT_AN_AREA"]).empty
+
+
+def test_cached_areas_are_reused_and_new_ones_cached_per_area(codes, monkeypatch):
+    data.get_areas_data(codes[:3])
+    queried = []
+    query = data._query_areas_data
+    monkeypatch.setattr(data, "_query_areas_data", lambda wanted: queried.append(list(wanted)) or query(wanted))
+
+    data.get_areas_data([codes[1], codes[5], codes[0]])
+    assert queried == [[codes[5]]]
+
+    hits = data.get_area_cache().stats()["hits"]
+    data.get_area_data(codes[5])
+    assert data.get_area_cache().stats()["hits"] == hits + 1
+
+
+def test_long_lists_use_the_semi_join_with_the_same_result(codes, monkeypatch):
+    wanted = codes[:12]
+    in_list = data.get_areas_data(wanted)
+    data.get_area_cache().clear()
+    monkeypatch.setattr(data, "MAX_IN_LIST", 5)
+    before = get_stage_stats().summary().set_index("stage")["count"].get("query:areas_semi_join", 0)
+
+    semi_join = data.get_areas_data(wanted)
+
+    after = get_stage_stats().summary().set_index("stage")["count"].get("query:areas_semi_join", 0)
+    assert after == before + 1
+    assert list(semi_join["small_area"].cat.categories) == wanted
+    pd.testing.assert_frame_equal(sorted_rows(semi_join), sorted_rows(in_list))
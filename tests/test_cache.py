@@ -0,0 +1,152 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import cache as cache_module
+from src.cache import ResultCache, estimate_size
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def frame(rows):
+    return pd.DataFrame({"value": np.zeros(rows, dtype=np.float64)})
+
+
+def test_evicts_least_recently_used_to_stay_under_budget():
+    entry_size = estimate_size(frame(100))
+    cache = ResultCache(max_bytes=entry_size * 2)
+    cache.put("a", frame(100))
+    cache.put("b", frame(100))
+    assert cache.get("a")[0]  # "a" becomes the most recently used
+
+    cache.put("c", frame(100))
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a")[0] and cache.get("c")[0]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_value_larger_than_budget_is_not_cached():
+    cache = ResultCache(max_bytes=estimate_size(frame(10)))
+    cache.put("big", frame(1000))
+    assert cache.get("big") == (False, None)
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    cache = ResultCache(max_bytes=1 << 20, ttl_seconds=60)
+    cache.put("a", "value")
+
+    clock.now += 59
+    assert cache.get("a") == (True, "value")
+    assert "a" in cache
+
+    clock.now += 2
+    assert "a" not in cache
+    assert not cache.contains("a")
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["entries"] == 0
+
+
+def test_new_fingerprint_drops_every_entry():
+    cache = ResultCache(max_bytes=1 << 20)
+    cache.put("a", "value", fingerprint=("v1",))
+    assert cache.contains("a", ("v1",))
+
+    assert not cache.contains("a", ("v2",))
+    assert cache.get("a", ("v1",)) == (False, None)
+
+
+def test_contains_does_not_count_or_reorder():
+    cache = ResultCache(max_bytes=1 << 20)
+    cache.put("a", 1)
+    assert cache.contains("a") and "a" in cache
+    assert cache.stats()["hits"] == 0 and cache.stats()["misses"] == 0
+
+
+def test_get_or_compute_respects_cache_if():
+    cache = ResultCache(max_bytes=1 << 20)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return pd.DataFrame()
+
+    cache.get_or_compute("empty", compute, cache_if=lambda df: not df.empty)
+    cache.get_or_compute("empty", compute, cache_if=lambda df: not df.empty)
+    assert len(calls) == 2
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResultCache(max_bytes=1 << 20)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    with ThreadPoolExecutor(4) as pool:
+        first = pool.submit(cache.get_or_compute, "a", compute)
+        started.wait(5)
+        waiting = [pool.submit(cache.get_or_compute, "a", compute) for _ in range(3)]
+        release.set()
+        results = [first.result()] + [f.result() for f in waiting]
+
+    assert results == ["value"] * 4
+    assert len(calls) == 1
+    assert cache.get("a") == (True, "value")
+
+
+def test_waiters_get_the_compute_error_and_the_key_can_be_retried():
+    cache = ResultCache(max_bytes=1 << 20)
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("query failed")
+
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(cache.get_or_compute, "a", failing)
+        started.wait(5)
+        waiting = pool.submit(cache.get_or_compute, "a", lambda: "unused")
+        release.set()
+        for future in (first, waiting):
+            with pytest.raises(RuntimeError, match="query failed"):
+                future.result()
+
+    assert cache.get_or_compute("a", lambda: "value") == "value"
+
+
+def test_data_fingerprint_follows_every_built_file(dataset):
+    from src import data
+
+    for path in (data.CUBE_FILE, data.RANK_INDEX_FILE, data.QUANTILES_FILE, data.ROLLUP_FILE):
+        before = data.data_fingerprint()
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert data.data_fingerprint() != before, path
+
+
+def test_estimate_size_counts_strings():
+    codes = np.array([f"E01{i:06d}" for i in range(1000)], dtype=object)
+    assert estimate_size(codes) > codes.nbytes + 1000 * len("E01000000")
+    df = pd.DataFrame({"small_area": pd.Series(codes, dtype=object)})
+    assert estimate_size(df) > df.memory_usage(deep=False).sum() + 1000 * len("E01000000")
+    assert estimate_size((codes, df)) >= estimate_size(codes) + estimate_size(df)
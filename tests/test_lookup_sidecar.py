@@ -0,0 +1,74 @@
+import logging
+
+import pandas as pd
+import pytest
+
+from src import data
+
+
+def write_lookup_xlsx(n_areas):
+    pd.DataFrame({
+        "small_area": [f"S01{i:06d}" for i in range(n_areas)],
+        "population": [1000 + i for i in range(n_areas)],
+        "households": [400 + i for i in range(n_areas)],
+        "local_authority": ["Council A"] * n_areas,
+        "nation": ["Scotland"] * n_areas,
+    })[data.LOOKUP_COLUMNS].to_excel(data.LOOKUP_FILE, index=False)
+
+
+@pytest.fixture
+def lookup_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_lookup_xlsx(5)
+    return tmp_path
+
+
+def excel_reads(monkeypatch):
+    reads = []
+    read_excel = pd.read_excel
+    monkeypatch.setattr(data.pd, "read_excel", lambda *args, **kwargs: reads.append(1) or read_excel(*args, **kwargs))
+    return reads
+
+
+def test_sidecar_is_written_once_and_then_read_instead_of_the_xlsx(lookup_dir, monkeypatch):
+    reads = excel_reads(monkeypatch)
+    first = data.read_lookup_table()
+    assert reads == [1]
+    assert data._sidecar_hash() == data._file_sha256(data.LOOKUP_FILE)
+
+    again = data.read_lookup_table()
+    assert reads == [1]
+    pd.testing.assert_frame_equal(first, again, check_dtype=False)
+
+
+def test_changed_xlsx_rebuilds_the_sidecar(lookup_dir, monkeypatch):
+    data.read_lookup_table()
+    write_lookup_xlsx(7)
+    reads = excel_reads(monkeypatch)
+
+    df = data.read_lookup_table()
+
+    assert reads == [1]
+    assert len(df) == 7
+    assert data._sidecar_hash() == data._file_sha256(data.LOOKUP_FILE)
+    assert len(data.read_lookup_table()) == 7 and reads == [1]
+
+
+def test_corrupt_sidecar_falls_back_to_the_xlsx(lookup_dir, monkeypatch):
+    data.read_lookup_table()
+    with open(data.LOOKUP_SIDECAR, "wb") as f:
+        f.write(b"not parquet")
+    reads = excel_reads(monkeypatch)
+
+    assert len(data.read_lookup_table()) == 5
+    assert reads == [1]
+
+
+def test_unwritable_sidecar_still_returns_the_table(lookup_dir, monkeypatch, caplog):
+    def read_only(*args, **kwargs):
+        raise OSError("read-only file system")
+    monkeypatch.setattr(data.pq, "write_table", read_only)
+
+    with caplog.at_level(logging.WARNING, logger=data.logger.name):
+        assert len(data.read_lookup_table()) == 5
+    assert "Lookup sidecar not written" in caplog.text
@@ -0,0 +1,37 @@
+import pytest
+
+from src import map_viz
+
+
+@pytest.fixture
+def published(dataset, monkeypatch):
+    """File names map_viz serialises and publishes, starting from cold geometry caches."""
+    names = []
+    monkeypatch.setattr(map_viz, "_publish_static", lambda collection, file_name: names.append(file_name))
+    for cached in (map_viz._load_shapes, map_viz._load_geometry, map_viz._region_geometry):
+        cached.clear()
+    yield names
+    for cached in (map_viz._load_shapes, map_viz._load_geometry, map_viz._region_geometry):
+        cached.clear()
+
+
+def test_regional_views_cull_without_publishing_the_file(published):
+    shapes = map_viz.geometry_shapes("coarse")
+    bbox = map_viz.region_bounds(shapes, shapes["codes"][:50])
+
+    region = map_viz.region_geometry("fine", bbox)
+
+    assert set(shapes["codes"][:50]) <= set(region["codes"])
+    assert len(region["geojson"]["features"]) == len(region["codes"]) < len(shapes["codes"])
+    assert published == []
+
+
+def test_only_whole_map_levels_are_published(published):
+    for level in map_viz.WHOLE_MAP_LEVELS:
+        assert map_viz.load_geometry_cache(level)["geojson"] is not None
+    with pytest.raises(ValueError):
+        map_viz.load_geometry_cache("fine")
+
+    # One publish per file: medium and coarse resolve to the same generated file
+    assert len(published) == len(set(published))
+    assert "local_authorities_features.geojson" in published
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from src import data
+
+
+def per_capita_reference(benefit, year):
+    """Per-capita values by a plain merge on the lookup, sorted best first."""
+    df = data.get_map_data(benefit, year).astype({"small_area": str})
+    df_lookup = data.load_lookups().astype({"small_area": str})
+    df = df.merge(df_lookup[["small_area", "population"]], on="small_area")
+    df["Benefit_Value"] = df["Benefit_Value"].astype(float) * data.VALUE_SCALE_GBP / df["population"]
+    return df.sort_values("Benefit_Value", ascending=False, kind="stable")
+
+
+def test_per_capita_divides_by_each_areas_population(dataset):
+    df = data.get_map_data(None, 2050)
+    result = data.normalise_values(df, "per_capita")
+    expected = per_capita_reference(None, 2050).set_index("small_area")["Benefit_Value"]
+
+    np.testing.assert_allclose(
+        result["Benefit_Value"].to_numpy(),
+        expected.reindex(result["small_area"].astype(str)).to_numpy(),
+        rtol=1e-5
+    )
+    assert data.normalise_values(df, "absolute") is df
+
+
+def test_regional_denominators_are_sums_of_their_areas(dataset):
+    df_lookup = data.load_lookups()
+    regional = data.load_denominators()["regional"]
+    expected = df_lookup.groupby("local_authority")["households"].sum()
+
+    pd.testing.assert_series_equal(
+        regional["local_authority"]["households"].sort_index(),
+        expected.astype(float).sort_index(),
+        check_names=False
+    )
+    assert regional["uk"]["population"][data.UK_NAME] == df_lookup["population"].sum()
+
+
+def test_per_capita_ranking_matches_a_full_sort(dataset):
+    expected = per_capita_reference("air_quality", 2040)
+
+    top = data.get_top_areas_data("air_quality", 2040, n=10, basis="per_capita")
+    assert top["small_area"].astype(str).tolist() == expected["small_area"].head(10).tolist()
+
+    bottom = data.get_top_areas_data("air_quality", 2040, n=10, ascending=True, basis="per_capita")
+    expected_bottom = expected.sort_values("Benefit_Value", kind="stable")["small_area"].head(10)
+    assert bottom["small_area"].astype(str).tolist() == expected_bottom.tolist()
+
+
+def test_areas_without_a_denominator_get_nan(dataset):
+    codes = data.get_map_data(None, 2050)["small_area"].astype(str)
+    df = pd.DataFrame({"small_area": list(codes[:3]) + ["NOT_AN_AREA"], "Benefit_Value": [1.0, 2.0, 3.0, 4.0]})
+    result = data.normalise_values(df, "per_household")
+    assert np.isnan(result["Benefit_Value"].iloc[-1])
+    assert np.isfinite(result["Benefit_Value"].iloc[:3]).all()
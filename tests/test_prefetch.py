@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from src.prefetch import Prefetcher
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class GatedWarm:
+    """warm() that blocks until released and records the keys it warmed."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.warmed = []
+
+    def __call__(self, key):
+        self.started.set()
+        self.release.wait(5)
+        if key == "broken":
+            raise RuntimeError("query failed")
+        self.warmed.append(key)
+
+
+@pytest.fixture
+def gated():
+    warm = GatedWarm()
+    prefetcher = Prefetcher(warm, max_workers=1)
+    yield warm, prefetcher
+    warm.release.set()
+    prefetcher.shutdown()
+
+
+def test_finished_tasks_and_idle_owners_are_dropped(gated):
+    warm, prefetcher = gated
+    prefetcher.schedule(["a", "b"], owner="session-1")
+    assert set(prefetcher._pending["session-1"]) == {"a", "b"}
+
+    warm.release.set()
+    wait_until(lambda: not prefetcher._pending)
+    assert warm.warmed == ["a", "b"]
+    assert prefetcher.stats()["completed"] == 2 and prefetcher.stats()["pending"] == 0
+
+
+def test_rescheduling_cancels_queued_keys_no_longer_wanted(gated):
+    warm, prefetcher = gated
+    prefetcher.schedule(["a", "b", "c"], owner="session-1")
+    warm.started.wait(5)  # "a" is running, "b" and "c" are queued
+
+    prefetcher.schedule(["a", "d"], owner="session-1")
+    assert set(prefetcher._pending["session-1"]) == {"a", "d"}
+    assert prefetcher.stats()["cancelled"] == 2
+
+    warm.release.set()
+    wait_until(lambda: not prefetcher._pending)
+    assert warm.warmed == ["a", "d"]
+
+
+def test_owners_do_not_cancel_each_other(gated):
+    warm, prefetcher = gated
+    prefetcher.schedule(["a", "b"], owner="session-1")
+    prefetcher.schedule(["c"], owner="session-2")
+    prefetcher.cancel(owner="session-2")
+
+    assert "session-2" not in prefetcher._pending
+    assert set(prefetcher._pending["session-1"]) == {"a", "b"}
+    warm.release.set()
+    wait_until(lambda: not prefetcher._pending)
+    assert warm.warmed == ["a", "b"]
+
+
+def test_failed_tasks_leave_the_pending_set(gated):
+    warm, prefetcher = gated
+    prefetcher.schedule(["broken", "a"], owner="session-1")
+
+    warm.release.set()
+    wait_until(lambda: not prefetcher._pending)
+    assert prefetcher.stats()["errors"] == 1
+    assert warm.warmed == ["a"]
+
+
+def test_cached_keys_are_skipped_and_hits_counted():
+    warm = GatedWarm()
+    warm.release.set()
+    prefetcher = Prefetcher(warm, is_cached=lambda key: key == "cached")
+    try:
+        prefetcher.schedule(["cached", "a"], owner="session-1")
+        wait_until(lambda: not prefetcher._pending)
+        prefetcher.record_request("a")
+        prefetcher.record_request("b")
+        stats = prefetcher.stats()
+        assert stats["skipped"] == 1 and stats["hits"] == 1 and stats["hit_rate"] == 0.5
+    finally:
+        prefetcher.shutdown()
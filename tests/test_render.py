@@ -0,0 +1,109 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter, so no Plotly template has been touched yet: the
+# first px builds of the process all start together on the render pool.
+COLD_START_SCRIPT = """
+import logging
+import threading
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+from src.render import RENDER_WORKERS, render_figures
+from tests.test_animation_matrix import melted_area
+from src.visualizations import (
+    plot_benefit_rose_chart, plot_heatmap_year_benefit, plot_projected_benefits_timeline, plot_time_lapse,
+)
+
+
+class Slot:
+    def __init__(self):
+        self.errors = []
+        self.charts = 0
+
+    def error(self, message):
+        self.errors.append(message)
+
+    def plotly_chart(self, fig, **kwargs):
+        self.charts += 1
+
+
+df = melted_area()
+start = threading.Barrier(RENDER_WORKERS)
+
+def together(build):
+    def run():
+        start.wait()
+        return build()
+    return run
+
+builds = [
+    lambda: plot_projected_benefits_timeline(df, "E01000001"),
+    lambda: plot_benefit_rose_chart(df, "E01000001", year=2050),
+    lambda: plot_time_lapse(df, "E01000001"),
+    lambda: plot_heatmap_year_benefit(df),
+]
+slots = [Slot() for _ in builds]
+render_figures([(slot, f"chart {i}", together(build)) for i, (slot, build) in enumerate(zip(slots, builds))])
+errors = [e for slot in slots for e in slot.errors]
+assert not errors, errors
+assert all(slot.charts == 1 for slot in slots)
+"""
+
+
+@pytest.mark.parametrize("attempt", range(5))
+def test_concurrent_px_builds_on_a_cold_start(attempt):
+    result = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+
+
+@pytest.fixture
+def figure_cache():
+    from src.render import get_figure_cache
+
+    get_figure_cache().clear()
+    yield get_figure_cache()
+    get_figure_cache().clear()
+
+
+def counting_build(calls, value):
+    import plotly.graph_objects as go
+
+    def build():
+        calls.append(value)
+        return go.Figure(go.Bar(x=["a", "b"], y=[value, value]))
+    return build
+
+
+def test_cached_figure_builds_once_per_key(figure_cache):
+    from src.render import cached_figure
+
+    calls = []
+    key = ("E01000001", "trajectory", 2050, (("normalise", "absolute"),))
+    first = cached_figure(key, counting_build(calls, 1), fingerprint=("v1",))
+    again = cached_figure(key, counting_build(calls, 2), fingerprint=("v1",))
+
+    assert calls == [1]
+    assert first == again and list(first["data"][0]["y"]) == [1, 1]
+    # Any part of the key (area, chart, year, options) is a different figure
+    for other in [("E01000002",) + key[1:], key[:2] + (2030,) + key[3:], key[:3] + ((("normalise", "per_capita"),),)]:
+        cached_figure(other, counting_build(calls, 3), fingerprint=("v1",))
+    assert calls == [1, 3, 3, 3]
+
+
+def test_cached_figure_rebuilds_when_the_data_changes(figure_cache):
+    from src.render import cached_figure
+
+    calls = []
+    key = ("E01000001", "rose", 2050, ())
+    cached_figure(key, counting_build(calls, 1), fingerprint=("v1",))
+    rebuilt = cached_figure(key, counting_build(calls, 2), fingerprint=("v2",))
+
+    assert calls == [1, 2]
+    assert list(rebuilt["data"][0]["y"]) == [2, 2]
+    assert figure_cache.stats()["entries"] == 1
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as tm
+
+from src.data import process_area_data_from_df
+from src.schema import YEAR_COLUMNS, get_icon_label
+
+
+def wide_area_frame(n_rows=22, seed=0):
+    rng = np.random.default_rng(seed)
+    benefits = ["air_quality", "noise", "congestion", "hassle_costs"]
+    df = pd.DataFrame({
+        "small_area": pd.Categorical(["E01000001"] * n_rows),
+        "co-benefit_type": pd.Categorical(rng.choice(benefits, n_rows)),
+        "damage_pathway": [f"pathway {i % 5}" for i in range(n_rows)],
+    })
+    for year in YEAR_COLUMNS:
+        df[year] = rng.normal(0, 0.01, n_rows).astype(np.float32)
+    return df
+
+
+def melt_reference(df_area):
+    """The reshape as it was before vectorising: DataFrame.melt plus a per-row label."""
+    id_vars = [c for c in df_area.columns if c not in YEAR_COLUMNS]
+    df_long = df_area.melt(id_vars=id_vars, var_name="Year", value_name="Benefit_Value")
+    df_long["Year"] = df_long["Year"].astype(int)
+    df_long["Label"] = df_long["co-benefit_type"].astype(str).apply(get_icon_label)
+    return df_long
+
+
+def test_matches_melt_row_for_row():
+    df_area = wide_area_frame()
+    result = process_area_data_from_df(df_area)
+    expected = melt_reference(df_area)
+
+    assert list(result.columns) == list(expected.columns)
+    assert len(result) == len(df_area) * len(YEAR_COLUMNS)
+    for column in ["small_area", "co-benefit_type", "damage_pathway", "Label"]:
+        assert result[column].astype(str).tolist() == expected[column].astype(str).tolist()
+    assert result["Year"].tolist() == expected["Year"].tolist()
+    np.testing.assert_array_equal(result["Benefit_Value"].to_numpy(),
+                                  expected["Benefit_Value"].to_numpy(dtype=np.float32))
+
+
+def test_keeps_categoricals_and_input_untouched():
+    df_area = wide_area_frame()
+    before = df_area.copy()
+    result = process_area_data_from_df(df_area)
+
+    assert isinstance(result["co-benefit_type"].dtype, pd.CategoricalDtype)
+    assert isinstance(result["Label"].dtype, pd.CategoricalDtype)
+    tm.assert_frame_equal(df_area, before)
+
+
+def test_empty_frame_gives_empty_result():
+    assert process_area_data_from_df(pd.DataFrame()).empty
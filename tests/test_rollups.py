@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from src import data
+from src.schema import YEAR_COLUMNS
+
+
+def cube_with_regions():
+    df_cube = pd.read_parquet(data.CUBE_FILE)
+    df_cube = df_cube[df_cube["co-benefit_type"].astype(str) != data.TOTAL_BENEFIT]
+    df_lookup = data.load_lookups()[["small_area", "local_authority", "nation"]]
+    df_cube = df_cube.assign(small_area=df_cube["small_area"].astype(str))
+    return df_cube.merge(df_lookup.astype({"small_area": str}), on="small_area")
+
+
+def rollup_frame(level, area):
+    df = data.get_rollup_data(level, area)
+    return df.assign(**{"co-benefit_type": df["co-benefit_type"].astype(str)}).set_index("co-benefit_type")
+
+
+def test_local_authority_rollups_equal_sums_of_their_areas(dataset):
+    df = cube_with_regions()
+    expected = df.groupby(["local_authority", df["co-benefit_type"].astype(str)])[YEAR_COLUMNS].sum()
+
+    councils = data.get_rollup_areas("local_authority")
+    assert councils == sorted(df["local_authority"].unique())
+    for council in councils:
+        np.testing.assert_allclose(
+            rollup_frame("local_authority", council)[YEAR_COLUMNS].sort_index().to_numpy(),
+            expected.loc[council].sort_index().to_numpy(),
+            rtol=1e-4, atol=1e-6
+        )
+
+
+def test_uk_total_equals_sum_of_nations(dataset):
+    uk = rollup_frame("uk", data.UK_NAME)[YEAR_COLUMNS].sort_index()
+    nations = sum(rollup_frame("nation", n)[YEAR_COLUMNS].reindex(uk.index, fill_value=0)
+                  for n in data.get_rollup_areas("nation"))
+    np.testing.assert_allclose(uk.to_numpy(), nations.to_numpy(), rtol=1e-4, atol=1e-6)
+
+
+def test_rollup_matrix_matches_rollups(dataset):
+    codes, years, values = data.get_map_matrix(None)
+    councils, sums = data.rollup_matrix(codes, values, "local_authority")
+
+    assert list(years) == [int(y) for y in YEAR_COLUMNS]
+    for council, row in zip(councils, sums):
+        expected = rollup_frame("local_authority", council)[YEAR_COLUMNS].sum().to_numpy()
+        np.testing.assert_allclose(row, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_rollups_computed_from_the_cube_match_the_rollup_file(dataset, monkeypatch):
+    from_file = data.load_rollups()
+    monkeypatch.setattr(data, "ROLLUP_FILE", "missing_rollup.parquet")
+    data.load_rollups.clear()
+    try:
+        computed = data.load_rollups()
+    finally:
+        data.load_rollups.clear()
+
+    assert computed.keys() == from_file.keys()
+    for key, df in computed.items():
+        np.testing.assert_allclose(df[YEAR_COLUMNS].to_numpy(), from_file[key][YEAR_COLUMNS].to_numpy(), rtol=1e-5)
+    # The pooled cursor gives its temporary registration back
+    with data._cursor() as cursor:
+        assert cursor.execute("SELECT count(*) FROM duckdb_views() WHERE view_name = 'lookup'").fetchone()[0] == 0
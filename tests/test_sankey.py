@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from src.visualizations import OTHER_CATEGORY, sankey_flows
+
+
+def region_breakdown(n_regions=20, seed=0):
+    """One row per region and benefit; region i is worth about i + 1."""
+    rng = np.random.default_rng(seed)
+    benefits = ["air_quality", "noise", "dampness", "road_safety"]
+    rows = [(f"Region {i:02d}", b, (i + 1) * rng.uniform(0.9, 1.1)) for i in range(n_regions) for b in benefits]
+    df = pd.DataFrame(rows, columns=["region", "co-benefit_type", "Benefit_Value"])
+    return df.astype({"region": "category", "co-benefit_type": "category"})
+
+
+def test_max_nodes_keeps_the_largest_regions_and_folds_the_rest():
+    df = region_breakdown()
+    labels, colors, source, target, value, link_colors = sankey_flows(df, ["region", "Category", "Label"], max_nodes=5)
+
+    regions = labels[:6]
+    assert regions == [f"Region {i:02d}" for i in range(15, 20)] + [f"{OTHER_CATEGORY} (15 more)"]
+    assert len(colors) == len(labels) and len(link_colors) == len(value)
+
+    # Folding moves value to "Other" without losing any
+    region_out = np.zeros(len(labels))
+    np.add.at(region_out, source[source < 6], value[source < 6])
+    totals = df.groupby("region", observed=True)["Benefit_Value"].sum()
+    np.testing.assert_allclose(region_out[5], totals.nsmallest(15).sum(), rtol=1e-5)
+    np.testing.assert_allclose(value[source < 6].sum(), totals.sum(), rtol=1e-5)
+
+
+def test_without_cap_every_region_is_a_node_and_flows_balance():
+    df = region_breakdown(n_regions=8)
+    labels, _, source, target, value, _ = sankey_flows(df, ["region", "Category", "Label"])
+
+    assert labels[:8] == [f"Region {i:02d}" for i in range(8)]
+    inflow = np.bincount(target, weights=value, minlength=len(labels))
+    outflow = np.bincount(source, weights=value, minlength=len(labels))
+    # Middle-level nodes pass on everything they receive
+    middle = np.intersect1d(source, target)
+    assert len(middle) > 0
+    np.testing.assert_allclose(inflow[middle], outflow[middle], rtol=1e-5)
+
+
+def test_non_positive_values_are_dropped():
+    df = region_breakdown(n_regions=3)
+    df.loc[df["region"] == "Region 00", "Benefit_Value"] = -1.0
+    labels, *_ = sankey_flows(df, ["region", "Category", "Label"])
+    assert "Region 00" not in labels
+
+
+def test_folding_never_merges_into_an_existing_other_node():
+    df = region_breakdown(n_regions=3)
+    # An unknown benefit lands in the 'Other' category, the largest one here
+    extra = df[df["co-benefit_type"] == "noise"].assign(**{"co-benefit_type": "unmapped_benefit", "Benefit_Value": 100.0})
+    df = pd.concat([df.astype({"co-benefit_type": str}), extra.astype({"co-benefit_type": str})], ignore_index=True)
+
+    labels, _, source, _, value, _ = sankey_flows(df, ["Category", "Label"], max_nodes=2)
+
+    categories = labels[:3]
+    assert OTHER_CATEGORY in categories and categories[2] == f"{OTHER_CATEGORY} (2 more)"
+    outflow = np.bincount(source, weights=value, minlength=len(labels))
+    np.testing.assert_allclose(outflow[categories.index(OTHER_CATEGORY)], 3 * 100.0, rtol=1e-5)
+    np.testing.assert_allclose(outflow[:3].sum(), df["Benefit_Value"].sum(), rtol=1e-5)
@@ -0,0 +1,62 @@
+from src.search import AreaSearchIndex
+
+CODES = ["S01000003", "S01000001", "S01000002", "E01000001", "E01000002", "S01000010", "W01000001"]
+NAMES = ["Glasgow City", "Glasgow City", "East Ayrshire", "Barking and Dagenham",
+         "Barking and Dagenham", "East Renfrewshire", "Cardiff"]
+
+
+def build_index():
+    return AreaSearchIndex(CODES, NAMES)
+
+
+def scan(query):
+    """What the old selectbox filter found: every word is a prefix of some word of the display name."""
+    index = build_index()
+    words = query.lower().split()
+    return [d for d in index.displays
+            if all(any(token.startswith(w) for token in d.lower().replace("(", " ").replace(")", " ").split())
+                   for w in words)]
+
+
+def test_entries_are_ordered_by_name_then_code():
+    index = build_index()
+    assert list(index.displays[:2]) == ["Barking and Dagenham (E01000001)", "Barking and Dagenham (E01000002)"]
+    assert list(index.codes) == sorted(CODES, key=lambda c: (NAMES[CODES.index(c)], c))
+
+
+def test_word_prefix_matches_names_and_codes():
+    index = build_index()
+    assert index.search("glas") == ["Glasgow City (S01000001)", "Glasgow City (S01000003)"]
+    assert index.search("S0100000") == scan("S0100000")
+    assert index.search("dag") == scan("dag")
+    assert index.search("xyz") == []
+
+
+def test_multi_word_query_intersects_the_prefixes():
+    index = build_index()
+    assert index.search("east ayr") == ["East Ayrshire (S01000002)"]
+    assert index.search("east") == ["East Ayrshire (S01000002)", "East Renfrewshire (S01000010)"]
+    assert index.search("east s01000010") == ["East Renfrewshire (S01000010)"]
+    assert index.search("east cardiff") == []
+
+
+def test_exact_code_comes_first_and_limit_applies():
+    index = build_index()
+    assert index.search("S01000010")[0] == "East Renfrewshire (S01000010)"
+    assert index.search("S0100001") == scan("S0100001")
+    assert len(index.search("s01", limit=2)) == 2
+    assert index.search("", limit=3) == list(index.displays[:3])
+
+
+def test_exact_code_is_promoted_in_any_case():
+    # "S0100001" is also a prefix of "S01000010", which sorts first by name
+    index = AreaSearchIndex(["S01000010", "S0100001"], ["Aberdeen City", "Shetland Islands"])
+    for query in ["S0100001", "s0100001", " s0100001 "]:
+        assert index.search(query) == ["Shetland Islands (S0100001)", "Aberdeen City (S01000010)"]
+
+
+def test_neighbours_follow_selector_order():
+    index = build_index()
+    assert index.neighbours("S01000001", radius=1, limit=4) == ["S01000003", "S01000010"]
+    assert index.neighbours("not-a-code", radius=1, limit=4) == []
+    assert index.display_to_code["Cardiff (W01000001)"] == "W01000001"